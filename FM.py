@@ -1,217 +1,274 @@
+import argparse
+import os
 import pandas as pd
 import numpy as np
 import pygame
 import sys
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-# Data Preparation
-data = {
-    'Age': [25, 35, 45, 50, 23, 31, 60, 40, 29, 52],
-    'Income': [30000, 60000, 80000, 72000, 25000, 40000, 90000, 55000, 38000, 85000],
-    'LoanAmount': [10000, 15000, 20000, 18000, 5000, 12000, 25000, 70000, 11000, 23000],
-    'CreditHistory': ['Good', 'Good', 'Bad', 'Good', 'Bad', 'Good', 'Good', 'Bad', 'Good', 'Bad'],
-    'EmploymentStatus': ['Employed', 'Self-employed', 'Unemployed', 'Employed', 'Unemployed',
-                         'Employed', 'Retired', 'Self-employed', 'Employed', 'Unemployed'],
-    'Default': ['No', 'No', 'Yes', 'No', 'Yes', 'No', 'No', 'Yes', 'No', 'Yes']
-}
-
-df = pd.DataFrame(data)
-
-# Encode categorical features
-le_credit = LabelEncoder()
-le_employment = LabelEncoder()
-le_default = LabelEncoder()
-
-df['CreditHistory'] = le_credit.fit_transform(df['CreditHistory'])
-df['EmploymentStatus'] = le_employment.fit_transform(df['EmploymentStatus'])
-df['Default'] = le_default.fit_transform(df['Default'])
-
-X = df.drop('Default', axis=1)
-y = df['Default']
-
-# Scale features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.3, random_state=42)
-
-# Train model
-model = LogisticRegression()
-model.fit(X_train, y_train)
-
-# Initialize Pygame
-pygame.init()
-
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Credit Scoring Model")
-
-font = pygame.font.SysFont(None, 30)
-title_font = pygame.font.SysFont(None, 40)
-
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-GRAY = (200, 200, 200)
-DARK_GRAY = (50, 50, 50)
-GREEN = (0, 200, 0)
-RED = (200, 0, 0)
-BLUE = (0, 0, 200) # Added for prediction text
-
-# Input boxes
-inputs = {
-    'Age': '',
-    'Income': '',
-    'LoanAmount': '',
-    'CreditHistory': 'Good',  # default
-    'EmploymentStatus': 'Employed'  # default
-}
-
-input_boxes = {
-    'Age': pygame.Rect(200, 100, 140, 32),
-    'Income': pygame.Rect(200, 150, 140, 32),
-    'LoanAmount': pygame.Rect(200, 200, 140, 32),
-}
-
-dropdowns = {
-    'CreditHistory': ['Good', 'Bad'],
-    'EmploymentStatus': ['Employed', 'Self-employed', 'Unemployed', 'Retired']
-}
-dropdown_selected = {
-    'CreditHistory': 0,
-    'EmploymentStatus': 0
-}
-
-# Define dropdown rects based on their display positions
-dropdown_rects = {
-    'CreditHistory': pygame.Rect(200, 250, 140, 32),
-    'EmploymentStatus': pygame.Rect(200, 300, 140, 32)
-}
-
-
-predict_button = pygame.Rect(200, 360, 200, 40) # Adjusted position to avoid overlap
-confusion_button = pygame.Rect(200, 420, 200, 40) # Adjusted position
-
-prediction_text = ''
-
-# Main loop
-active_field = None
-running = True
-while running:
-    screen.fill(WHITE)
-
-    # Title
-    title = title_font.render("Credit Scoring Model", True, BLACK)
-    screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 20))
-
-    # Labels and inputs
-    y_offset = 100
-    for key in ['Age', 'Income', 'LoanAmount']:
-        label = font.render(f"{key}:", True, BLACK)
-        screen.blit(label, (50, y_offset))
-        pygame.draw.rect(screen, GRAY if active_field == key else DARK_GRAY, input_boxes[key], 0)
-        text_surface = font.render(inputs[key], True, BLACK)
-        screen.blit(text_surface, (input_boxes[key].x + 5, input_boxes[key].y + 5))
-        y_offset += 50
-
-    # Dropdowns
-    dropdown_label_credit = font.render("CreditHistory:", True, BLACK)
-    screen.blit(dropdown_label_credit, (50, y_offset))
-    dropdown_surface_credit = font.render(dropdowns['CreditHistory'][dropdown_selected['CreditHistory']], True, BLACK)
-    pygame.draw.rect(screen, DARK_GRAY, dropdown_rects['CreditHistory'], 0) # Draw using the defined rect
-    screen.blit(dropdown_surface_credit, (dropdown_rects['CreditHistory'].x + 5, dropdown_rects['CreditHistory'].y + 5))
-
-    y_offset += 50
-    dropdown_label_employment = font.render("EmploymentStatus:", True, BLACK)
-    screen.blit(dropdown_label_employment, (50, y_offset))
-    dropdown_surface_employment = font.render(dropdowns['EmploymentStatus'][dropdown_selected['EmploymentStatus']], True, BLACK)
-    pygame.draw.rect(screen, DARK_GRAY, dropdown_rects['EmploymentStatus'], 0) # Draw using the defined rect
-    screen.blit(dropdown_surface_employment, (dropdown_rects['EmploymentStatus'].x + 5, dropdown_rects['EmploymentStatus'].y + 5))
-
-    # Buttons
-    pygame.draw.rect(screen, GREEN, predict_button)
-    predict_text_render = font.render("Predict Default", True, WHITE)
-    screen.blit(predict_text_render, (predict_button.x + 20, predict_button.y + 5))
-
-    pygame.draw.rect(screen, RED, confusion_button)
-    confusion_text_render = font.render("Show Confusion Matrix", True, WHITE)
-    screen.blit(confusion_text_render, (confusion_button.x + 5, confusion_button.y + 5))
-
-    # Prediction Result
-    prediction_display = font.render(f"Prediction: {prediction_text}", True, BLUE)
-    screen.blit(prediction_display, (50, SCREEN_HEIGHT - 50))
-
-
-    # Event Handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-            pygame.quit()
-            sys.exit()
-
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            active_field = None # Reset active field on each click
-            for key in input_boxes:
-                if input_boxes[key].collidepoint(event.pos):
-                    active_field = key
-                    break
-
-            # Dropdown toggles
-            if dropdown_rects['CreditHistory'].collidepoint(event.pos):
-                dropdown_selected['CreditHistory'] = (dropdown_selected['CreditHistory'] + 1) % len(dropdowns['CreditHistory'])
-                inputs['CreditHistory'] = dropdowns['CreditHistory'][dropdown_selected['CreditHistory']] # Update input for consistency
-
-            if dropdown_rects['EmploymentStatus'].collidepoint(event.pos):
-                dropdown_selected['EmploymentStatus'] = (dropdown_selected['EmploymentStatus'] + 1) % len(dropdowns['EmploymentStatus'])
-                inputs['EmploymentStatus'] = dropdowns['EmploymentStatus'][dropdown_selected['EmploymentStatus']] # Update input for consistency
-
-            # Predict button
-            if predict_button.collidepoint(event.pos):
-                try:
-                    # Collect inputs
-                    input_data = {
-                        'Age': float(inputs['Age']),
-                        'Income': float(inputs['Income']),
-                        'LoanAmount': float(inputs['LoanAmount']),
-                        'CreditHistory': le_credit.transform([dropdowns['CreditHistory'][dropdown_selected['CreditHistory']]])[0],
-                        'EmploymentStatus': le_employment.transform([dropdowns['EmploymentStatus'][dropdown_selected['EmploymentStatus']]])[0]
-                    }
-
-                    input_df = pd.DataFrame([input_data])
-                    input_scaled = scaler.transform(input_df)
-                    prediction = model.predict(input_scaled)[0]
-                    prediction_text = 'Yes' if prediction == 1 else 'No'
-                except ValueError:
-                    prediction_text = "Error: Please enter valid numbers for Age, Income, and LoanAmount."
-                except Exception as e:
-                    prediction_text = f"Error: {e}"
-
-            # Confusion button
-            if confusion_button.collidepoint(event.pos):
-                y_pred = model.predict(X_test)
-                cm = confusion_matrix(y_test, y_pred)
-                plt.figure(figsize=(6, 5)) # Create a figure before drawing
-                sns.heatmap(cm, annot=True, fmt='d', cmap='Reds', xticklabels=le_default.classes_, yticklabels=le_default.classes_)
-                plt.title("Confusion Matrix - Credit Scoring Model")
-                plt.xlabel("Predicted")
-                plt.ylabel("Actual")
-                plt.tight_layout()
-                plt.show()
-
-        elif event.type == pygame.KEYDOWN and active_field:
-            if event.key == pygame.K_BACKSPACE:
-                inputs[active_field] = inputs[active_field][:-1]
-            elif event.unicode.isdigit() or (event.unicode == '.' and '.' not in inputs[active_field]): # Allow numbers and one decimal for numerical fields
-                if active_field in ['Age', 'Income', 'LoanAmount']:
-                    inputs[active_field] += event.unicode
-            elif event.unicode.isalpha(): # Allow letters for categorical fields if you had them (though not directly for these numerical inputs)
-                pass # This block is not strictly needed for your current inputs as they are numerical or dropdowns
-
-
-    pygame.display.flip()
\ No newline at end of file
+from credit_artifacts import ModelHandle, save_artifacts
+from credit_evaluation import ModelEvaluator
+from credit_model import SAMPLE_DATA, train_pipeline
+from render_scheduler import RenderScheduler
+from text_cache import render_text
+
+# The trained pipeline (encoders, scaler, model and its compiled scorer) is saved
+# here by `python FM.py --train` and loaded at startup; a retrain while the app
+# runs is picked up on the next prediction.
+ARTIFACT_DIR = os.environ.get("FM_ARTIFACT_DIR", "fm_artifacts")
+
+def train_model(data_path=None):
+    """Fits the pipeline on the applications in `data_path` (CSV), or on the sample data."""
+    # Data Preparation
+    df = pd.read_csv(data_path) if data_path else pd.DataFrame(SAMPLE_DATA)
+    # Encode categorical features, scale features, split data and train the model
+    # (see credit_model.py)
+    return train_pipeline(df)
+
+def main():
+    models = ModelHandle(ARTIFACT_DIR, train_model, metadata={"training_data": "sample", "training_sources": ["sample"]})
+
+    # Initialize Pygame
+    pygame.init()
+
+    # The evaluation report (cross-validation, confusion matrix, ROC curve) is computed
+    # and rendered on a background thread, which posts EVALUATION_READY when it's done.
+    # It starts right away, so "Show Confusion Matrix" usually finds it ready.
+    EVALUATION_READY = pygame.event.custom_type()
+
+    def evaluation_ready(version):
+        try:
+            pygame.event.post(pygame.event.Event(EVALUATION_READY, model_version=version))
+        except pygame.error:
+            pass  # The app quit in the meantime
+
+    evaluator = ModelEvaluator(models, on_ready=evaluation_ready)
+    evaluator.request()
+
+    SCREEN_WIDTH = 800
+    SCREEN_HEIGHT = 600
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Credit Scoring Model")
+
+    font = pygame.font.SysFont(None, 30)
+    title_font = pygame.font.SysFont(None, 40)
+
+    WHITE = (255, 255, 255)
+    BLACK = (0, 0, 0)
+    GRAY = (200, 200, 200)
+    DARK_GRAY = (50, 50, 50)
+    GREEN = (0, 200, 0)
+    RED = (200, 0, 0)
+    BLUE = (0, 0, 200) # Added for prediction text
+
+    # Input boxes
+    inputs = {
+        'Age': '',
+        'Income': '',
+        'LoanAmount': '',
+        'CreditHistory': 'Good',  # default
+        'EmploymentStatus': 'Employed'  # default
+    }
+
+    input_boxes = {
+        'Age': pygame.Rect(200, 100, 140, 32),
+        'Income': pygame.Rect(200, 150, 140, 32),
+        'LoanAmount': pygame.Rect(200, 200, 140, 32),
+    }
+
+    dropdowns = {
+        'CreditHistory': ['Good', 'Bad'],
+        'EmploymentStatus': ['Employed', 'Self-employed', 'Unemployed', 'Retired']
+    }
+    dropdown_selected = {
+        'CreditHistory': 0,
+        'EmploymentStatus': 0
+    }
+
+    # Define dropdown rects based on their display positions
+    dropdown_rects = {
+        'CreditHistory': pygame.Rect(200, 250, 140, 32),
+        'EmploymentStatus': pygame.Rect(200, 300, 140, 32)
+    }
+
+
+    predict_button = pygame.Rect(200, 360, 200, 40) # Adjusted position to avoid overlap
+    confusion_button = pygame.Rect(200, 420, 200, 40) # Adjusted position
+
+    prediction_text = ''
+
+    # Region of the prediction line at the bottom of the window
+    prediction_rect = pygame.Rect(0, SCREEN_HEIGHT - 60, SCREEN_WIDTH, 60)
+
+    # The evaluation report is shown over the form until the next click
+    report_rect = pygame.Rect(20, 70, 760, 420)
+    report_surfaces = {}  # model version -> rendered report
+    shown_report = None
+    waiting_for_report = False
+
+    # Main loop: only redraws regions an event changed, and sleeps while idle
+    scheduler = RenderScheduler(screen)
+    active_field = None
+    running = True
+    while running:
+        if scheduler.begin_frame():
+            screen.fill(WHITE)
+
+            # Title
+            title = render_text(title_font, "Credit Scoring Model", True, BLACK)
+            screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 20))
+
+            # Labels and inputs
+            y_offset = 100
+            for key in ['Age', 'Income', 'LoanAmount']:
+                label = render_text(font, f"{key}:", True, BLACK)
+                screen.blit(label, (50, y_offset))
+                pygame.draw.rect(screen, GRAY if active_field == key else DARK_GRAY, input_boxes[key], 0)
+                text_surface = render_text(font, inputs[key], True, BLACK)
+                screen.blit(text_surface, (input_boxes[key].x + 5, input_boxes[key].y + 5))
+                y_offset += 50
+
+            # Dropdowns
+            dropdown_label_credit = render_text(font, "CreditHistory:", True, BLACK)
+            screen.blit(dropdown_label_credit, (50, y_offset))
+            dropdown_surface_credit = render_text(font, dropdowns['CreditHistory'][dropdown_selected['CreditHistory']], True, BLACK)
+            pygame.draw.rect(screen, DARK_GRAY, dropdown_rects['CreditHistory'], 0) # Draw using the defined rect
+            screen.blit(dropdown_surface_credit, (dropdown_rects['CreditHistory'].x + 5, dropdown_rects['CreditHistory'].y + 5))
+
+            y_offset += 50
+            dropdown_label_employment = render_text(font, "EmploymentStatus:", True, BLACK)
+            screen.blit(dropdown_label_employment, (50, y_offset))
+            dropdown_surface_employment = render_text(font, dropdowns['EmploymentStatus'][dropdown_selected['EmploymentStatus']], True, BLACK)
+            pygame.draw.rect(screen, DARK_GRAY, dropdown_rects['EmploymentStatus'], 0) # Draw using the defined rect
+            screen.blit(dropdown_surface_employment, (dropdown_rects['EmploymentStatus'].x + 5, dropdown_rects['EmploymentStatus'].y + 5))
+
+            # Buttons
+            pygame.draw.rect(screen, GREEN, predict_button)
+            predict_text_render = render_text(font, "Predict Default", True, WHITE)
+            screen.blit(predict_text_render, (predict_button.x + 20, predict_button.y + 5))
+
+            pygame.draw.rect(screen, RED, confusion_button)
+            confusion_text_render = render_text(font, "Show Confusion Matrix", True, WHITE)
+            screen.blit(confusion_text_render, (confusion_button.x + 5, confusion_button.y + 5))
+
+            # Prediction Result
+            prediction_display = render_text(font, f"Prediction: {prediction_text}", True, BLUE)
+            screen.blit(prediction_display, (50, SCREEN_HEIGHT - 50))
+
+            # Evaluation report
+            if shown_report is not None:
+                screen.blit(shown_report, report_rect)
+                pygame.draw.rect(screen, DARK_GRAY, report_rect, 2)
+                close_hint = render_text(font, "Click anywhere to close", True, DARK_GRAY)
+                screen.blit(close_hint, (report_rect.right - close_hint.get_width(), report_rect.bottom + 5))
+        scheduler.end_frame()
+
+        # Event Handling
+        for event in scheduler.events():
+            if event.type == pygame.QUIT:
+                running = False
+                evaluator.shutdown()
+                pygame.quit()
+                sys.exit()
+
+            elif event.type == EVALUATION_READY:
+                if waiting_for_report and event.model_version == models.model_version:
+                    waiting_for_report = False
+                    try:
+                        report, (pixels, size) = evaluator.request().result()
+                        if event.model_version not in report_surfaces:
+                            report_surfaces.clear()
+                            report_surfaces[event.model_version] = pygame.image.frombuffer(pixels, size, "RGBA").convert()
+                        shown_report = report_surfaces[event.model_version]
+                        prediction_text = ''
+                        scheduler.invalidate(report_rect.inflate(0, 60))
+                    except Exception as e:
+                        prediction_text = f"Error: {e}"
+                    scheduler.invalidate(prediction_rect)
+
+            elif event.type == pygame.MOUSEBUTTONDOWN and shown_report is not None:
+                # Close the report
+                shown_report = None
+                scheduler.invalidate()
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                previous_field = active_field
+                active_field = None # Reset active field on each click
+                for key in input_boxes:
+                    if input_boxes[key].collidepoint(event.pos):
+                        active_field = key
+                        break
+                if active_field != previous_field:
+                    scheduler.invalidate(*[input_boxes[key] for key in (previous_field, active_field) if key])
+
+                # Dropdown toggles
+                if dropdown_rects['CreditHistory'].collidepoint(event.pos):
+                    dropdown_selected['CreditHistory'] = (dropdown_selected['CreditHistory'] + 1) % len(dropdowns['CreditHistory'])
+                    inputs['CreditHistory'] = dropdowns['CreditHistory'][dropdown_selected['CreditHistory']] # Update input for consistency
+                    scheduler.invalidate(dropdown_rects['CreditHistory'])
+
+                if dropdown_rects['EmploymentStatus'].collidepoint(event.pos):
+                    dropdown_selected['EmploymentStatus'] = (dropdown_selected['EmploymentStatus'] + 1) % len(dropdowns['EmploymentStatus'])
+                    inputs['EmploymentStatus'] = dropdowns['EmploymentStatus'][dropdown_selected['EmploymentStatus']] # Update input for consistency
+                    scheduler.invalidate(dropdown_rects['EmploymentStatus'])
+
+                # Predict button
+                if predict_button.collidepoint(event.pos):
+                    try:
+                        # Collect inputs
+                        input_data = {
+                            'Age': float(inputs['Age']),
+                            'Income': float(inputs['Income']),
+                            'LoanAmount': float(inputs['LoanAmount']),
+                            'CreditHistory': dropdowns['CreditHistory'][dropdown_selected['CreditHistory']],
+                            'EmploymentStatus': dropdowns['EmploymentStatus'][dropdown_selected['EmploymentStatus']]
+                        }
+
+                        # Scaler and model folded into one linear scorer, so a prediction takes
+                        # microseconds instead of a DataFrame round trip through sklearn
+                        if models.refresh():
+                            evaluator.request()
+                        probability, prediction = models.current[1].score(input_data)
+                        prediction_text = f"{prediction} ({probability:.0%} chance of default)"
+                    except ValueError:
+                        prediction_text = "Error: Please enter valid numbers for Age, Income, and LoanAmount."
+                    except Exception as e:
+                        prediction_text = f"Error: {e}"
+                    scheduler.invalidate(prediction_rect)
+
+                # Confusion button: shows the current model's evaluation report as soon as
+                # it's ready, which is on the next frame when it has been computed already
+                if confusion_button.collidepoint(event.pos):
+                    models.refresh()
+                    waiting_for_report = True
+                    if evaluator.request().done():
+                        pygame.event.post(pygame.event.Event(EVALUATION_READY, model_version=models.model_version))
+                    else:
+                        prediction_text = "Evaluating the model..."
+                        scheduler.invalidate(prediction_rect)
+
+            elif event.type == pygame.KEYDOWN and active_field:
+                scheduler.invalidate(input_boxes[active_field])
+                if event.key == pygame.K_BACKSPACE:
+                    inputs[active_field] = inputs[active_field][:-1]
+                elif event.unicode.isdigit() or (event.unicode == '.' and '.' not in inputs[active_field]): # Allow numbers and one decimal for numerical fields
+                    if active_field in ['Age', 'Income', 'LoanAmount']:
+                        inputs[active_field] += event.unicode
+                elif event.unicode.isalpha(): # Allow letters for categorical fields if you had them (though not directly for these numerical inputs)
+                    pass # This block is not strictly needed for your current inputs as they are numerical or dropdowns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Credit scoring model")
+    parser.add_argument("--train", action="store_true",
+                        help="train the model, save it to ARTIFACT_DIR and exit")
+    parser.add_argument("--data", metavar="CSV",
+                        help="with --train: applications with the feature and Default columns (default: the sample data)")
+    args = parser.parse_args()
+
+    if args.train:
+        pipeline = train_model(args.data)
+        source = os.path.abspath(args.data) if args.data else "sample"
+        manifest = save_artifacts(ARTIFACT_DIR, pipeline, training_data=args.data or "sample",
+                                  training_sources=[source],
+                                  test_accuracy=float(pipeline.model.score(pipeline.X_test, pipeline.y_test)))
+        print(f"Wrote credit model {manifest['model_version']} to {ARTIFACT_DIR}")
+    else:
+        main()
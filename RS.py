@@ -1,7 +1,16 @@
+import argparse
+import csv
+import json
+import os
 import pygame
 import sys
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from ann_index import LSHIndex
+from neighbor_index import GrowableCSR, add_rows, query_top_k, remove_rows
+from recommender_artifacts import build_artifacts, load_or_build
+from lru_cache import LRUCache
+from render_scheduler import RenderScheduler, static_layer
+from text_cache import render_text
+from title_index import TitleIndex, normalize_title
 
 # Sample Bollywood movie dataset (title, description)
 movies = [
@@ -61,44 +70,217 @@ movies = [
 titles = [title for title, desc in movies]
 descriptions = [desc for title, desc in movies]
 
-# Vectorize the descriptions
-vectorizer = TfidfVectorizer()
-tfidf_matrix = vectorizer.fit_transform(descriptions)
+# Only the TOP_K most similar titles are kept per movie instead of the full n x n
+# cosine similarity matrix, so recommend() can return at most TOP_K results.
+TOP_K = 20
+# Worker processes used to build the neighbour index (1 builds in-process).
+NEIGHBOR_JOBS = int(os.environ.get("RS_NEIGHBOR_JOBS", "1"))
+# Fitted vocabulary, TF-IDF matrix and neighbour arrays are kept here between runs
+ARTIFACT_DIR = os.environ.get("RS_ARTIFACT_DIR", "rs_artifacts")
+# "exact" serves the precomputed top-k lists; "approx" skips building them and
+# answers from LSH tables instead, for catalogs too big for an exact index.
+# The ANN_* knobs trade recall for latency (see ann_benchmark.py).
+RECOMMEND_MODE = os.environ.get("RS_RECOMMEND_MODE", "exact")
+ANN_TABLES = int(os.environ.get("RS_ANN_TABLES", "16"))
+ANN_BITS = int(os.environ["RS_ANN_BITS"]) if "RS_ANN_BITS" in os.environ else None  # None sizes it to the catalog
+ANN_PROBES = int(os.environ.get("RS_ANN_PROBES", "4"))
+# Most recent recommend() results kept in memory
+RECOMMEND_CACHE_SIZE = int(os.environ.get("RS_RECOMMEND_CACHE_SIZE", "4096"))
 
-# Compute cosine similarity matrix
-cosine_sim = cosine_similarity(tfidf_matrix)
+# Loaded lazily by load_catalog(): memory-mapped from ARTIFACT_DIR, which is
+# rebuilt automatically when it is missing or was built from a different catalog.
+vectorizer = None
+tfidf_matrix = None
+neighbor_index = None
+ann_index = None
+title_index = None
+# Growable copy of tfidf_matrix, created by the first add_movies()/remove_movies()
+tfidf_rows = None
+# Row numbers of removed titles; rows stay in place so neighbour ids remain valid
+removed_rows = set()
+# Bumped whenever the catalog changes; part of every recommendation cache key
+catalog_version = 0
+# recommend() results keyed on (normalised title, top_n, catalog_version)
+recommendation_cache = LRUCache(RECOMMEND_CACHE_SIZE)
+
+def _catalog_changed():
+    """Invalidates cached recommendations after the catalog was loaded or edited."""
+    global catalog_version
+    catalog_version += 1
+    recommendation_cache.clear()
+
+def load_catalog():
+    """Memory-maps the recommender artifacts (rebuilding stale ones) into the module globals."""
+    global vectorizer, tfidf_matrix, neighbor_index, ann_index
+    vectorizer, tfidf_matrix, neighbor_index = load_or_build(
+        ARTIFACT_DIR, titles, descriptions, TOP_K, n_jobs=NEIGHBOR_JOBS,
+        neighbors=RECOMMEND_MODE == "exact")
+    if RECOMMEND_MODE == "approx":
+        ann_index = LSHIndex(tfidf_matrix, n_tables=ANN_TABLES, n_bits=ANN_BITS, n_probes=ANN_PROBES)
+    _catalog_changed()
+
+def get_title_index():
+    """Builds the exact/prefix/fuzzy title index on first use and returns it."""
+    global title_index
+    if title_index is None:
+        title_index = TitleIndex(titles)
+    return title_index
+
+def get_neighbor_index():
+    """
+    Loads the catalog on first use and returns the index recommend() reads from:
+    the exact NeighborIndex, or the LSHIndex in approximate mode.
+    """
+    if tfidf_matrix is None:
+        load_catalog()
+    return ann_index if RECOMMEND_MODE == "approx" else neighbor_index
+
+def _editable_matrix():
+    global tfidf_rows
+    get_neighbor_index()
+    if tfidf_rows is None:
+        tfidf_rows = GrowableCSR(tfidf_matrix)
+    return tfidf_rows
+
+def add_movies(new_movies):
+    """
+    Adds (title, description) pairs to the catalog without refitting. Descriptions
+    are encoded with the already fitted vocabulary and idf weights (unknown words are
+    ignored), and only the new titles and the titles they become neighbours of are
+    updated. A title that is already in the catalog is replaced.
+    """
+    global tfidf_matrix
+    new_movies = list(new_movies)
+    if not new_movies:
+        return
+    remove_movies([title for title, desc in new_movies])
+
+    rows = _editable_matrix()
+    start = len(titles)
+    for title, desc in new_movies:
+        movies.append((title, desc))
+        titles.append(title)
+        descriptions.append(desc)
+    rows.append(vectorizer.transform([desc for title, desc in new_movies]))
+    tfidf_matrix = rows.matrix()
+
+    if neighbor_index is not None:
+        add_rows(neighbor_index, tfidf_matrix, range(start, len(titles)))
+    if ann_index is not None:
+        ann_index.add(tfidf_matrix, range(start, len(titles)))
+    for idx in range(start, len(titles)):
+        get_title_index().add(idx)
+    _catalog_changed()
+
+def remove_movies(titles_to_remove):
+    """Removes titles from the catalog, recomputing only the neighbour lists that contained them. Returns how many were removed."""
+    global tfidf_matrix
+    matched = {get_title_index().lookup(title) for title in titles_to_remove}
+    matched.discard(-1)
+    if not matched:
+        return 0
+    doomed = sorted(matched)
+
+    rows = _editable_matrix()
+    removed_vectors = tfidf_matrix[doomed].copy()
+    rows.clear_rows(doomed)
+    tfidf_matrix = rows.matrix()
+
+    if neighbor_index is not None:
+        remove_rows(neighbor_index, tfidf_matrix, doomed, removed_vectors)
+    if ann_index is not None:
+        ann_index.update_matrix(tfidf_matrix)
+    for idx in doomed:
+        get_title_index().remove(idx)
+        removed_rows.add(idx)
+    _catalog_changed()
+    return len(doomed)
 
 # Recommendation function
 def recommend(title, top_n=5):
-    # Convert input title to a standardized format (e.g., title case or lowercase)
-    # and compare with standardized titles in the database for robust matching.
-    # For simplicity, let's just convert both to lower for comparison.
-    input_title_lower = title.lower()
-    
-    # Find a matching title from our list (case-insensitive)
-    matched_idx = -1
-    for i, t in enumerate(titles):
-        if t.lower() == input_title_lower:
-            matched_idx = i
-            break
-            
+    # Popular titles are asked for over and over; the version in the key means a
+    # catalog change can never serve a stale answer.
+    get_neighbor_index()
+    key = (normalize_title(title), top_n, catalog_version)
+    cached = recommendation_cache.get(key)
+    if cached is None:
+        cached = tuple(_recommend_uncached(title, top_n))
+        recommendation_cache.put(key, cached)
+    return list(cached)
+
+def _recommend_uncached(title, top_n):
+    # Titles are normalised (case and whitespace) once when the index is built,
+    # so finding the movie is a single dictionary lookup.
+    matched_idx = get_title_index().lookup(title)
+
     if matched_idx == -1:
+        # Offer the closest title by spelling instead of a bare "not found"
+        close = get_title_index().fuzzy(title, limit=1)
+        if close:
+            return [f"Movie not found in database. Did you mean: {titles[close[0][0]]}?"]
         return ["Movie not found in database. Please check the spelling."]
 
-    sim_scores = list(enumerate(cosine_sim[matched_idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-
+    # Neighbours come back best first and never include the movie itself
     recommendations = []
-    # Start from 1 to exclude the movie itself
-    for i, score in sim_scores[1:top_n+1]:
+    for i, score in get_neighbor_index().neighbors(matched_idx, top_n):
         recommendations.append(f"{titles[i]} (Similarity: {score:.2f})")
     return recommendations
 
+def recommend_many(query_titles, top_n=5, batch_size=1024):
+    """
+    Batch version of recommend(): returns one list of (title, similarity) pairs per
+    query title, best first, or an empty list for titles that aren't in the catalog.
+    Exact mode reads the precomputed lists when top_n fits in them, and otherwise
+    scores each batch of queries with one sparse product and a partial sort.
+    """
+    index = get_neighbor_index()
+    rows = [get_title_index().lookup(title) for title in query_titles]
+    found = [i for i, row in enumerate(rows) if row != -1]
+    results = [[] for _ in rows]
+
+    if RECOMMEND_MODE == "approx":
+        for i in found:
+            results[i] = [(titles[j], score) for j, score in index.neighbors(rows[i], top_n)]
+        return results
+
+    found_rows = [rows[i] for i in found]
+    if top_n <= index.top_k:
+        indices = index.indices[found_rows, :top_n]
+        scores = index.scores[found_rows, :top_n]
+    else:
+        indices, scores = query_top_k(tfidf_matrix, found_rows, top_n, batch_size)
+    for i, row_indices, row_scores in zip(found, indices, scores):
+        results[i] = [(titles[j], float(score)) for j, score in zip(row_indices, row_scores) if j >= 0]
+    return results
+
+def export_recommendations(path, top_n=5, batch_size=1024):
+    """
+    Writes recommendations for every title in the catalog to `path` (.csv or .jsonl),
+    batch_size titles at a time so memory stays flat however big the catalog is.
+    Returns the number of titles written.
+    """
+    jsonl = path.endswith(".jsonl")
+    get_neighbor_index()
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None if jsonl else csv.writer(f)
+        if writer:
+            writer.writerow(["title", "rank", "recommendation", "similarity"])
+        for start in range(0, len(titles), batch_size):
+            batch = [titles[i] for i in range(start, min(start + batch_size, len(titles))) if i not in removed_rows]
+            for title, recs in zip(batch, recommend_many(batch, top_n, batch_size)):
+                if jsonl:
+                    f.write(json.dumps({
+                        "title": title,
+                        "recommendations": [{"title": t, "similarity": round(s, 4)} for t, s in recs],
+                    }) + "\n")
+                else:
+                    writer.writerows([title, rank, t, f"{s:.4f}"] for rank, (t, s) in enumerate(recs, 1))
+            written += len(batch)
+    return written
+
 # Pygame setup
-pygame.init()
 WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Bollywood Movie Recommendation System")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -111,22 +293,18 @@ DARK_BLUE = (70, 130, 180)
 BG_TOP = (255, 200, 200) # Light pinkish gradient top
 BG_BOTTOM = (200, 220, 255) # Light pinkish gradient bottom
 
-# Fonts
-font = pygame.font.SysFont("Arial", 24)
-big_font = pygame.font.SysFont("Arial", 36, bold=True)
-title_font = pygame.font.SysFont("Arial", 28, bold=True)
-
 # Input Box
 input_box = pygame.Rect(50, 80, 700, 45)
-input_text = ''
-active = False
 
 # Button
 button_rect = pygame.Rect(330, 140, 140, 45)
 
+# Autocomplete suggestions shown under the input box while typing
+MAX_SUGGESTIONS = 5
+SUGGESTION_HEIGHT = 30
+
 # Output Area
 output_box = pygame.Rect(50, 220, 700, 250)
-recommendations = []
 
 def draw_rounded_rect(surface, color, rect, radius=10):
     """Draw a rounded rectangle."""
@@ -141,82 +319,187 @@ def draw_gradient_background(surface, top_color, bottom_color):
         b = int(top_color[2] * (1 - blend) + bottom_color[2] * blend)
         pygame.draw.line(surface, (r, g, b), (0, y), (WIDTH, y))
 
-running = True
-while running:
-    draw_gradient_background(screen, BG_TOP, BG_BOTTOM)
-
-    # Draw the Title
-    header = title_font.render("Bollywood Movie Recommendation System", True, DARK_GRAY)
-    screen.blit(header, (WIDTH // 2 - header.get_width() // 2, 20))
-
-    # Draw the input label
-    label = font.render("Enter Movie Title:", True, BLACK)
-    screen.blit(label, (50, 50))
-
-    # Draw the input box
-    draw_rounded_rect(screen, WHITE, input_box, radius=8)
-    pygame.draw.rect(screen, BLUE if active else GRAY, input_box, 2, border_radius=8)
-    txt_surface = font.render(input_text, True, BLACK)
-    screen.blit(txt_surface, (input_box.x + 10, input_box.y + 10))
-
-    # Draw the button
-    button_color = DARK_BLUE
-    button_text_color = WHITE
-    if button_rect.collidepoint(pygame.mouse.get_pos()): # Simple hover effect
-        button_color = BLUE 
-    draw_rounded_rect(screen, button_color, button_rect, radius=8)
-    button_text = font.render("Recommend", True, button_text_color)
-    screen.blit(button_text, (button_rect.x + (button_rect.width - button_text.get_width()) // 2, 
-                               button_rect.y + (button_rect.height - button_text.get_height()) // 2))
-
-
-    # Draw the output box
-    draw_rounded_rect(screen, WHITE, output_box, radius=10)
-    pygame.draw.rect(screen, DARK_BLUE, output_box, 2, border_radius=10)
-
-    # Display recommendations
-    y = output_box.y + 20
-    if recommendations:
-        result_label = font.render("Top Recommendations:", True, BLACK)
-        screen.blit(result_label, (output_box.x + 20, y))
-        y += 40
-        for rec in recommendations:
-            # Draw bullet point
-            bullet_x = output_box.x + 30
-            bullet_y = y + 10
-            pygame.draw.circle(screen, DARK_BLUE, (bullet_x, bullet_y), 5)
-            rec_text = font.render(rec, True, DARK_GRAY)
-            screen.blit(rec_text, (bullet_x + 20, y))
-            y += 30 # Move to the next line for the next recommendation
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if input_box.collidepoint(event.pos):
-                active = True
-            else:
-                active = False
-            if button_rect.collidepoint(event.pos):
-                if input_text.strip():
-                    recommendations = recommend(input_text.strip())
-                else:
-                    recommendations = ["Please enter a movie title."]
+def suggestion_rects_for(suggestions):
+    """(rect, title index) pairs for the suggestion rows under the input box."""
+    return [
+        (pygame.Rect(input_box.x, input_box.bottom + n * SUGGESTION_HEIGHT, input_box.width, SUGGESTION_HEIGHT), idx)
+        for n, idx in enumerate(suggestions)
+    ]
+
+# Everything the suggestion list can cover, redrawn when it opens, closes or changes
+suggestion_area = pygame.Rect(input_box.x, input_box.bottom, input_box.width, MAX_SUGGESTIONS * SUGGESTION_HEIGHT)
+
+def main():
+    # The UI only starts when RS.py is run directly, so worker processes (and other
+    # scripts) can import the recommender without opening a window.
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Bollywood Movie Recommendation System")
 
-        elif event.type == pygame.KEYDOWN:
-            if active:
-                if event.key == pygame.K_RETURN:
+    # Fonts
+    font = pygame.font.SysFont("Arial", 24)
+    big_font = pygame.font.SysFont("Arial", 36, bold=True)
+    title_font = pygame.font.SysFont("Arial", 28, bold=True)
+
+    input_text = ''
+    active = False
+    recommendations = []
+    suggestions = []  # title indices matching the current input
+
+    # Load the index before the first frame rather than on the first query
+    get_neighbor_index()
+
+    # The gradient is painted once; every frame just blits it
+    background = static_layer("rs-background", (WIDTH, HEIGHT),
+                              lambda surface: draw_gradient_background(surface, BG_TOP, BG_BOTTOM))
+    scheduler = RenderScheduler(screen)
+    button_hovered = False
+    hovered_suggestion = None
+
+    running = True
+    while running:
+        suggestion_rects = suggestion_rects_for(suggestions) if active else []
+
+        if scheduler.begin_frame():
+            screen.blit(background, (0, 0))
+
+            # Draw the Title
+            header = render_text(title_font, "Bollywood Movie Recommendation System", True, DARK_GRAY)
+            screen.blit(header, (WIDTH // 2 - header.get_width() // 2, 20))
+
+            # Draw the input label
+            label = render_text(font, "Enter Movie Title:", True, BLACK)
+            screen.blit(label, (50, 50))
+
+            # Draw the input box
+            draw_rounded_rect(screen, WHITE, input_box, radius=8)
+            pygame.draw.rect(screen, BLUE if active else GRAY, input_box, 2, border_radius=8)
+            txt_surface = render_text(font, input_text, True, BLACK)
+            screen.blit(txt_surface, (input_box.x + 10, input_box.y + 10))
+
+            # Draw the button
+            button_color = DARK_BLUE
+            button_text_color = WHITE
+            if button_hovered: # Simple hover effect
+                button_color = BLUE 
+            draw_rounded_rect(screen, button_color, button_rect, radius=8)
+            button_text = render_text(font, "Recommend", True, button_text_color)
+            screen.blit(button_text, (button_rect.x + (button_rect.width - button_text.get_width()) // 2, 
+                                       button_rect.y + (button_rect.height - button_text.get_height()) // 2))
+
+
+            # Draw the output box
+            draw_rounded_rect(screen, WHITE, output_box, radius=10)
+            pygame.draw.rect(screen, DARK_BLUE, output_box, 2, border_radius=10)
+
+            # Display recommendations
+            y = output_box.y + 20
+            if recommendations:
+                result_label = render_text(font, "Top Recommendations:", True, BLACK)
+                screen.blit(result_label, (output_box.x + 20, y))
+                y += 40
+                for rec in recommendations:
+                    # Draw bullet point
+                    bullet_x = output_box.x + 30
+                    bullet_y = y + 10
+                    pygame.draw.circle(screen, DARK_BLUE, (bullet_x, bullet_y), 5)
+                    rec_text = render_text(font, rec, True, DARK_GRAY)
+                    screen.blit(rec_text, (bullet_x + 20, y))
+                    y += 30 # Move to the next line for the next recommendation
+
+            # Draw the suggestions last so they overlay the button and output box
+            for rect, idx in suggestion_rects:
+                pygame.draw.rect(screen, BLUE if idx == hovered_suggestion else LIGHT_GRAY, rect)
+                suggestion_text = render_text(font, titles[idx], True, DARK_GRAY)
+                screen.blit(suggestion_text, (rect.x + 10, rect.y + 2))
+        scheduler.end_frame()
+
+        for event in scheduler.events():
+            if event.type == pygame.QUIT:
+                running = False
+
+            elif event.type == pygame.MOUSEMOTION:
+                # Only a change of hover state needs a redraw
+                hovered = button_rect.collidepoint(event.pos)
+                if hovered != button_hovered:
+                    button_hovered = hovered
+                    scheduler.invalidate(button_rect)
+                hovered = next((idx for rect, idx in suggestion_rects if rect.collidepoint(event.pos)), None)
+                if hovered != hovered_suggestion:
+                    hovered_suggestion = hovered
+                    scheduler.invalidate(suggestion_area)
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                # Clicking a suggestion fills in the title and recommends for it
+                picked = [idx for rect, idx in suggestion_rects if rect.collidepoint(event.pos)]
+                if picked:
+                    input_text = titles[picked[0]]
+                    recommendations = recommend(input_text)
+                    suggestions = []
+                    scheduler.invalidate(input_box, suggestion_area, output_box)
+                    continue
+
+                was_active = active
+                if input_box.collidepoint(event.pos):
+                    active = True
+                else:
+                    active = False
+                if active != was_active:
+                    scheduler.invalidate(input_box, suggestion_area)
+                if button_rect.collidepoint(event.pos):
                     if input_text.strip():
                         recommendations = recommend(input_text.strip())
                     else:
                         recommendations = ["Please enter a movie title."]
-                elif event.key == pygame.K_BACKSPACE:
-                    input_text = input_text[:-1]
-                else:
-                    input_text += event.unicode
+                    scheduler.invalidate(output_box)
+
+            elif event.type == pygame.KEYDOWN:
+                if active:
+                    if event.key == pygame.K_RETURN:
+                        if input_text.strip():
+                            recommendations = recommend(input_text.strip())
+                        else:
+                            recommendations = ["Please enter a movie title."]
+                        suggestions = []
+                        scheduler.invalidate(suggestion_area, output_box)
+                        continue
+                    elif event.key == pygame.K_TAB:
+                        # Tab accepts the top suggestion
+                        if suggestions:
+                            input_text = titles[suggestions[0]]
+                    elif event.key == pygame.K_BACKSPACE:
+                        input_text = input_text[:-1]
+                    else:
+                        input_text += event.unicode
+                    # Suggestions only change when the text does, not every frame
+                    suggestions = get_title_index().suggest(input_text, MAX_SUGGESTIONS) if input_text.strip() else []
+                    scheduler.invalidate(input_box, suggestion_area)
+
+    pygame.quit()
+    sys.exit()
 
-    pygame.display.flip()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bollywood movie recommendation system")
+    parser.add_argument("--build", action="store_true",
+                        help="rebuild the recommender artifacts in ARTIFACT_DIR and exit")
+    parser.add_argument("--jobs", type=int, default=NEIGHBOR_JOBS,
+                        help="worker processes for building the neighbour index")
+    parser.add_argument("--mode", choices=["exact", "approx"], default=RECOMMEND_MODE,
+                        help="exact top-k index or approximate LSH search")
+    parser.add_argument("--export", metavar="PATH",
+                        help="write recommendations for every title to PATH (.csv or .jsonl) and exit")
+    parser.add_argument("--top-n", type=int, default=5, help="recommendations per title for --export")
+    parser.add_argument("--batch-size", type=int, default=1024, help="titles scored per batch for --export")
+    args = parser.parse_args()
+    NEIGHBOR_JOBS = args.jobs
+    RECOMMEND_MODE = args.mode
 
-pygame.quit()
-sys.exit()
\ No newline at end of file
+    if args.build:
+        build_artifacts(ARTIFACT_DIR, titles, descriptions, TOP_K, n_jobs=args.jobs,
+                        neighbors=RECOMMEND_MODE == "exact")
+        print(f"Wrote recommender artifacts for {len(titles)} titles to {ARTIFACT_DIR}")
+    elif args.export:
+        count = export_recommendations(args.export, args.top_n, args.batch_size)
+        print(f"Wrote recommendations for {count} titles to {args.export}")
+    else:
+        main()
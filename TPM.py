@@ -6,6 +6,8 @@ import sys
 from sklearn.linear_model import LinearRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
+from render_scheduler import RenderScheduler
+from text_cache import render_text
 
 np.random.seed(42)
 hours = pd.date_range(start='2023-01-01 00:00:00', periods=200, freq='h')
@@ -54,32 +56,35 @@ big_font = pygame.font.SysFont(None, 48)
 
 # Load image
 plot_image = pygame.image.load('traffic_plot.png')
-plot_image = pygame.transform.scale(plot_image, (750, 400)) # Scale to fit window
+plot_image = pygame.transform.scale(plot_image, (750, 400)).convert() # Scale to fit window, in the display's pixel format for fast blits
 
 # Main loop
+scheduler = RenderScheduler(screen)
 running = True
 while running:
-    screen.fill(WHITE)
+    # Everything on screen is static, so it is only drawn on the first frame and
+    # when the window is exposed again; otherwise the loop sleeps in event.wait().
+    if scheduler.begin_frame():
+        screen.fill(WHITE)
 
-    # Title
-    title_surface = big_font.render("Traffic Volume Prediction", True, BLACK)
-    screen.blit(title_surface, (WINDOW_WIDTH // 2 - title_surface.get_width() // 2, 20))
+        # Title
+        title_surface = render_text(big_font, "Traffic Volume Prediction", True, BLACK)
+        screen.blit(title_surface, (WINDOW_WIDTH // 2 - title_surface.get_width() // 2, 20))
 
-    # Metrics
-    mse_surface = font.render(f'Mean Squared Error: {mse:.2f}', True, BLACK)
-    r2_surface = font.render(f'R^2 Score: {r2:.2f}', True, BLACK)
-    screen.blit(mse_surface, (50, 80))
-    screen.blit(r2_surface, (50, 120))
+        # Metrics
+        mse_surface = render_text(font, f'Mean Squared Error: {mse:.2f}', True, BLACK)
+        r2_surface = render_text(font, f'R^2 Score: {r2:.2f}', True, BLACK)
+        screen.blit(mse_surface, (50, 80))
+        screen.blit(r2_surface, (50, 120))
 
-    # Plot
-    screen.blit(plot_image, (25, 160))
+        # Plot
+        screen.blit(plot_image, (25, 160))
+    scheduler.end_frame()
 
     # Event handling
-    for event in pygame.event.get():
+    for event in scheduler.events():
         if event.type == pygame.QUIT:
             running = False
 
-    pygame.display.flip()
-
 pygame.quit()
 sys.exit()
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Recall/latency benchmark for the approximate recommender mode (ann_index.py).
+
+Builds synthetic TF-IDF-like catalogs (Zipf-distributed terms, L2-normalised rows)
+at several sizes and, for a sample of query titles, compares the LSH results with
+the exact cosine top-k:
+
+    python ann_benchmark.py --sizes 10000 100000 1000000 --tables 4 8 16 --bits 12 16
+
+recall@k is the fraction of the exact top-k found by the approximate search.
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+from scipy import sparse
+
+from ann_index import LSHIndex
+from neighbor_index import select_top_k
+
+
+def synthetic_catalog(n_titles, n_terms=20000, terms_per_title=8, seed=0):
+    """Sparse L2-normalised matrix whose term frequencies follow a Zipf law, like real descriptions."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_terms + 1)
+    weights /= weights.sum()
+    cols = rng.choice(n_terms, size=n_titles * terms_per_title, p=weights)
+    rows = np.repeat(np.arange(n_titles), terms_per_title)
+    matrix = sparse.csr_matrix(
+        (rng.random(len(cols), dtype=np.float32) + 0.5, (rows, cols)), shape=(n_titles, n_terms)
+    )
+    matrix.sum_duplicates()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix, dtype=np.float32)
+
+
+def exact_neighbors(matrix, row, top_k):
+    scores = np.asarray((matrix @ matrix[row].T).todense()).ravel()
+    cols, _ = select_top_k(np.arange(len(scores)), scores, top_k, row)
+    return cols
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def run(sizes, tables, bits, probes, top_k, n_queries, seed):
+    print(f"{'titles':>9} {'tables':>6} {'bits':>4} {'probes':>6} {'build s':>8} {'MB':>7} "
+          f"{'recall@' + str(top_k):>9} {'p50 ms':>7} {'p95 ms':>7} {'exact p50 ms':>12}")
+    for n_titles in sizes:
+        matrix = synthetic_catalog(n_titles, seed=seed)
+        rng = np.random.default_rng(seed + 1)
+        queries = rng.choice(n_titles, size=min(n_queries, n_titles), replace=False)
+
+        exact, exact_times = {}, []
+        for row in queries:
+            start = time.perf_counter()
+            exact[row] = exact_neighbors(matrix, row, top_k)
+            exact_times.append(time.perf_counter() - start)
+
+        for n_tables, n_bits, n_probes in itertools.product(tables, bits, probes):
+            start = time.perf_counter()
+            index = LSHIndex(matrix, n_tables=n_tables, n_bits=n_bits, n_probes=n_probes, seed=seed)
+            build_time = time.perf_counter() - start
+
+            hits, expected, times = 0, 0, []
+            for row in queries:
+                start = time.perf_counter()
+                found = index.neighbors(row, top_k)
+                times.append(time.perf_counter() - start)
+                hits += len({i for i, _ in found} & set(exact[row].tolist()))
+                expected += len(exact[row])
+
+            recall = hits / expected if expected else 1.0
+            print(f"{n_titles:>9} {n_tables:>6} {index.n_bits:>4} {n_probes:>6} {build_time:>8.2f} "
+                  f"{index.nbytes / 2**20:>7.1f} {recall:>9.3f} {percentile_ms(times, 50):>7.2f} "
+                  f"{percentile_ms(times, 95):>7.2f} {percentile_ms(exact_times, 50):>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark approximate vs exact recommendations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--tables", type=int, nargs="+", default=[8, 16])
+    parser.add_argument("--bits", type=int, nargs="+", default=[None],
+                        help="bits per table (default: sized to the catalog)")
+    parser.add_argument("--probes", type=int, nargs="+", default=[0, 4])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.tables, args.bits, args.probes, args.top_k, args.queries, args.seed)
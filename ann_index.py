@@ -0,0 +1,115 @@
+"""
+Approximate nearest neighbours for the movie recommender (RS.py) on very large catalogs.
+
+Random-hyperplane LSH (SimHash): every table projects the TF-IDF vectors onto
+`n_bits` random Gaussian directions and buckets titles by the signs. Titles with a
+small angle between them tend to share a bucket, so a query only re-ranks the
+titles found in its bucket of each table (plus `n_probes` neighbouring buckets)
+with the exact cosine. NumPy only.
+
+Recall/latency knobs:
+    n_tables  more tables  -> higher recall, more memory and candidates
+    n_bits    more bits    -> smaller buckets, lower recall, faster queries
+              (default: enough bits for about TARGET_BUCKET_SIZE titles per bucket)
+    n_probes  extra buckets probed per table (flipping the least certain bits)
+"""
+import numpy as np
+from scipy import sparse
+
+from neighbor_index import select_top_k
+
+# Projections are computed this many rows at a time while building
+BUILD_BLOCK_SIZE = 65536
+# Average bucket size aimed for when n_bits is not given
+TARGET_BUCKET_SIZE = 1000
+
+
+class LSHIndex:
+    """Random-projection LSH tables over the rows of an L2-normalised sparse matrix."""
+
+    def __init__(self, matrix, n_tables=16, n_bits=None, n_probes=4, seed=0):
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        if n_bits is None:
+            n_bits = int(np.clip(round(np.log2(max(self.matrix.shape[0], 1) / TARGET_BUCKET_SIZE)), 1, 32))
+        if not 0 < n_bits <= 32:
+            raise ValueError("n_bits must be between 1 and 32")
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_probes = n_probes
+
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((self.matrix.shape[1], n_tables * n_bits)).astype(np.float32)
+        self._bit_weights = (1 << np.arange(n_bits, dtype=np.uint64)).astype(np.uint64)
+
+        codes = np.empty((self.matrix.shape[0], n_tables), dtype=np.uint32)
+        for start in range(0, self.matrix.shape[0], BUILD_BLOCK_SIZE):
+            stop = start + BUILD_BLOCK_SIZE
+            codes[start:stop] = self._codes(self._project(self.matrix[start:stop]))
+
+        # Per table: row ids sorted by bucket code, searched with searchsorted
+        self._order = []
+        self._sorted_codes = []
+        for t in range(n_tables):
+            order = np.argsort(codes[:, t], kind="stable").astype(np.int32)
+            self._order.append(order)
+            self._sorted_codes.append(codes[order, t])
+        # Rows added after the build: per table, bucket code -> list of row ids
+        self._pending = [{} for _ in range(n_tables)]
+
+    @property
+    def nbytes(self):
+        return self._planes.nbytes + sum(o.nbytes + c.nbytes for o, c in zip(self._order, self._sorted_codes))
+
+    def _project(self, rows):
+        return np.asarray(rows @ self._planes).reshape(rows.shape[0], self.n_tables, self.n_bits)
+
+    def _codes(self, projections):
+        bits = (projections > 0).astype(np.uint64)
+        return (bits * self._bit_weights).sum(axis=2).astype(np.uint32)
+
+    def add(self, matrix, new_rows):
+        """Hashes rows appended to the catalog; `matrix` is the updated TF-IDF matrix."""
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        new_rows = np.asarray(new_rows)
+        if len(new_rows) == 0:
+            return
+        codes = self._codes(self._project(self.matrix[new_rows]))
+        for t in range(self.n_tables):
+            for row, code in zip(new_rows, codes[:, t]):
+                self._pending[t].setdefault(int(code), []).append(int(row))
+
+    def update_matrix(self, matrix):
+        """Points the index at an updated matrix, e.g. after rows were cleared (removed)."""
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+
+    def candidates(self, query):
+        """Row ids sharing a probed bucket with the (1 x n_features) sparse query vector."""
+        projection = self._project(query)[0]
+        base = self._codes(projection[np.newaxis])[0]
+        found = []
+        for t in range(self.n_tables):
+            codes = [int(base[t])]
+            # Multi-probe: flip the bits whose projections were closest to the hyperplane
+            for bit in np.argsort(np.abs(projection[t]))[:self.n_probes]:
+                codes.append(int(base[t]) ^ (1 << int(bit)))
+            sorted_codes = self._sorted_codes[t]
+            for code in codes:
+                lo = np.searchsorted(sorted_codes, code, side="left")
+                hi = np.searchsorted(sorted_codes, code, side="right")
+                found.append(self._order[t][lo:hi])
+                pending = self._pending[t].get(code)
+                if pending:
+                    found.append(np.asarray(pending, dtype=np.int32))
+        if not found:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def neighbors(self, row, top_n=5):
+        """Approximate top_n (index, score) pairs for a catalog row, best first."""
+        query = self.matrix[row]
+        cands = self.candidates(query)
+        if len(cands) == 0:
+            return []
+        scores = np.asarray((self.matrix[cands] @ query.T).todense()).ravel()
+        cols, vals = select_top_k(cands, scores, top_n, row)
+        return [(int(i), float(s)) for i, s in zip(cols, vals)]
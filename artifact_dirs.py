@@ -0,0 +1,60 @@
+"""
+Artifact directories shared by the recommender (recommender_artifacts.py) and the
+credit model (credit_artifacts.py).
+
+An artifact is a directory with a manifest.json header next to its data files.
+A build writes everything into a temporary sibling directory (new_directory())
+and swaps it in as a whole at the end (replace_directory()), so readers never
+see a half-written artifact and a crash mid-build leaves the old one in place.
+"""
+import glob
+import json
+import os
+import shutil
+
+MANIFEST_NAME = "manifest.json"
+
+
+def read_manifest(path):
+    """Returns the manifest dict of an artifact directory, or None if there isn't a readable one."""
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path, manifest):
+    with open(os.path.join(path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def new_directory(path):
+    """Creates an empty temporary sibling of `path` to build the next artifact in, and returns it."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    return tmp_path
+
+
+def replace_directory(new_path, path):
+    """
+    Moves the finished directory `new_path` to `path`. The old artifact is renamed
+    aside before and deleted after, rather than deleted first, so a crash halfway
+    leaves it at `path`.old-<pid> instead of losing it; `path` itself is only
+    missing for the instant between the two renames.
+    """
+    old_path = f"{path}.old-{os.getpid()}"
+    shutil.rmtree(old_path, ignore_errors=True)
+    try:
+        os.replace(path, old_path)
+    except FileNotFoundError:
+        old_path = None
+    os.replace(new_path, path)
+    if old_path is not None:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def swap_in_progress(path):
+    """True if `path` is missing because replace_directory() is between its two renames."""
+    return bool(glob.glob(f"{glob.escape(path)}.old-*")) and not os.path.exists(path)
@@ -0,0 +1,252 @@
+"""
+Retention and compaction for the chatbot's database (chat_store.py).
+
+Threads that haven't been active for a while are moved out of the database into
+gzip-compressed JSON Lines files, one per month of last activity
+(chat-2024-05.jsonl.gz, ...), so the hot database only holds recent threads.
+Each run appends one gzip member per file; the archived_threads table records
+the file and member offset of every archived thread, so opening one (see
+ChatStore.load_thread_messages(..., restore=True)) reads just that member and
+moves the thread back into the database.
+
+After archiving, the freed pages are returned to the file system with
+incremental vacuum steps, the full-text index merges some segments, and the
+query planner statistics are refreshed with a bounded ANALYZE. Databases
+created before incremental vacuum was enabled keep their free pages until they
+are switched over once with --full-vacuum, a VACUUM that rewrites the whole
+file and blocks the app's writes while it runs:
+
+    python chat_archive.py --older-than-days 90
+    python chat_archive.py --older-than-days 30 --db chat_history_db --archive-dir chat_archive
+    python chat_archive.py --older-than-days 90 --full-vacuum   # once, in a quiet period
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+
+DEFAULT_ARCHIVE_DIR = "chat_archive"
+BATCH_SIZE = 500
+# Pages freed per incremental vacuum step; each step is a short write transaction
+VACUUM_STEP = 2000
+# Rows sampled per index by ANALYZE
+ANALYSIS_LIMIT = 1000
+
+
+def archive_name(updated_at):
+    """Archive file for a thread last active at `updated_at` (unix seconds)."""
+    return f"chat-{time.strftime('%Y-%m', time.gmtime(updated_at))}.jsonl.gz"
+
+
+def _append_member(path, records):
+    """Appends `records` as one gzip member and returns the member's offset."""
+    with open(path, "ab") as f:
+        offset = f.tell()
+        with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+            for record in records:
+                gz.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    return offset
+
+
+def archive_threads(store, archive_dir, older_than, batch_size=BATCH_SIZE):
+    """
+    Moves threads last active before `older_than` (unix seconds) into archive files
+    and deletes them from the database. Empty threads are just deleted. Returns
+    counts of archived threads, archived messages and deleted empty threads.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    store.flush()
+    conn = store.connection()
+    stats = {"threads": 0, "messages": 0, "empty": 0}
+    last = (float("-inf"), 0)
+    while True:
+        threads = conn.execute("""
+            SELECT id, created_at, updated_at, message_count FROM threads
+            WHERE updated_at < ? AND (updated_at > ? OR (updated_at = ? AND id > ?))
+            ORDER BY updated_at, id LIMIT ?
+        """, (older_than, last[0], last[0], last[1], batch_size)).fetchall()
+        if not threads:
+            break
+        last = (threads[-1][2], threads[-1][0])
+        ids = [t[0] for t in threads]
+        placeholders = ",".join("?" * len(ids))
+        messages = {}
+        for tid, role, content in conn.execute(
+                f"SELECT thread_id, role, content FROM messages WHERE thread_id IN ({placeholders}) "
+                "ORDER BY thread_id, id", ids):
+            messages.setdefault(tid, []).append([role, content])
+        summaries = {
+            tid: [summary, count] for tid, summary, count in conn.execute(
+                f"SELECT thread_id, summary, summarized_count FROM thread_summaries "
+                f"WHERE thread_id IN ({placeholders})", ids)
+        }
+
+        # Write the archive files first; the database only forgets a thread once
+        # its record is safely on disk
+        by_file = {}
+        for tid, created_at, updated_at, _ in threads:
+            if tid in messages:
+                by_file.setdefault(archive_name(updated_at), []).append({
+                    "thread_id": tid, "created_at": created_at, "updated_at": updated_at,
+                    "messages": messages[tid], "summary": summaries.get(tid),
+                })
+        locations = {}
+        for name, records in by_file.items():
+            offset = _append_member(os.path.join(archive_dir, name), records)
+            for record in records:
+                locations[record["thread_id"]] = (name, offset)
+
+        def forget(c):
+            archived = empty = archived_messages = 0
+            now = time.time()
+            for tid, _, updated_at, _ in threads:
+                # Skip threads that got new messages since they were read
+                if c.execute("DELETE FROM threads WHERE id = ? AND updated_at = ?", (tid, updated_at)).rowcount == 0:
+                    continue
+                c.execute("DELETE FROM thread_summaries WHERE thread_id = ?", (tid,))
+                if tid not in locations:
+                    empty += 1
+                    continue
+                count = c.execute("DELETE FROM messages WHERE thread_id = ?", (tid,)).rowcount
+                c.execute(
+                    "INSERT OR REPLACE INTO archived_threads (thread_id, archive, offset, message_count, archived_at) "
+                    "VALUES (?, ?, ?, ?, ?)", (tid, *locations[tid], count, now))
+                archived += 1
+                archived_messages += count
+            return archived, archived_messages, empty
+
+        archived, archived_messages, empty = store.write(forget)
+        stats["threads"] += archived
+        stats["messages"] += archived_messages
+        stats["empty"] += empty
+    return stats
+
+
+def restore_threads(store, thread_ids):
+    """
+    Moves archived threads among `thread_ids` back into the database and returns
+    {thread_id: [(role, content), ...]} for them. Unknown IDs are ignored.
+    """
+    thread_ids = list(thread_ids)
+    placeholders = ",".join("?" * len(thread_ids))
+    locations = store.connection().execute(
+        f"SELECT thread_id, archive, offset FROM archived_threads WHERE thread_id IN ({placeholders})",
+        thread_ids).fetchall()
+    if not locations:
+        return {}
+
+    by_member = {}
+    for tid, name, offset in locations:
+        by_member.setdefault((name, offset), set()).add(tid)
+    records = {}
+    for (name, offset), wanted in by_member.items():
+        with open(os.path.join(store.archive_dir, name), "rb") as f:
+            f.seek(offset)
+            for line in gzip.GzipFile(fileobj=f, mode="rb"):
+                record = json.loads(line)
+                if record["thread_id"] in wanted:
+                    records[record["thread_id"]] = record
+                    wanted.discard(record["thread_id"])
+                    if not wanted:
+                        break
+
+    def move_back(c):
+        for tid, record in records.items():
+            # Another process may have restored it in the meantime
+            if c.execute("DELETE FROM archived_threads WHERE thread_id = ?", (tid,)).rowcount == 0:
+                continue
+            c.executemany("INSERT INTO messages (thread_id, role, content) VALUES (?, ?, ?)",
+                          [(tid, role, content) for role, content in record["messages"]])
+            # Opening it counts as activity, so the next run doesn't archive it right away
+            c.execute("INSERT OR REPLACE INTO threads (id, created_at, updated_at, message_count) VALUES (?, ?, ?, ?)",
+                      (tid, record["created_at"], time.time(), len(record["messages"])))
+            if record.get("summary"):
+                summary, count = record["summary"]
+                c.execute("INSERT OR REPLACE INTO thread_summaries (thread_id, summary, summarized_count, updated_at) "
+                          "VALUES (?, ?, ?, ?)", (tid, summary, count, time.time()))
+
+    store.write(move_back)
+    return {tid: [tuple(message) for message in record["messages"]] for tid, record in records.items()}
+
+
+def incremental_vacuum_enabled(conn):
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def compact(store, vacuum_step=VACUUM_STEP, analysis_limit=ANALYSIS_LIMIT, full_vacuum=False):
+    """
+    Returns free pages to the file system in small incremental-vacuum steps,
+    merges full-text index segments and refreshes planner statistics. A database
+    that isn't in incremental auto-vacuum mode yet keeps its free pages, unless
+    `full_vacuum` allows the one full (blocking) VACUUM that switches it over.
+    Returns counts of pages freed, and whether the database is in incremental
+    mode and a full VACUUM ran.
+    """
+    store.flush()
+    conn = store.connection()
+    incremental = incremental_vacuum_enabled(conn)
+    vacuumed = False
+    if not incremental and full_vacuum:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        incremental = vacuumed = True
+    start_pages = free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0] if incremental else 0
+    while free_pages:
+        # execute() would only step the pragma once, freeing a single page;
+        # executescript() runs it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({vacuum_step});")
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free_pages:
+            break
+        free_pages = remaining
+    freed = start_pages - free_pages
+    # A bounded amount of segment merging work, after the deletes fragmented the index
+    store.write(lambda c: c.execute("INSERT INTO messages_fts (messages_fts, rank) VALUES ('merge', 500)"))
+    conn.execute(f"PRAGMA analysis_limit={analysis_limit}")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"freed_pages": freed, "incremental": incremental, "full_vacuum": vacuumed}
+
+
+def _size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def main():
+    from chat_store import ChatStore
+
+    parser = argparse.ArgumentParser(description="Archive old chat threads and compact the chat database")
+    parser.add_argument("--db", default="chat_history_db", help="chat database file")
+    parser.add_argument("--archive-dir", default=DEFAULT_ARCHIVE_DIR, help="directory for the archive files")
+    parser.add_argument("--older-than-days", type=float, default=90, help="archive threads inactive this long")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="threads archived per transaction")
+    parser.add_argument("--no-compact", action="store_true", help="skip vacuum and analyze")
+    parser.add_argument("--full-vacuum", action="store_true",
+                        help="switch an older database to incremental vacuum with one full, blocking VACUUM")
+    args = parser.parse_args()
+
+    store = ChatStore(args.db, archive_dir=args.archive_dir)
+    before = _size(args.db)
+    start = time.perf_counter()
+    stats = archive_threads(store, args.archive_dir, time.time() - args.older_than_days * 86400, args.batch_size)
+    print(f"archived {stats['threads']} threads ({stats['messages']} messages) to {args.archive_dir}/, "
+          f"deleted {stats['empty']} empty threads in {time.perf_counter() - start:.1f}s")
+    if not args.no_compact:
+        start = time.perf_counter()
+        if args.full_vacuum and not incremental_vacuum_enabled(store.connection()):
+            print("Running a full VACUUM to enable incremental vacuum; writes wait until it finishes...")
+        result = compact(store, full_vacuum=args.full_vacuum)
+        print(f"compacted: freed {result['freed_pages']} pages in {time.perf_counter() - start:.1f}s"
+              + (" (full VACUUM, incremental vacuum enabled)" if result["full_vacuum"] else ""))
+        if not result["incremental"]:
+            print("The database isn't in incremental vacuum mode, so freed pages stay in the file. Run once "
+                  "with --full-vacuum to switch it (a full VACUUM that rewrites the file and blocks writes).")
+    store.close()
+    print(f"database size {before / 2**20:.1f} MB -> {_size(args.db) / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
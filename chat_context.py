@@ -0,0 +1,231 @@
+"""
+Token-budgeted model context for the chatbot (IC.py).
+
+Sending the whole history every turn makes requests grow with the thread. A
+ContextWindow keeps the most recent messages verbatim within `budget` tokens and
+folds older ones into a rolling summary, which is stored in SQLite (see
+ChatStore.save_summary) so it survives restarts and is never recomputed. The
+converted message parts of each thread are cached, so a turn only converts and
+counts the messages added since the previous one.
+
+Summaries run on the window's own pool of MAX_SUMMARIES workers, without holding
+the thread's lock: a burst of slow summary calls waits for one of those workers
+instead of tying up the threads that save messages and serve other requests.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lru_cache import LRUCache
+
+CONTEXT_TOKENS = 8000
+SUMMARY_TOKENS = 1000
+# When the verbatim messages overflow, older ones are folded until the rest fits in
+# this fraction of the budget, so the summary is refreshed every few turns, not every turn
+RECENT_FRACTION = 0.5
+# Threads whose converted messages are kept in memory
+MAX_THREADS = 1024
+# Summaries computed at once; more threads needing one wait
+MAX_SUMMARIES = 4
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and an assistant. "
+    "Keep names, facts, decisions and open questions; use at most {words} words.\n\n"
+    "Summary so far:\n{summary}\n\nNew messages:\n{transcript}\n\nUpdated summary:"
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), no tokenizer needed."""
+    return len(text) // 4 + 1
+
+
+def to_message(role, content):
+    """A message in the model's format."""
+    return {"role": role, "parts": [{"text": content}]}
+
+
+def _clip(text, max_tokens):
+    limit = max_tokens * 4
+    return text if len(text) <= limit else text[-limit:]
+
+
+def _transcript(messages):
+    return "\n".join(f"{msg['role'].capitalize()}: {msg['parts'][0]['text']}" for msg in messages)
+
+
+def truncating_summarizer(summary, messages, max_tokens):
+    """Local summarizer: the previous summary plus the start of each new message, clipped."""
+    lines = [summary] if summary else []
+    lines.extend(f"{msg['role'].capitalize()}: {msg['parts'][0]['text'][:200]}" for msg in messages)
+    return _clip("\n".join(lines), max_tokens)
+
+
+def model_summarizer(model):
+    """Summarizer that asks `model` (a chat_models backend) to update the summary."""
+    def summarize(summary, messages, max_tokens):
+        prompt = SUMMARY_PROMPT.format(words=max_tokens * 3 // 4, summary=summary or "(none)",
+                                       transcript=_transcript(messages))
+        return _clip(model.generate([to_message("user", prompt)]).strip(), max_tokens)
+    return summarize
+
+
+class _ThreadContext:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.messages = []   # converted messages, in history order
+        self.tokens = []     # estimated tokens per message
+        self.summary = None  # summary of messages[:summarized]
+        self.summarized = 0
+        # Bumped when the summary or the cached messages are replaced, so a fold
+        # planned before that is discarded
+        self.generation = 0
+
+
+class _Fold:
+    """Chunks of messages to fold into a thread's summary, planned at `generation`."""
+
+    def __init__(self, thread_id, state, chunks, end):
+        self.thread_id = thread_id
+        self.state = state
+        self.generation = state.generation
+        self.summary = state.summary
+        self.chunks = chunks
+        self.end = end
+
+
+class ContextWindow:
+    """
+    Builds the conversation sent to the model for each turn: a summary of older
+    messages plus as many recent ones as fit in `budget` tokens. `summarizer(summary,
+    messages, max_tokens)` returns the updated summary text; at most `max_summaries`
+    summaries are computed at once.
+    """
+
+    def __init__(self, store, summarizer=truncating_summarizer, budget=CONTEXT_TOKENS,
+                 summary_tokens=SUMMARY_TOKENS, max_threads=MAX_THREADS, max_summaries=MAX_SUMMARIES):
+        self.store = store
+        self.summarizer = summarizer
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self._threads = LRUCache(max_threads)
+        self._lock = threading.Lock()
+        self._summary_pool = ThreadPoolExecutor(max_summaries, thread_name_prefix="chat-summary")
+
+    def _state(self, thread_id):
+        with self._lock:
+            state = self._threads.get(thread_id)
+            if state is None:
+                state = _ThreadContext()
+                self._threads.put(thread_id, state)
+            return state
+
+    def build(self, thread_id, history, user_input):
+        """
+        Returns the model conversation for `user_input` given the thread's `history`
+        ({"role", "content"} dicts, which may already end with this user message).
+        """
+        folded = False
+        while True:
+            conversation, fold = self._prepare(thread_id, history, user_input, fold=not folded)
+            if fold is None:
+                return conversation
+            folded = self._apply(fold, self._summary_pool.submit(self._summarize, fold).result())
+
+    async def build_async(self, thread_id, history, user_input):
+        """build() for the event loop: SQLite in worker threads, summaries on the summary pool."""
+        loop = asyncio.get_running_loop()
+        folded = False
+        while True:
+            conversation, fold = await asyncio.to_thread(self._prepare, thread_id, history, user_input, not folded)
+            if fold is None:
+                return conversation
+            summary = await loop.run_in_executor(self._summary_pool, self._summarize, fold)
+            folded = await asyncio.to_thread(self._apply, fold, summary)
+
+    def _prepare(self, thread_id, history, user_input, fold=True):
+        """
+        Brings the thread's cached messages up to date with `history` and returns
+        (conversation, None), or (None, a _Fold) if `fold` and older messages must
+        be folded into the summary first.
+        """
+        n = len(history)
+        if n and history[-1]["role"] == "user" and history[-1]["content"] == user_input:
+            n -= 1
+        state = self._state(thread_id)
+        with state.lock:
+            if not state.loaded:
+                state.summary, state.summarized = self.store.load_summary(thread_id)
+                state.loaded = True
+            if len(state.messages) > n:
+                # A different (shorter) history than the one cached: start over
+                state.messages, state.tokens = [], []
+                state.generation += 1
+            if state.summarized > n:
+                state.summary, state.summarized = None, 0
+                state.generation += 1
+            for msg in history[len(state.messages):n]:
+                state.messages.append(to_message(msg["role"], msg["content"]))
+                state.tokens.append(estimate_tokens(msg["content"]))
+
+            recent_budget = max(0, self.budget - self.summary_tokens - estimate_tokens(user_input))
+            if fold and sum(state.tokens[state.summarized:n]) > recent_budget:
+                return None, self._plan_fold(thread_id, state, n, int(recent_budget * RECENT_FRACTION))
+            conversation = state.messages[state.summarized:n]
+            summary = state.summary
+
+        conversation.append(to_message("user", user_input))
+        if summary:
+            # Prepend the summary to the first message as an extra part (without
+            # touching the cached message)
+            first = conversation[0]
+            conversation[0] = {
+                "role": first["role"],
+                "parts": [{"text": f"Summary of the earlier conversation:\n{summary}"}] + first["parts"],
+            }
+        return conversation, None
+
+    def _plan_fold(self, thread_id, state, n, keep_tokens):
+        """The fold that leaves messages[summarized:n] within keep_tokens (called under state.lock)."""
+        end, kept = n, 0
+        while end > state.summarized and kept + state.tokens[end - 1] <= keep_tokens:
+            end -= 1
+            kept += state.tokens[end]
+        # Keep the verbatim part starting at a user message
+        while end < n and state.messages[end]["role"] != "user":
+            end += 1
+
+        chunks = []
+        start = state.summarized
+        while start < end:
+            # Summarize in chunks that fit in the budget themselves
+            stop, size = start, 0
+            while stop < end and (stop == start or size + state.tokens[stop] <= self.budget):
+                size += state.tokens[stop]
+                stop += 1
+            chunks.append(state.messages[start:stop])
+            start = stop
+        return _Fold(thread_id, state, chunks, end)
+
+    def _summarize(self, fold):
+        summary = fold.summary
+        for chunk in fold.chunks:
+            try:
+                summary = self.summarizer(summary, chunk, self.summary_tokens)
+            except Exception as e:
+                print(f"Error summarizing conversation: {e}")
+                summary = truncating_summarizer(summary, chunk, self.summary_tokens)
+        return summary
+
+    def _apply(self, fold, summary):
+        """Stores the folded summary; returns False if the thread changed since the fold was planned."""
+        state = fold.state
+        with state.lock:
+            if state.generation != fold.generation:
+                # Another turn of this thread folded it (or its history was reset) meanwhile
+                return False
+            state.summary, state.summarized = summary, fold.end
+            state.generation += 1
+            self.store.save_summary(fold.thread_id, state.summary, state.summarized)
+        return True
@@ -0,0 +1,394 @@
+"""
+Offline load test for the chatbot (IC.py).
+
+Imports IC.py against a temporary database, swaps its model for a local stub with
+randomized timing (log-normal time to first token, normally distributed token
+rate, random reply length) and runs simulated users through respond(), either
+by calling the handler directly on one event loop or over HTTP against the Gradio
+app launched locally (needs gradio_client, which comes with gradio):
+
+    python chat_load_test.py --users 200 --turns 5
+    python chat_load_test.py --users 200 --turns 5 --http
+    python chat_load_test.py --users 500 --ttft-ms 800 --tokens-per-second 30 --max-in-flight 128
+
+Reports time to the first update and to the end of each turn (p50/p95/p99),
+throughput, SQLite write-lock waits and process memory growth. With --report the
+results are written to a JSON file; a later run with --baseline compares against
+it and exits with an error if latency, throughput, lock waits or memory got worse
+by more than --tolerance:
+
+    python chat_load_test.py --users 200 --report baseline.json
+    python chat_load_test.py --users 200 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from chat_models import ChatModel
+from chat_stream_benchmark import percentile
+
+# Replies that failed in the model end with this message (see IC.final_response)
+MODEL_ERROR_MARKER = "Sorry, something went wrong with the AI model"
+
+# First-turn questions for --repeat; a repeated context is served by the response cache
+COMMON_QUESTIONS = [
+    "What can you help me with?",
+    "Summarize the news for today.",
+    "How do I reverse a list in Python?",
+    "Tell me a joke.",
+    "What is the capital of France?",
+]
+
+# Metrics compared against --baseline: (worse when higher, absolute slack)
+BASELINE_METRICS = {
+    "ttft_p95_ms": (True, 5.0),
+    "latency_p95_ms": (True, 5.0),
+    "latency_p99_ms": (True, 10.0),
+    "turns_per_second": (False, 0.0),
+    "lock_wait_seconds": (True, 0.05),
+    "memory_growth_mb": (True, 5.0),
+}
+
+
+class StubModel(ChatModel):
+    """
+    Stand-in for the model with randomized timing: the first chunk arrives after a
+    log-normally distributed delay (median `ttft`, log-space spread `ttft_sigma`),
+    the rest streams at a normally distributed rate (`tokens_per_second`, standard
+    deviation `rate_sd`) in chunks of `chunk_tokens` words. Replies are
+    `min_tokens` to `max_tokens` words long; a fraction `error_rate` of them fail
+    part-way through.
+    """
+
+    def __init__(self, ttft=0.4, ttft_sigma=0.5, tokens_per_second=60.0, rate_sd=15.0,
+                 min_tokens=20, max_tokens=200, chunk_tokens=5, error_rate=0.0, seed=0):
+        self.ttft = ttft
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.rate_sd = rate_sd
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _plan(self):
+        """Timing of one reply: (first chunk delay, seconds per chunk, chunks, failing chunk or None)."""
+        with self._lock:
+            self.calls += 1
+            rng = self._rng
+            ttft = rng.lognormvariate(0, self.ttft_sigma) * self.ttft if self.ttft > 0 else 0.0
+            rate = max(1.0, rng.gauss(self.tokens_per_second, self.rate_sd))
+            chunks = -(-rng.randint(self.min_tokens, self.max_tokens) // self.chunk_tokens)
+            fail_at = rng.randrange(chunks) if rng.random() < self.error_rate else None
+        return ttft, self.chunk_tokens / rate, chunks, fail_at
+
+    def _chunk(self, i):
+        words = " ".join(f"tok{i * self.chunk_tokens + j}" for j in range(self.chunk_tokens))
+        return words if i == 0 else " " + words
+
+    def stream(self, conversation):
+        ttft, interval, chunks, fail_at = self._plan()
+        time.sleep(ttft)
+        for i in range(chunks):
+            if i:
+                time.sleep(interval)
+            if i == fail_at:
+                raise RuntimeError("stub model failure")
+            yield self._chunk(i)
+
+    async def astream(self, conversation):
+        ttft, interval, chunks, fail_at = self._plan()
+        await asyncio.sleep(ttft)
+        for i in range(chunks):
+            if i:
+                await asyncio.sleep(interval)
+            if i == fail_at:
+                raise RuntimeError("stub model failure")
+            yield self._chunk(i)
+
+
+def rss_bytes():
+    """Resident memory of this process (Linux), or its peak elsewhere; 0 if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler:
+    """Samples the resident memory in a background thread to catch the peak."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.start = self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        gc.collect()
+        self.end = rss_bytes()
+        self.peak = max(self.peak, self.end)
+
+
+class Results:
+    """Per-turn timings collected from all simulated users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ttft = []
+        self.latency = []
+        self.model_errors = 0
+        self.errors = []
+
+    def add(self, first, total, reply):
+        with self._lock:
+            self.ttft.append(total if first is None else first)
+            self.latency.append(total)
+            if MODEL_ERROR_MARKER in reply:
+                self.model_errors += 1
+
+    def fail(self, error):
+        with self._lock:
+            self.errors.append(repr(error))
+
+
+def make_prompt(rng, user, turn, repeat):
+    if turn == 0 and rng.random() < repeat:
+        return rng.choice(COMMON_QUESTIONS)
+    words = " ".join(f"topic{rng.randrange(1000)}" for _ in range(rng.randint(5, 30)))
+    return f"User {user}, question {turn}: {words}?"
+
+
+def think_time(rng, mean):
+    return rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+
+async def run_direct(ic, args, results):
+    """All users on one event loop, calling IC.respond() like Gradio's queue would."""
+    async def user(u):
+        rng = random.Random(args.seed * 1000003 + u)
+        await asyncio.sleep(rng.uniform(0, args.ramp))
+        try:
+            _, _, thread_id, history = await ic.reset_chat()
+        except Exception as e:
+            results.fail(e)
+            return
+        for turn in range(args.turns):
+            message = make_prompt(rng, u, turn, args.repeat)
+            start = time.perf_counter()
+            first = None
+            try:
+                async for _ in ic.respond(message, history, thread_id, 0):
+                    if first is None:
+                        first = time.perf_counter() - start
+            except Exception as e:
+                results.fail(e)
+                continue
+            results.add(first, time.perf_counter() - start, history[-1]["content"])
+            await asyncio.sleep(think_time(rng, args.think))
+
+    await asyncio.gather(*(user(u) for u in range(args.users)))
+
+
+def run_http(ic, args, results):
+    """One gradio_client session per user thread against the app served on localhost."""
+    from gradio_client import Client
+
+    ic.demo.queue(default_concurrency_limit=ic.MAX_IN_FLIGHT, max_size=ic.QUEUE_SIZE)
+    _, url, _ = ic.demo.launch(server_name="127.0.0.1", server_port=args.port,
+                               prevent_thread_lock=True, quiet=True)
+
+    def user(u):
+        rng = random.Random(args.seed * 1000003 + u)
+        time.sleep(rng.uniform(0, args.ramp))
+        try:
+            client = Client(url, verbose=False)
+            # Gives the session its own thread, like the "New Chat" button
+            client.predict(api_name="/reset_chat")
+        except Exception as e:
+            results.fail(e)
+            return
+        for turn in range(args.turns):
+            message = make_prompt(rng, u, turn, args.repeat)
+            start = time.perf_counter()
+            first = None
+            try:
+                job = client.submit(message, api_name="/respond")
+                for _ in job:
+                    if first is None:
+                        first = time.perf_counter() - start
+                output = job.result()
+            except Exception as e:
+                results.fail(e)
+                continue
+            results.add(first, time.perf_counter() - start, str(output))
+            time.sleep(think_time(rng, args.think))
+
+    threads = [threading.Thread(target=user, args=(u,), daemon=True) for u in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ic.demo.close()
+
+
+def summarize(args, results, elapsed, lock_before, lock_after, memory):
+    turns = len(results.latency)
+    ms = lambda values, q: percentile(values, q) * 1000 if values else 0.0
+    return {
+        "mode": "http" if args.http else "direct",
+        "users": args.users,
+        "turns_per_user": args.turns,
+        "turns": turns,
+        "errors": len(results.errors),
+        "model_errors": results.model_errors,
+        "elapsed_seconds": elapsed,
+        "turns_per_second": turns / elapsed if elapsed else 0.0,
+        "ttft_p50_ms": ms(results.ttft, 0.5),
+        "ttft_p95_ms": ms(results.ttft, 0.95),
+        "ttft_p99_ms": ms(results.ttft, 0.99),
+        "latency_p50_ms": ms(results.latency, 0.5),
+        "latency_p95_ms": ms(results.latency, 0.95),
+        "latency_p99_ms": ms(results.latency, 0.99),
+        "writes": lock_after["writes"] - lock_before["writes"],
+        "lock_waits": lock_after["lock_waits"] - lock_before["lock_waits"],
+        "lock_wait_seconds": lock_after["lock_wait_seconds"] - lock_before["lock_wait_seconds"],
+        "max_lock_wait_ms": lock_after["max_lock_wait"] * 1000,
+        "memory_start_mb": memory.start / 2**20,
+        "memory_peak_mb": memory.peak / 2**20,
+        "memory_end_mb": memory.end / 2**20,
+        "memory_growth_mb": (memory.end - memory.start) / 2**20,
+    }
+
+
+def print_report(report, results):
+    print(f"mode={report['mode']} users={report['users']} turns/user={report['turns_per_user']}")
+    print(f"{report['turns']} turns in {report['elapsed_seconds']:.1f}s: {report['turns_per_second']:.1f} turns/s, "
+          f"{report['errors']} failed requests, {report['model_errors']} model errors")
+    print(f"first update: p50 {report['ttft_p50_ms']:.0f} ms, p95 {report['ttft_p95_ms']:.0f} ms, "
+          f"p99 {report['ttft_p99_ms']:.0f} ms")
+    print(f"whole turn:   p50 {report['latency_p50_ms']:.0f} ms, p95 {report['latency_p95_ms']:.0f} ms, "
+          f"p99 {report['latency_p99_ms']:.0f} ms")
+    print(f"sqlite: {report['writes']} write transactions, {report['lock_waits']} waited for the lock, "
+          f"{report['lock_wait_seconds'] * 1000:.0f} ms waiting in total, longest {report['max_lock_wait_ms']:.1f} ms")
+    per_turn = report["memory_growth_mb"] * 1024 / report["turns"] if report["turns"] else 0.0
+    print(f"memory: {report['memory_start_mb']:.0f} MB -> {report['memory_end_mb']:.0f} MB "
+          f"(peak {report['memory_peak_mb']:.0f} MB, {per_turn:+.1f} KB/turn)")
+    for error in sorted(set(results.errors))[:5]:
+        print(f"error: {error}")
+
+
+def compare(report, baseline, tolerance):
+    """Lines describing the metrics that regressed against `baseline`."""
+    regressions = []
+    for name, (higher_is_worse, slack) in BASELINE_METRICS.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name], report[name]
+        if higher_is_worse:
+            worse = new > old * (1 + tolerance) + slack
+        else:
+            worse = new < old * (1 - tolerance) - slack
+        if worse:
+            regressions.append(f"{name}: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chatbot offline with a stub model")
+    parser.add_argument("--users", type=int, default=100, help="simulated users")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--http", action="store_true", help="go through the Gradio HTTP endpoint instead of calling respond()")
+    parser.add_argument("--port", type=int, help="with --http: port for the local server (default: any free port)")
+    parser.add_argument("--ramp", type=float, default=1.0, help="users start spread over this many seconds")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds a user waits between turns")
+    parser.add_argument("--repeat", type=float, default=0.0, help="fraction of first turns that ask a common question")
+    parser.add_argument("--ttft-ms", type=float, default=400, help="stub model: median time to the first chunk")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5, help="stub model: log-normal spread of that time")
+    parser.add_argument("--tokens-per-second", type=float, default=60, help="stub model: mean streaming rate")
+    parser.add_argument("--rate-sd", type=float, default=15, help="stub model: standard deviation of the rate")
+    parser.add_argument("--min-tokens", type=int, default=20, help="stub model: shortest reply")
+    parser.add_argument("--max-tokens", type=int, default=200, help="stub model: longest reply")
+    parser.add_argument("--chunk-tokens", type=int, default=5, help="stub model: words per streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub model: fraction of replies that fail")
+    parser.add_argument("--max-in-flight", type=int, help="CHAT_MAX_IN_FLIGHT for the app")
+    parser.add_argument("--write-behind", action="store_true", help="CHAT_WRITE_BEHIND=1 for the app")
+    parser.add_argument("--cache-scope", default="global", help="CHAT_CACHE_SCOPE for the app (global, thread, off)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the JSON report of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression against --baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # IC.py reads its configuration when it is imported
+        os.environ["CHAT_MODEL"] = "fake"
+        os.environ["CHAT_DB"] = os.path.join(tmp_dir, "chat_history_db")
+        os.environ["CHAT_ARCHIVE_DIR"] = os.path.join(tmp_dir, "chat_archive")
+        os.environ["CHAT_CACHE_SCOPE"] = args.cache_scope
+        if args.max_in_flight:
+            os.environ["CHAT_MAX_IN_FLIGHT"] = str(args.max_in_flight)
+        if args.write_behind:
+            os.environ["CHAT_WRITE_BEHIND"] = "1"
+        import IC
+        from chat_context import model_summarizer
+
+        stub = StubModel(ttft=args.ttft_ms / 1000, ttft_sigma=args.ttft_sigma,
+                         tokens_per_second=args.tokens_per_second, rate_sd=args.rate_sd,
+                         min_tokens=args.min_tokens, max_tokens=args.max_tokens,
+                         chunk_tokens=args.chunk_tokens, error_rate=args.error_rate, seed=args.seed)
+        IC.model = stub
+        IC.context.summarizer = model_summarizer(stub)
+
+        results = Results()
+        lock_before = IC.store.lock_stats()
+        memory = MemorySampler()
+        start = time.perf_counter()
+        if args.http:
+            run_http(IC, args, results)
+        else:
+            asyncio.run(run_direct(IC, args, results))
+        elapsed = time.perf_counter() - start
+        IC.store.flush()
+        memory.stop()
+        report = summarize(args, results, elapsed, lock_before, IC.store.lock_stats(), memory)
+        IC.store.close()
+
+    print_report(report, results)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            raise SystemExit("regressed against the baseline:\n  " + "\n  ".join(regressions))
+        print(f"within {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Model backends for the chatbot (IC.py).
+
+A backend takes the conversation as a list of {"role": "user"/"assistant",
+"parts": [{"text": ...}]} messages and streams the reply as text chunks, either
+blocking or as an async iterator:
+
+    model = load_model("fake")
+    for chunk in model.stream(conversation):
+        ...
+    async for chunk in model.astream(conversation):
+        ...
+
+"gemini" talks to the Gemini API (google-generativeai is only imported when this
+backend is created); "fake" generates a canned reply locally with configurable
+delays, so streaming and time-to-first-token can be measured offline.
+"""
+import asyncio
+import time
+
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash"
+
+_DONE = object()
+
+
+class ChatModel:
+    """
+    Base class: subclasses implement stream() and, if they have a native async
+    client, astream(). generate() joins the chunks.
+    """
+
+    def stream(self, conversation):
+        raise NotImplementedError
+
+    async def astream(self, conversation):
+        # Fallback for blocking clients: pull each chunk in a worker thread
+        chunks = iter(self.stream(conversation))
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, _DONE)
+            if chunk is _DONE:
+                return
+            yield chunk
+
+    def generate(self, conversation):
+        return "".join(self.stream(conversation))
+
+
+class GeminiModel(ChatModel):
+    """Streams replies from the Gemini API."""
+
+    def __init__(self, model_name=DEFAULT_GEMINI_MODEL, api_key=None):
+        import google.generativeai as genai
+
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    @staticmethod
+    def _contents(conversation):
+        # Gemini calls the assistant role "model"
+        return [
+            {"role": "model" if msg["role"] == "assistant" else msg["role"], "parts": msg["parts"]}
+            for msg in conversation
+        ]
+
+    def stream(self, conversation):
+        for chunk in self.model.generate_content(self._contents(conversation), stream=True):
+            text = chunk.text
+            if text:
+                yield text
+
+    async def astream(self, conversation):
+        response = await self.model.generate_content_async(self._contents(conversation), stream=True)
+        async for chunk in response:
+            text = chunk.text
+            if text:
+                yield text
+
+
+class FakeStreamingModel(ChatModel):
+    """
+    Local stand-in that streams `reply` (by default an echo of the last user
+    message) word by word: `first_token_delay` seconds before the first chunk,
+    `token_delay` seconds between the following ones.
+    """
+
+    def __init__(self, reply=None, first_token_delay=0.3, token_delay=0.02, words=40):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.words = words
+
+    def _reply_for(self, conversation):
+        if self.reply is not None:
+            return self.reply
+        last = conversation[-1]["parts"][0]["text"] if conversation else ""
+        filler = " ".join(f"word{i}" for i in range(self.words))
+        return f"You said: {last}. {filler}"
+
+    def stream(self, conversation):
+        words = self._reply_for(conversation).split(" ")
+        time.sleep(self.first_token_delay)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+    async def astream(self, conversation):
+        words = self._reply_for(conversation).split(" ")
+        await asyncio.sleep(self.first_token_delay)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+BACKENDS = {
+    "gemini": GeminiModel,
+    "fake": FakeStreamingModel,
+}
+
+
+def load_model(name, **kwargs):
+    """Creates the backend registered under `name` ("gemini" or "fake")."""
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown chat model backend {name!r}; choose from {sorted(BACKENDS)}") from None
+    return backend(**kwargs)
@@ -0,0 +1,184 @@
+"""
+Full-text search over the chatbot's history (IC.py), using the messages_fts FTS5
+index that ChatStore keeps in sync with the messages table.
+
+FTS5's own bm25() counts the documents of every query term on each search,
+which means reading the whole posting list of common words (hundreds of
+milliseconds on millions of messages). Instead, the newest MAX_CANDIDATES
+matching messages are fetched in rowid order, which FTS5 does cheaply, and
+ranked here with BM25 using estimated document frequencies that are cached per
+database and term, and re-estimated once the database has grown by more than
+DF_MAX_GROWTH since. Results are grouped by thread: each matching thread is listed once, with
+a highlighted snippet of its best-matching message.
+
+When a query has more matches than that, older messages could match better, so
+a second pass asks FTS5 for its RANKED_CANDIDATES best matches by `rank` over
+the whole index, within RANK_PASS_BUDGET. For words too common to rank in that
+time the pass is abandoned: the results are then the best of the recent
+matches only, and are marked as such (recent_only).
+"""
+import math
+import re
+import string
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from lru_cache import LRUCache
+
+MAX_RESULTS = 20
+MAX_CANDIDATES = 1000
+SNIPPET_TOKENS = 12
+# Second pass over the whole index for queries with more than MAX_CANDIDATES matches
+RANKED_CANDIDATES = 200
+RANK_PASS_BUDGET = 0.025
+# Document frequencies are counted exactly up to this many matches and
+# extrapolated from the match density beyond it
+DF_SAMPLE = 10000
+# A cached document frequency is re-estimated once the number of messages has
+# moved by more than this fraction since it was estimated
+DF_MAX_GROWTH = 0.1
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_PUNCTUATION_TO_SPACE = str.maketrans({ch: " " for ch in string.punctuation if ch != "_"})
+
+# (database path, term query) -> (document frequency, message count when estimated)
+_df_cache = LRUCache(4096)
+_df_lock = threading.Lock()
+
+
+def _fold(text):
+    """Lower-cases and strips diacritics, like the index's unicode61 tokenizer."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def query_terms(text):
+    """The words of free text, folded like the index's tokens."""
+    return _WORD.findall(_fold(text))
+
+
+def to_fts_query(terms):
+    """
+    FTS5 query matching messages that contain all `terms` as whole words. Prefix
+    queries are deliberately not offered: they merge the posting lists of every
+    term with that prefix, which is slow on large databases.
+    """
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def _document_frequency(store, conn, term_query, total):
+    key = (store.path, term_query)
+    with _df_lock:
+        cached = _df_cache.get(key)
+    if cached is not None and abs(total - cached[1]) <= DF_MAX_GROWTH * cached[1]:
+        return cached[0]
+    row = conn.execute(
+        "SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+        (term_query, DF_SAMPLE - 1)).fetchone()
+    if row is None:
+        df = conn.execute(
+            "SELECT COUNT(*) FROM messages_fts WHERE messages_fts MATCH ?", (term_query,)).fetchone()[0]
+    else:
+        # DF_SAMPLE matches among the newest (total - row) messages
+        df = min(total, DF_SAMPLE * total / max(1, total - row[0] + 1))
+    with _df_lock:
+        _df_cache.put(key, (df, total))
+    return df
+
+
+def _best_ranked(conn, query, n, budget):
+    """Rowids of FTS5's `n` best matches of `query`, or None if ranking them takes longer than `budget` seconds."""
+    deadline = time.perf_counter() + budget
+    conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?", (query, n))]
+    except sqlite3.OperationalError as e:
+        if "interrupt" not in str(e):
+            raise
+        return None
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def search_threads(store, text, limit=MAX_RESULTS, max_candidates=MAX_CANDIDATES, rank_budget=RANK_PASS_BUDGET):
+    """
+    Returns up to `limit` matching threads, best first, as dicts with thread_id,
+    message_id, role, snippet (matches wrapped in <mark>), score and recent_only
+    (True when only the newest `max_candidates` matches could be ranked).
+    """
+    terms = query_terms(text)
+    if not terms:
+        return []
+    query = to_fts_query(terms)
+    store.flush()
+    conn = store.connection()
+    candidates = conn.execute("""
+        SELECT m.id, m.thread_id, m.role, m.content
+        FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH ?
+        ORDER BY messages_fts.rowid DESC LIMIT ?
+    """, (query, max_candidates)).fetchall()
+    if not candidates:
+        return []
+
+    recent_only = False
+    if len(candidates) == max_candidates:
+        ranked = _best_ranked(conn, query, RANKED_CANDIDATES, rank_budget)
+        if ranked is None:
+            recent_only = True
+        else:
+            seen = {row[0] for row in candidates}
+            older = [rowid for rowid in ranked if rowid not in seen]
+            if older:
+                candidates += conn.execute(
+                    f"SELECT id, thread_id, role, content FROM messages WHERE id IN ({','.join('?' * len(older))})",
+                    older).fetchall()
+
+    total = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 1
+    idf = []
+    for term in terms:
+        df = _document_frequency(store, conn, to_fts_query([term]), total)
+        idf.append(math.log((total - df + 0.5) / (df + 0.5) + 1))
+
+    # str.split() after blanking ASCII punctuation is several times faster than a
+    # regex tokenizer, which matters with thousands of candidates per search
+    tokenized = [_fold(content).translate(_PUNCTUATION_TO_SPACE).split() for _, _, _, content in candidates]
+    avg_length = sum(len(tokens) for tokens in tokenized) / len(tokenized) or 1
+    best = {}
+    for (message_id, thread_id, role, _), tokens in zip(candidates, tokenized):
+        norm = K1 * (1 - B + B * len(tokens) / avg_length)
+        score = 0.0
+        for term, weight in zip(terms, idf):
+            tf = tokens.count(term)
+            score += weight * tf * (K1 + 1) / (tf + norm)
+        # Candidates come newest first, so on equal scores the newer message wins
+        if thread_id not in best or score > best[thread_id]["score"]:
+            best[thread_id] = {"thread_id": thread_id, "message_id": message_id, "role": role, "score": score,
+                               "recent_only": recent_only}
+
+    results = sorted(best.values(), key=lambda r: -r["score"])[:limit]
+    for result in results:
+        result["snippet"] = conn.execute(
+            f"SELECT snippet(messages_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) "
+            "FROM messages_fts WHERE messages_fts MATCH ? AND rowid = ?",
+            (query, result["message_id"])).fetchone()[0]
+    return results
+
+
+def format_results(results):
+    """Markdown list of search results for the sidebar."""
+    if not results:
+        return "No matching messages."
+    lines = [f"- **Thread {r['thread_id']}** · {r['role'].capitalize()}: {r['snippet']}" for r in results]
+    if results[0]["recent_only"]:
+        lines.append(f"\n_Too many matches to rank them all: these are the best of the {MAX_CANDIDATES} most "
+                     "recent. Add words to narrow the search._")
+    return "\n".join(lines)
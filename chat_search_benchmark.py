@@ -0,0 +1,96 @@
+"""
+Search latency benchmark for the chat history full-text index (chat_search.py).
+
+Fills a chat database with synthetic messages (Zipf-distributed vocabulary, so
+there are both very common and rare words) and times searches for words of
+different frequencies:
+
+    python chat_search_benchmark.py --messages 3000000 --db /tmp/chat_bench_db
+    python chat_search_benchmark.py --db /tmp/chat_bench_db   # reuse the filled database
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from chat_search import search_threads
+from chat_store import ChatStore
+
+VOCABULARY = 50000
+
+
+def word(i):
+    return f"w{i}"
+
+
+def fill(store, messages, seed, batch=20000):
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+    words = [word(i) for i in range(VOCABULARY)]
+    thread_id = store.create_thread()
+    written = 0
+    while written < messages:
+        rows = []
+        for _ in range(min(batch, messages - written)):
+            if rng.random() < 0.02:
+                thread_id = store.create_thread()
+            text = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(8, 60)))
+            rows.append((thread_id, "user" if written % 2 == 0 else "assistant", text))
+            written += 1
+        store.write(store._insert_messages, rows)
+        print(f"\r{written}/{messages} messages", end="", flush=True)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full-text search over the chat history")
+    parser.add_argument("--messages", type=int, default=1000000, help="messages to generate into an empty database")
+    parser.add_argument("--db", help="database file (default: a fresh temporary file)")
+    parser.add_argument("--queries", type=int, default=50, help="searches per word frequency class")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    path = args.db
+    if path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, "chat_history_db")
+    store = ChatStore(path)
+    existing = store.connection().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    if not existing:
+        start = time.perf_counter()
+        fill(store, args.messages, args.seed)
+        print(f"filled in {time.perf_counter() - start:.1f}s")
+        existing = args.messages
+    print(f"{existing} messages")
+
+    rng = random.Random(args.seed + 1)
+    classes = {
+        "common word": lambda: word(rng.randrange(0, 10)),
+        "medium word": lambda: word(rng.randrange(100, 1000)),
+        "rare word": lambda: word(rng.randrange(20000, VOCABULARY)),
+        "two words": lambda: f"{word(rng.randrange(0, 100))} {word(rng.randrange(100, 5000))}",
+        "three words": lambda: " ".join(word(rng.randrange(0, 2000)) for _ in range(3)),
+    }
+    for name, make_query in classes.items():
+        latencies = []
+        recent_only = 0
+        for _ in range(args.queries):
+            query = make_query()
+            start = time.perf_counter()
+            results = search_threads(store, query)
+            latencies.append(time.perf_counter() - start)
+            recent_only += bool(results and results[0]["recent_only"])
+        latencies.sort()
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        print(f"{name:12s} p50 {p(0.5):6.1f} ms  p95 {p(0.95):6.1f} ms  max {latencies[-1] * 1000:6.1f} ms  "
+              f"{recent_only}/{args.queries} ranked among recent matches only")
+    store.close()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Chat-history sidebar for the chatbot (IC.py), kept up to date incrementally.
+
+The sidebar lists threads most recently active first, one page at a time. Each
+thread's markdown is rendered once (loaded with one query per page for threads
+that aren't cached yet) and then only extended when that thread gets a new turn,
+so the cost of a turn no longer depends on how much history the database holds.
+"""
+import threading
+from collections import OrderedDict
+
+from lru_cache import LRUCache
+
+PAGE_SIZE = 20
+# Rendered threads kept in memory; older ones are re-read from the database when shown again
+MAX_RENDERED_THREADS = 512
+
+EMPTY_SIDEBAR = "No conversation yet."
+
+
+def format_message(role, content):
+    """Markdown for one message: bold role, blank line after."""
+    return f"**{role.capitalize()}**: {content}\n\n"
+
+
+class ChatSidebar:
+    """Paginated sidebar markdown over the threads stored in `store` (a ChatStore)."""
+
+    def __init__(self, store, page_size=PAGE_SIZE, max_rendered=MAX_RENDERED_THREADS):
+        self.store = store
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        # thread_id -> None, least recently active first
+        self._activity = OrderedDict((tid, None) for tid in store.thread_ids_by_activity())
+        # thread_id -> list of rendered message chunks
+        self._rendered = LRUCache(max_rendered)
+        # thread_id -> turns saved through the sidebar; a read is only cached if no turn
+        # was saved since it started
+        self._saved_turns = {}
+        # thread_id -> turns of it being saved right now; its reads aren't cached meanwhile
+        self._saving = {}
+
+    def page_count(self):
+        with self._lock:
+            return max(1, -(-len(self._activity) // self.page_size))
+
+    def save_turn(self, thread_id, user_content, assistant_content):
+        """
+        Saves the turn through the store, moves the thread to the top and appends the
+        turn to its cached markdown, if any. The database write runs outside the
+        sidebar lock; page loads of the thread that overlap it aren't cached, so the
+        cache never holds the thread with this turn missing or doubled.
+        """
+        with self._lock:
+            self._saving[thread_id] = self._saving.get(thread_id, 0) + 1
+        saved = False
+        try:
+            self.store.save_turn(thread_id, user_content, assistant_content)
+            saved = True
+        finally:
+            with self._lock:
+                self._saving[thread_id] -= 1
+                if not self._saving[thread_id]:
+                    del self._saving[thread_id]
+                if saved:
+                    self._activity[thread_id] = None
+                    self._activity.move_to_end(thread_id)
+                    # A load that started during the write may or may not have seen the turn
+                    self._saved_turns[thread_id] = self._saved_turns.get(thread_id, 0) + 1
+                    chunks = self._rendered.get(thread_id)
+                    if chunks is not None:
+                        chunks.append(format_message("user", user_content))
+                        chunks.append(format_message("assistant", assistant_content))
+
+    def render_page(self, page=0):
+        """Markdown for page `page` (0 = most recently active threads)."""
+        with self._lock:
+            total = len(self._activity)
+            if not total:
+                return EMPTY_SIDEBAR
+            pages = -(-total // self.page_size)
+            page = max(0, min(page, pages - 1))
+            start = page * self.page_size
+            # Walk from the most recent end; only the requested page is visited
+            thread_ids = []
+            for i, tid in enumerate(reversed(self._activity)):
+                if i >= start + self.page_size:
+                    break
+                if i >= start:
+                    thread_ids.append(tid)
+            missing = [tid for tid in thread_ids if tid not in self._rendered]
+            versions = {tid: self._saved_turns.get(tid, 0) for tid in missing}
+
+        fresh, loaded = {}, {}
+        if missing:
+            loaded = self.store.load_thread_messages(missing)
+            fresh = {tid: [format_message(role, content) for role, content in loaded.get(tid, ())] for tid in missing}
+
+        parts = []
+        with self._lock:
+            for tid in missing:
+                # Only use reads that no turn raced with; the others are re-read next time
+                if tid in self._saving or self._saved_turns.get(tid, 0) != versions[tid]:
+                    continue
+                if tid not in loaded:
+                    # No messages any more (archived by maintenance): drop it from the sidebar
+                    self._activity.pop(tid, None)
+                self._rendered.put(tid, fresh[tid])
+            for position, tid in enumerate(thread_ids, start + 1):
+                chunks = self._rendered.get(tid)
+                if chunks is None:
+                    chunks = fresh.get(tid, [])
+                parts.append(f"<details><summary><strong>Thread {position} (ID: {tid})</strong></summary>\n\n")
+                parts.extend(chunks)
+                parts.append("</details>\n\n")
+        parts.append(f"Page {page + 1} of {pages} ({total} threads)")
+        return "".join(parts)
@@ -0,0 +1,408 @@
+"""
+SQLite persistence for the Gemini chatbot (IC.py).
+
+Every OS thread keeps one open connection instead of connecting per call, the
+database runs in WAL mode so readers never block the writer, and writes take the
+write lock up front (BEGIN IMMEDIATE) so concurrent writers queue on busy_timeout
+instead of failing with "database is locked". Both messages of a chat turn are
+stored in one transaction. Optionally, turns go through a write-behind queue that a
+background thread commits in batches; a read then waits only for the queued turns
+it could see (those of the threads it reads), not for the whole queue to drain.
+
+Threads live in their own table, so new thread IDs come from its AUTOINCREMENT key
+(atomic, no scan of the messages) and the sidebar reads its ordering and counts
+from there. The schema version is kept in PRAGMA user_version; older databases are
+migrated in place when the store opens them.
+
+Old threads can be moved out to compressed archive files (see chat_archive.py);
+with an `archive_dir`, load_thread_messages(..., restore=True) brings them back.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from itertools import groupby
+
+# Applied to every new connection
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",  # only takes effect on new databases (or after a VACUUM)
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # durable across app crashes; fsync only at checkpoints
+    "PRAGMA busy_timeout=10000",   # wait up to 10 s for the write lock instead of erroring
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",    # 16 MB page cache per connection
+)
+
+# 1: messages table with its thread index; 2: threads table; 3: thread_summaries table;
+# 4: response_cache table; 5: messages_fts full-text index; 6: archived_threads table
+SCHEMA_VERSION = 6
+
+# Write-behind defaults: commit up to this many turns per transaction, waiting at most
+# this long (seconds) for a batch to fill up.
+WRITE_BEHIND_BATCH = 64
+WRITE_BEHIND_WAIT = 0.01
+
+# A write that waits longer than this (seconds) for the write lock counts as a lock wait
+LOCK_WAIT_THRESHOLD = 0.001
+
+_STOP = object()
+
+
+class ChatStore:
+    """Pooled, thread-safe access to the chat history database at `path`."""
+
+    def __init__(self, path, write_behind=False, batch_size=WRITE_BEHIND_BATCH, batch_wait=WRITE_BEHIND_WAIT,
+                 archive_dir=None):
+        self.path = path
+        self.archive_dir = archive_dir
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # Write-lock contention, see lock_stats()
+        self._stats_lock = threading.Lock()
+        self.writes = 0
+        self.lock_waits = 0
+        self.lock_wait_seconds = 0.0
+        self.max_lock_wait = 0.0
+        self.init_schema()
+
+        self._queue = None
+        self._writer = None
+        if write_behind:
+            self._queue = queue.Queue()
+            # Queued turns are numbered; the writer commits them in order, so everything
+            # up to _committed_seq is in the database. _thread_seqs maps each chat thread
+            # with uncommitted turns to the number of its last one.
+            self._seq_lock = threading.Condition()
+            self._queued_seq = 0
+            self._committed_seq = 0
+            self._thread_seqs = {}
+            self._batch_size = batch_size
+            self._batch_wait = batch_wait
+            self._writer = threading.Thread(target=self._write_behind_loop, name="chat-store-writer", daemon=True)
+            self._writer.start()
+
+    # --- Connections ---
+    def connection(self):
+        """Returns this thread's connection, opening and configuring it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are opened explicitly (see write())
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def write(self, fn, *args):
+        """Runs fn(cursor, *args) inside one BEGIN IMMEDIATE transaction and returns its result."""
+        conn = self.connection()
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.writes += 1
+            self.lock_wait_seconds += waited
+            if waited > LOCK_WAIT_THRESHOLD:
+                self.lock_waits += 1
+            self.max_lock_wait = max(self.max_lock_wait, waited)
+        try:
+            result = fn(cursor, *args)
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+        return result
+
+    def lock_stats(self):
+        """
+        Write transactions so far, how many waited longer than LOCK_WAIT_THRESHOLD
+        for the write lock, and the total and longest wait in seconds.
+        """
+        with self._stats_lock:
+            return {
+                "writes": self.writes,
+                "lock_waits": self.lock_waits,
+                "lock_wait_seconds": self.lock_wait_seconds,
+                "max_lock_wait": self.max_lock_wait,
+            }
+
+    def close(self):
+        """Flushes pending writes and closes every pooled connection."""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    # --- Schema ---
+    def init_schema(self):
+        """Creates the tables and indexes, migrating an older database in place."""
+        self.write(self._migrate)
+
+    @staticmethod
+    def _migrate(c):
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS messages(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                thread_id INTEGER,
+                role TEXT,
+                content TEXT
+            )
+        """)
+        # Every read is "messages of thread X in order", served straight from this index
+        c.execute("CREATE INDEX IF NOT EXISTS idx_messages_thread ON messages(thread_id, id)")
+        # Timestamps are unix seconds
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS threads(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_threads_updated ON threads(updated_at, id)")
+        if version < 2:
+            # Threads that so far only exist as messages. They get the migration time as
+            # their timestamps, so among themselves they keep their old order (by ID).
+            now = time.time()
+            c.execute("""
+                INSERT OR IGNORE INTO threads (id, created_at, updated_at, message_count)
+                SELECT thread_id, ?, ?, COUNT(*) FROM messages WHERE thread_id IS NOT NULL GROUP BY thread_id
+            """, (now, now))
+        # Rolling summaries of the older messages of long threads (see chat_context.py).
+        # The summary covers the first `summarized_count` messages of the thread.
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS thread_summaries(
+                thread_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_count INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # Cached model replies keyed by a hash of the request (see response_cache.py)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache(
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache(expires_at)")
+        # Full-text index over message content (see chat_search.py). It stores no copy of
+        # the text (content='messages'); triggers keep it in sync with the messages table.
+        c.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        if version < 5:
+            # Index the messages written before the index existed
+            c.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        # Threads moved to archive files: which file, and the offset of the gzip
+        # member that holds them
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS archived_threads(
+                thread_id INTEGER PRIMARY KEY,
+                archive TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                message_count INTEGER NOT NULL,
+                archived_at REAL NOT NULL
+            )
+        """)
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    # --- Writes ---
+    @staticmethod
+    def _insert_messages(cursor, rows):
+        """Inserts (thread_id, role, content) rows and updates their threads' counts and timestamps."""
+        cursor.executemany("INSERT INTO messages (thread_id, role, content) VALUES (?, ?, ?)", rows)
+        counts = {}
+        for thread_id, _, _ in rows:
+            counts[thread_id] = counts.get(thread_id, 0) + 1
+        now = time.time()
+        # Threads that were never allocated through create_thread() are registered here
+        cursor.executemany("""
+            INSERT INTO threads (id, created_at, updated_at, message_count) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                updated_at = excluded.updated_at,
+                message_count = message_count + excluded.message_count
+        """, [(thread_id, now, now, count) for thread_id, count in counts.items()])
+
+    @staticmethod
+    def _insert_turns(cursor, turns):
+        rows = []
+        for thread_id, user_content, assistant_content in turns:
+            rows.append((thread_id, "user", user_content))
+            rows.append((thread_id, "assistant", assistant_content))
+        ChatStore._insert_messages(cursor, rows)
+
+    def create_thread(self):
+        """Allocates a new, empty thread and returns its ID."""
+        now = time.time()
+        return self.write(lambda c: c.execute(
+            "INSERT INTO threads (created_at, updated_at, message_count) VALUES (?, ?, 0)", (now, now)).lastrowid)
+
+    def save_summary(self, thread_id, summary, summarized_count):
+        """Stores the rolling summary of the first `summarized_count` messages of a thread."""
+        self.write(lambda c: c.execute("""
+            INSERT INTO thread_summaries (thread_id, summary, summarized_count, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET
+                summary = excluded.summary,
+                summarized_count = excluded.summarized_count,
+                updated_at = excluded.updated_at
+        """, (thread_id, summary, summarized_count, time.time())))
+
+    def save_message(self, thread_id, role, content):
+        """Saves a single message (user or assistant)."""
+        self.write(self._insert_messages, [(thread_id, role, content)])
+
+    def save_turn(self, thread_id, user_content, assistant_content):
+        """
+        Saves the user message and the assistant reply of one turn in a single
+        transaction, or hands them to the write-behind queue when it is enabled.
+        """
+        turn = (thread_id, user_content, assistant_content)
+        if self._queue is not None:
+            with self._seq_lock:
+                self._queued_seq += 1
+                self._thread_seqs[thread_id] = self._queued_seq
+                # Under the lock, so the queue order is the numbering order
+                self._queue.put((self._queued_seq, turn))
+        else:
+            self.write(self._insert_turns, [turn])
+
+    def flush(self, thread_ids=None):
+        """
+        Blocks until the turns queued so far have been committed, or only those of
+        `thread_ids` if given (no-op without write-behind). Turns queued while it
+        waits don't extend the wait.
+        """
+        if self._queue is None:
+            return
+        with self._seq_lock:
+            if thread_ids is None:
+                target = self._queued_seq
+            else:
+                target = max((self._thread_seqs.get(tid, 0) for tid in thread_ids), default=0)
+            self._seq_lock.wait_for(lambda: self._committed_seq >= target)
+
+    def _committed(self, seq):
+        with self._seq_lock:
+            self._committed_seq = seq
+            for thread_id in [tid for tid, last in self._thread_seqs.items() if last <= seq]:
+                del self._thread_seqs[thread_id]
+            self._seq_lock.notify_all()
+
+    def _write_behind_loop(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Collect whatever else arrives within the batch window
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=self._batch_wait))
+                except queue.Empty:
+                    break
+            items = [item for item in batch if item is not _STOP]
+            stopping = len(items) != len(batch)
+            if not items:
+                continue
+            try:
+                self.write(self._insert_turns, [turn for _, turn in items])
+            except sqlite3.Error as e:
+                print(f"Error writing chat history batch: {e}")
+            finally:
+                # A failed batch is done too; readers mustn't wait for it forever
+                self._committed(items[-1][0])
+        # Anything queued after close() was requested
+        while not self._queue.empty():
+            item = self._queue.get()
+            if item is not _STOP:
+                try:
+                    self.write(self._insert_turns, [item[1]])
+                finally:
+                    self._committed(item[0])
+
+    # --- Reads ---
+    def load_threads(self):
+        """Loads all distinct conversation threads and their messages with a single query."""
+        self.flush()
+        c = self.connection().cursor()
+        c.execute("SELECT thread_id, role, content FROM messages ORDER BY thread_id, id")
+        return [
+            {"thread_id": tid, "messages": [{"role": role, "content": content} for _, role, content in rows]}
+            for tid, rows in groupby(c, key=lambda row: row[0])
+        ]
+
+    def load_thread_messages(self, thread_ids, restore=False):
+        """
+        Returns {thread_id: [(role, content), ...]} for the given threads, in one query.
+        With `restore`, requested threads that were archived are first moved back
+        into the database.
+        """
+        thread_ids = list(thread_ids)
+        self.flush(thread_ids)
+        if not thread_ids:
+            return {}
+        c = self.connection().cursor()
+        placeholders = ",".join("?" * len(thread_ids))
+        c.execute(f"SELECT thread_id, role, content FROM messages WHERE thread_id IN ({placeholders}) "
+                  "ORDER BY thread_id, id", thread_ids)
+        found = {tid: [(role, content) for _, role, content in rows] for tid, rows in groupby(c, key=lambda row: row[0])}
+        missing = [tid for tid in thread_ids if tid not in found]
+        if restore and missing and self.archive_dir is not None:
+            # Imported here: chat_archive is only needed once threads have been archived
+            from chat_archive import restore_threads
+
+            found.update(restore_threads(self, missing))
+        return found
+
+    def thread_ids_by_activity(self):
+        """IDs of threads with messages, ordered from least to most recently active."""
+        self.flush()
+        c = self.connection().cursor()
+        c.execute("SELECT id FROM threads WHERE message_count > 0 ORDER BY updated_at, id")
+        return [row[0] for row in c.fetchall()]
+
+    def load_summary(self, thread_id):
+        """Returns (summary, summarized_count) for a thread, or (None, 0) if it has none."""
+        row = self.connection().execute(
+            "SELECT summary, summarized_count FROM thread_summaries WHERE thread_id = ?", (thread_id,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def get_thread(self, thread_id):
+        """Returns {"thread_id", "created_at", "updated_at", "message_count"}, or None if unknown."""
+        self.flush([thread_id])
+        row = self.connection().execute(
+            "SELECT id, created_at, updated_at, message_count FROM threads WHERE id = ?", (thread_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("thread_id", "created_at", "updated_at", "message_count"), row))
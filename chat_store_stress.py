@@ -0,0 +1,116 @@
+"""
+Concurrency stress test for the chat history database (chat_store.py).
+
+Runs many threads that each save chat turns and read the sidebar data at the same
+time against a local SQLite file, then checks that every message arrived and
+reports throughput and "database is locked" errors:
+
+    python chat_store_stress.py --threads 32 --turns 200
+    python chat_store_stress.py --threads 32 --turns 200 --write-behind
+    python chat_store_stress.py --threads 32 --turns 200 --naive   # old connect-per-call code
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from chat_store import ChatStore
+
+
+class NaiveStore:
+    """The original IC.py access pattern: a new connection and a commit per message."""
+
+    def __init__(self, path):
+        self.path = path
+        ChatStore(path).close()  # same schema
+
+    def save_turn(self, thread_id, user_content, assistant_content):
+        for role, content in (("user", user_content), ("assistant", assistant_content)):
+            conn = sqlite3.connect(self.path)
+            conn.execute("INSERT INTO messages (thread_id, role, content) VALUES (?, ?, ?)",
+                         (thread_id, role, content))
+            conn.commit()
+            conn.close()
+
+    def load_thread_messages(self, thread_ids):
+        conn = sqlite3.connect(self.path)
+        messages = {}
+        for tid in thread_ids:
+            messages[tid] = conn.execute(
+                "SELECT role, content FROM messages WHERE thread_id = ? ORDER BY id", (tid,)).fetchall()
+        conn.close()
+        return messages
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def worker(store, user_id, turns, read_every, errors, latencies):
+    for turn in range(turns):
+        start = time.perf_counter()
+        try:
+            store.save_turn(user_id, f"question {turn} from user {user_id}", f"answer {turn} " * 20)
+            if read_every and turn % read_every == 0:
+                store.load_thread_messages([user_id])
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test the chat history database")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=100, help="chat turns saved per user")
+    parser.add_argument("--read-every", type=int, default=5, help="also read the user's thread every N turns (0 = never)")
+    parser.add_argument("--db", help="database file to use (default: a fresh temporary file)")
+    parser.add_argument("--write-behind", action="store_true", help="batch turns through the write-behind queue")
+    parser.add_argument("--naive", action="store_true", help="use the old connection-per-call code for comparison")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    path = args.db
+    if path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, "chat_history_db")
+
+    store = NaiveStore(path) if args.naive else ChatStore(path, write_behind=args.write_behind)
+    before = sqlite3.connect(path).execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    errors, latencies = [], []
+    threads = [
+        threading.Thread(target=worker, args=(store, 1000 + i, args.turns, args.read_every, errors, latencies))
+        for i in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.flush()
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    after = sqlite3.connect(path).execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    expected = args.threads * args.turns * 2
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    mode = "naive" if args.naive else ("write-behind" if args.write_behind else "pooled")
+    print(f"mode={mode} threads={args.threads} turns/thread={args.turns}")
+    print(f"elapsed {elapsed:.2f}s, {args.threads * args.turns / elapsed:.0f} turns/s")
+    print(f"save latency p50 {p(0.50):.2f} ms, p99 {p(0.99):.2f} ms")
+    print(f"messages written {after - before}/{expected}, lock errors {len(errors)}")
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+    # The old code is expected to lose messages to lock errors; the store must not
+    if not args.naive and (errors or after - before != expected):
+        raise SystemExit("FAILED: lost messages or lock errors")
+
+
+if __name__ == "__main__":
+    main()
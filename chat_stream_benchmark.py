@@ -0,0 +1,118 @@
+"""
+Time-to-first-token benchmark for the chatbot's model backends (chat_models.py).
+
+Compares when the user first sees text with streaming (first chunk) and without
+(whole reply), using the local fake model by default, so it runs offline:
+
+    python chat_stream_benchmark.py --turns 20
+    python chat_stream_benchmark.py --first-token-delay 0.5 --token-delay 0.05 --words 100
+    python chat_stream_benchmark.py --backend gemini --turns 5   # needs GOOGLE_API_KEY
+
+With --sessions, that many chat sessions run concurrently on one event loop the
+way IC.py's async handler does: at most --max-in-flight replies stream at once and
+every turn is saved to a temporary chat database from a worker thread:
+
+    python chat_stream_benchmark.py --sessions 500 --max-in-flight 256 --turns 3
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from chat_models import load_model
+from chat_store import ChatStore
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(model, conversation):
+    """Returns (seconds to the first chunk, seconds to the last chunk, reply length)."""
+    start = time.perf_counter()
+    first = None
+    reply = ""
+    for chunk in model.stream(conversation):
+        if first is None:
+            first = time.perf_counter() - start
+        reply += chunk
+    total = time.perf_counter() - start
+    return (total if first is None else first), total, len(reply)
+
+
+async def run_sessions(model, sessions, turns, max_in_flight):
+    """Returns (time to first chunk per turn, total seconds) for concurrent async sessions."""
+    in_flight = asyncio.Semaphore(max_in_flight)
+    ttft = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = ChatStore(os.path.join(tmp_dir, "chat_history_db"))
+
+        async def session():
+            thread_id = await asyncio.to_thread(store.create_thread)
+            conversation = []
+            for turn in range(turns):
+                conversation.append({"role": "user", "parts": [{"text": f"question {turn}"}]})
+                # Queueing for a slot counts towards the time to first text
+                start = time.perf_counter()
+                first, reply = None, ""
+                async with in_flight:
+                    async for chunk in model.astream(conversation):
+                        if first is None:
+                            first = time.perf_counter() - start
+                        reply += chunk
+                ttft.append(first)
+                await asyncio.to_thread(store.save_turn, thread_id, conversation[-1]["parts"][0]["text"], reply)
+                conversation.append({"role": "assistant", "parts": [{"text": reply}]})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session() for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+        store.close()
+    return ttft, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time-to-first-token of the chat model backends")
+    parser.add_argument("--backend", default="fake", help="model backend (fake or gemini)")
+    parser.add_argument("--turns", type=int, default=10, help="replies to measure")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="fake model: seconds before the first chunk")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="fake model: seconds between chunks")
+    parser.add_argument("--words", type=int, default=40, help="fake model: words per reply")
+    parser.add_argument("--sessions", type=int, default=0, help="run this many concurrent async sessions")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="with --sessions: concurrent generations")
+    args = parser.parse_args()
+
+    if args.backend == "fake":
+        model = load_model("fake", first_token_delay=args.first_token_delay,
+                           token_delay=args.token_delay, words=args.words)
+    else:
+        model = load_model(args.backend, api_key=os.environ.get("GOOGLE_API_KEY"))
+
+    if args.sessions:
+        ttft, elapsed = asyncio.run(run_sessions(model, args.sessions, args.turns, args.max_in_flight))
+        print(f"backend={args.backend} sessions={args.sessions} turns/session={args.turns} "
+              f"max-in-flight={args.max_in_flight}")
+        print(f"{len(ttft) / elapsed:.1f} turns/s, first text after p50 {percentile(ttft, 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(ttft, 0.95) * 1000:.0f} ms, p99 {percentile(ttft, 0.99) * 1000:.0f} ms")
+        return
+
+    conversation = []
+    ttft, totals = [], []
+    for turn in range(args.turns):
+        conversation.append({"role": "user", "parts": [{"text": f"Tell me something interesting, #{turn}"}]})
+        first, total, length = measure(model, conversation)
+        ttft.append(first)
+        totals.append(total)
+        conversation.append({"role": "assistant", "parts": [{"text": "x" * length}]})
+
+    print(f"backend={args.backend} turns={args.turns}")
+    print(f"streaming: first text after p50 {percentile(ttft, 0.5) * 1000:.0f} ms, "
+          f"p95 {percentile(ttft, 0.95) * 1000:.0f} ms")
+    print(f"blocking:  first text after p50 {percentile(totals, 0.5) * 1000:.0f} ms, "
+          f"p95 {percentile(totals, 0.95) * 1000:.0f} ms (whole reply)")
+
+
+if __name__ == "__main__":
+    main()
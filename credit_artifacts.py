@@ -0,0 +1,160 @@
+"""
+On-disk artifact for the credit scoring model (FM.py).
+
+A training run (python FM.py --train) pickles the fitted CreditPipeline together
+with its compiled CreditScorer into pipeline.pkl, next to a manifest.json header
+holding the format version, a hash of the feature schema, the sklearn version and
+the model version (a hash of the pickle). Loading checks the header before
+unpickling anything and rejects an artifact written for a different schema,
+format or sklearn, so startup is a quick load instead of a training run.
+
+ModelHandle keeps the loaded model and swaps in a new one when a retrain replaces
+the artifact, so running apps pick it up without a restart.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+import sklearn
+
+from artifact_dirs import new_directory, read_manifest, replace_directory, swap_in_progress, write_manifest
+from credit_model import CATEGORICAL_FEATURES, CATEGORIES, NUMERIC_FEATURES, TARGET
+from credit_scorer import CreditScorer
+
+# Bump when the file layout or the pickled classes change incompatibly.
+ARTIFACT_VERSION = 1
+PIPELINE_NAME = "pipeline.pkl"
+# Attempts to load an artifact that a save is swapping in, 50 ms apart
+SWAP_RETRIES = 20
+
+
+def schema_hash():
+    """Hash of the features and target the model is trained on; a mismatch means the artifact doesn't fit this code."""
+    schema = {
+        "numeric": NUMERIC_FEATURES,
+        "categorical": {name: CATEGORIES[name] for name in CATEGORICAL_FEATURES},
+        "target": TARGET,
+    }
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
+def mismatch(manifest):
+    """Why an artifact with this manifest can't be used here, or None if it can."""
+    if manifest is None:
+        return "no artifact"
+    if manifest.get("version") != ARTIFACT_VERSION:
+        return f"format version {manifest.get('version')}, expected {ARTIFACT_VERSION}"
+    if manifest.get("schema_hash") != schema_hash():
+        return "trained on a different feature schema"
+    if manifest.get("sklearn_version") != sklearn.__version__:
+        return f"trained with scikit-learn {manifest.get('sklearn_version')}, running {sklearn.__version__}"
+    return None
+
+
+def save_artifacts(path, pipeline, **metadata):
+    """
+    Writes the pipeline and its compiled scorer to `path` and returns the manifest.
+    Files are written to a temporary sibling directory that replaces `path` at the
+    end (see artifact_dirs.py), so readers never see a half-written artifact.
+    `metadata` (training rows, scores, ...) is recorded in the manifest; its
+    `training_sources` lists all the data the model was trained on ("sample" for
+    SAMPLE_DATA), when that is known.
+    """
+    data = pickle.dumps((pipeline, CreditScorer.from_pipeline(pipeline)), protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path = new_directory(path)
+    with open(os.path.join(tmp_path, PIPELINE_NAME), "wb") as f:
+        f.write(data)
+
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "schema_hash": schema_hash(),
+        "sklearn_version": sklearn.__version__,
+        "model_version": hashlib.sha256(data).hexdigest()[:16],
+        "trained_at": time.time(),
+        **metadata,
+    }
+    write_manifest(tmp_path, manifest)
+    replace_directory(tmp_path, path)
+    return manifest
+
+
+def load_artifacts(path):
+    """Returns (pipeline, scorer, manifest) from `path`; raises ValueError if the artifact is rejected."""
+    manifest = read_manifest(path)
+    reason = mismatch(manifest)
+    if reason is not None:
+        raise ValueError(f"Rejected credit model artifact {path}: {reason}")
+    with open(os.path.join(path, PIPELINE_NAME), "rb") as f:
+        data = f.read()
+    # Also catches a pickle from a different training run than the manifest
+    if hashlib.sha256(data).hexdigest()[:16] != manifest["model_version"]:
+        raise ValueError(f"Rejected credit model artifact {path}: {PIPELINE_NAME} doesn't match its manifest")
+    pipeline, scorer = pickle.loads(data)
+    return pipeline, scorer, manifest
+
+
+def load_or_train(path, train, metadata=None):
+    """
+    Loads the artifact at `path`, first training and saving one with train() if it
+    is missing or rejected; `metadata` goes into the new artifact's manifest.
+    """
+    for _ in range(SWAP_RETRIES):
+        try:
+            return load_artifacts(path)
+        except (OSError, ValueError) as e:
+            error = e
+        # Caught between a save's two renames: the new artifact is about to appear,
+        # don't replace it with a freshly trained one
+        if not swap_in_progress(path):
+            break
+        time.sleep(0.05)
+    print(f"{error}; training a new model")
+    save_artifacts(path, train(), **(metadata or {}))
+    return load_artifacts(path)
+
+
+class ModelHandle:
+    """
+    The current (pipeline, scorer, manifest) of the artifact at `path`. refresh()
+    looks at the manifest at most every `check_interval` seconds and loads the new
+    model when a retrain replaced it; a rejected or unreadable artifact leaves the
+    current model in place. `train` and `metadata` are for load_or_train().
+    """
+
+    def __init__(self, path, train, check_interval=1.0, metadata=None):
+        self.path = path
+        self.check_interval = check_interval
+        # Replaced as a whole, so readers always get a matching pipeline, scorer and manifest
+        self.current = load_or_train(path, train, metadata)
+        self._checked = time.monotonic()
+        self._rejected = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_version(self):
+        return self.current[2]["model_version"]
+
+    def refresh(self):
+        """Reloads the artifact if a retrain replaced it; returns True if the model changed."""
+        now = time.monotonic()
+        if now - self._checked < self.check_interval or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked = now
+            manifest = read_manifest(self.path)
+            if manifest is None or manifest.get("model_version") in (self.model_version, self._rejected):
+                return False
+            try:
+                self.current = load_artifacts(self.path)
+            except (OSError, ValueError, pickle.UnpicklingError, EOFError) as e:
+                if mismatch(manifest) is not None:
+                    # Don't retry (and report) the same incompatible artifact every check
+                    self._rejected = manifest.get("model_version")
+                print(f"{e}; keeping model {self.model_version}")
+                return False
+            return True
+        finally:
+            self._lock.release()
@@ -0,0 +1,213 @@
+"""
+Headless batch scoring for the credit scoring model (FM.py).
+
+Streams a CSV or Parquet file of loan applications in chunks through a process
+pool and writes every row back out with its probability of default and predicted
+label, in input order. Workers parse, score (with the compiled scorer of
+credit_scorer.py, vectorized over the chunk) and format their chunk; the main
+process only splits the input and writes the output. At most a few chunks per
+worker are in flight, so memory use does not grow with the file size:
+
+    python credit_batch_score.py applications.csv scores.csv
+    python credit_batch_score.py applications.parquet scores.parquet --workers 8
+    python credit_batch_score.py applications.csv scores.csv --write-synthetic 5000000   # make a test input first
+
+CSV input is split at line boundaries, so quoted fields must not contain line
+breaks. Parquet input is processed one row group at a time. Parquet needs pyarrow.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from credit_artifacts import load_or_train
+from credit_model import FEATURES, SAMPLE_DATA, synthetic_applicants, train_pipeline
+
+CHUNK_BYTES = 8 * 2**20
+# Chunks queued per worker; bounds memory while keeping the workers busy
+IN_FLIGHT_PER_WORKER = 2
+
+PROBABILITY_COLUMN = 'DefaultProbability'
+LABEL_COLUMN = 'PredictedDefault'
+
+_scorer = None
+
+
+def _init_worker(scorer):
+    global _scorer
+    _scorer = scorer
+
+
+def _finish(frame, output_format, first):
+    """Adds the score columns; CSV output is formatted here, in the worker."""
+    probabilities, labels = _scorer.score_frame(frame)
+    frame[PROBABILITY_COLUMN] = np.round(probabilities, 6)
+    frame[LABEL_COLUMN] = labels
+    if output_format == "csv":
+        return len(frame), frame.to_csv(index=False, header=first).encode("utf-8")
+    return len(frame), frame
+
+
+def _score_csv_block(header, block, output_format, first):
+    return _finish(pd.read_csv(io.BytesIO(header + block)), output_format, first)
+
+
+def _score_parquet_row_group(path, index, output_format, first):
+    import pyarrow.parquet as pq
+
+    return _finish(pq.ParquetFile(path).read_row_group(index).to_pandas(), output_format, first)
+
+
+def file_format(path):
+    return "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def csv_tasks(path, chunk_bytes, output_format):
+    """(function, args) per chunk of whole lines of about `chunk_bytes`."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        first = True
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            # Complete the chunk's last line
+            block += f.readline()
+            yield _score_csv_block, (header, block, output_format, first)
+            first = False
+
+
+def parquet_tasks(path, output_format):
+    import pyarrow.parquet as pq
+
+    for index in range(pq.ParquetFile(path).num_row_groups):
+        yield _score_parquet_row_group, (path, index, output_format, index == 0)
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, "wb")
+
+    def write(self, chunk):
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Writes each chunk as a row group, cast to the schema of the first one."""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None where it isn't available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def score_file(scorer, input_path, output_path, workers=None, chunk_bytes=CHUNK_BYTES, progress=True):
+    """Scores `input_path` into `output_path` and returns the number of rows."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    output_format = file_format(output_path)
+    if file_format(input_path) == "parquet":
+        tasks = parquet_tasks(input_path, output_format)
+    else:
+        tasks = csv_tasks(input_path, chunk_bytes, output_format)
+    writer = ParquetWriter(output_path) if output_format == "parquet" else CsvWriter(output_path)
+
+    rows = 0
+    start = time.perf_counter()
+
+    def write(result):
+        nonlocal rows
+        count, chunk = result
+        writer.write(chunk)
+        rows += count
+        if progress:
+            elapsed = time.perf_counter() - start
+            print(f"\r{rows} rows, {rows / elapsed:.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    try:
+        if workers == 0:
+            # In-process, for debugging and small files
+            _init_worker(scorer)
+            for fn, args in tasks:
+                write(fn(*args))
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(scorer,)) as pool:
+                pending = deque()
+                for fn, args in tasks:
+                    pending.append(pool.submit(fn, *args))
+                    if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    finally:
+        writer.close()
+        if progress:
+            print(file=sys.stderr)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV or Parquet file of loan applications")
+    parser.add_argument("input", help="applications (.csv, or .parquet with pyarrow) with the columns " + ", ".join(FEATURES))
+    parser.add_argument("output", help="scored rows (.csv or .parquet)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU, 0 = in-process)")
+    parser.add_argument("--artifacts", default=os.environ.get("FM_ARTIFACT_DIR", "fm_artifacts"),
+                        help="trained model saved by `python FM.py --train`")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2**20, help="CSV chunk size in MB")
+    parser.add_argument("--write-synthetic", type=int, metavar="ROWS",
+                        help="first write this many synthetic applications to INPUT")
+    args = parser.parse_args()
+
+    if args.write_synthetic:
+        frame = synthetic_applicants(args.write_synthetic).drop(columns=['Default'])
+        if file_format(args.input) == "parquet":
+            frame.to_parquet(args.input, index=False)
+        else:
+            frame.to_csv(args.input, index=False)
+        print(f"wrote {args.write_synthetic} synthetic applications to {args.input}")
+
+    # The same model as FM.py
+    _, scorer, manifest = load_or_train(args.artifacts, lambda: train_pipeline(pd.DataFrame(SAMPLE_DATA)),
+                                        {"training_data": "sample", "training_sources": ["sample"]})
+    print(f"scoring with credit model {manifest['model_version']}")
+    start = time.perf_counter()
+    rows = score_file(scorer, args.input, args.output, args.workers, int(args.chunk_mb * 2**20))
+    elapsed = time.perf_counter() - start
+    peak = peak_memory_mb()
+    print(f"scored {rows} rows in {elapsed:.1f}s: {rows / elapsed:.0f} rows/s"
+          + (f", peak memory {peak:.0f} MB" if peak is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Evaluation report for the credit scoring model (FM.py's "Show Confusion Matrix").
+
+For every model version the report is computed once. The confusion matrix, ROC
+curve/AUC and classification report are those of the deployed model itself (its
+own scaler and coefficients) on the held-out test split kept in the pipeline.
+Next to them is a k-fold cross-validation of the training recipe: a fresh scaler
+and an unfitted copy of the model per fold, folds fitted in parallel processes.
+That estimates how well this kind of model does on the data, not the shipped
+coefficients, and is only run when every training source is recorded in the
+manifest and still readable (a model updated from an unrecorded one isn't).
+
+The report is cached in memory and as JSON next to the artifact
+(evaluation-<model version>.json), so a retrain, which replaces the artifact
+directory, also drops it.
+
+ModelEvaluator does the work and renders the figure (matplotlib's Agg canvas, not
+pyplot) on a background thread, and hands the app RGBA pixels to turn into a
+pygame surface, so the UI never waits for it:
+
+    python credit_evaluation.py                       # print the current model's report
+    python credit_evaluation.py --png report.png --folds 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, roc_auc_score, roc_curve
+from sklearn.model_selection import StratifiedKFold
+
+from credit_artifacts import ModelHandle
+from credit_model import FEATURES, SAMPLE_DATA, TARGET, train_pipeline
+
+# Bump when the report's contents change, so cached reports are recomputed
+REPORT_VERSION = 2
+FOLDS = 5
+# Applicants cross-validated at most, read from the training sources in order
+MAX_ROWS = 200000
+# Fewer rows than this are cross-validated in-process; starting workers costs more
+PARALLEL_MIN_ROWS = 20000
+# Points kept of the ROC curve
+ROC_POINTS = 200
+REPORT_SIZE = (760, 420)
+
+_fold_data = None
+
+
+def _init_worker(model, scaler, X, y):
+    global _fold_data
+    _fold_data = model, scaler, X, y
+
+
+def _fit_fold(train, test):
+    """Probabilities of class 1 for the `test` rows from a model fitted on the `train` rows."""
+    model, scaler, X, y = _fold_data
+    model, scaler = clone(model), clone(scaler)
+    model.fit(scaler.fit_transform(X[train]), y[train])
+    return test, model.predict_proba(scaler.transform(X[test]))[:, list(model.classes_).index(1)]
+
+
+def training_frame(manifest):
+    """
+    Up to MAX_ROWS of the applicants the model was trained on, or None unless all
+    of its training sources are known and readable.
+    """
+    sources = manifest.get("training_sources")
+    if not sources or not all(source == "sample" or os.path.exists(source) for source in sources):
+        return None
+    from credit_incremental import iter_chunks
+
+    frames, rows = [], 0
+    for source in sources:
+        if rows >= MAX_ROWS:
+            break
+        frame = pd.DataFrame(SAMPLE_DATA) if source == "sample" else next(iter_chunks(source, MAX_ROWS - rows), None)
+        if frame is not None:
+            frames.append(frame[:MAX_ROWS - rows])
+            rows += len(frames[-1])
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def cross_validate(pipeline, frame, folds=FOLDS, workers=None):
+    """(out-of-fold probabilities of class 1, encoded labels, per-fold scores) for `frame`."""
+    X = frame[FEATURES].copy()
+    for column, encoder in pipeline.encoders.items():
+        X[column] = encoder.transform(X[column])
+    X = X.to_numpy(dtype=float)
+    y = pipeline.target_encoder.transform(frame[TARGET])
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=0).split(X, y))
+
+    probabilities = np.empty(len(y))
+    fold_scores = []
+
+    def collect(test, fold_probabilities):
+        probabilities[test] = fold_probabilities
+        fold_y = y[test]
+        fold_scores.append({
+            "accuracy": accuracy_score(fold_y, fold_probabilities > 0.5),
+            "auc": roc_auc_score(fold_y, fold_probabilities) if len(set(fold_y)) == 2 else None,
+        })
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    args = (pipeline.model, pipeline.scaler, X, y)
+    if workers <= 1 or len(y) < PARALLEL_MIN_ROWS:
+        _init_worker(*args)
+        for train, test in splits:
+            collect(*_fit_fold(train, test))
+    else:
+        # Spawned rather than forked: the app has SDL's and the evaluator's threads running
+        with ProcessPoolExecutor(min(workers, folds), multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=args) as pool:
+            for result in pool.map(_fit_fold, *zip(*splits)):
+                collect(*result)
+    return probabilities, y, fold_scores
+
+
+def positive_probabilities(model, X):
+    return model.predict_proba(X)[:, list(model.classes_).index(1)]
+
+
+def recipe_cross_validation(pipeline, manifest, folds=FOLDS, workers=None):
+    """Summary of the k-fold cross-validation of the training recipe, or None if the training data isn't known."""
+    frame = training_frame(manifest)
+    if frame is None:
+        return None
+    # Every class needs a member in every fold
+    folds = min(folds, int(frame[TARGET].value_counts().min()))
+    if folds < 2:
+        return None
+    probabilities, y, fold_scores = cross_validate(pipeline, frame, folds, workers)
+    aucs = [score["auc"] for score in fold_scores if score["auc"] is not None]
+    return {
+        "folds": folds,
+        "rows": len(y),
+        "sources": len(manifest["training_sources"]),
+        "accuracy": accuracy_score(y, probabilities > 0.5),
+        "auc": roc_auc_score(y, probabilities) if len(set(y)) == 2 else None,
+        "fold_auc_std": float(np.std(aucs)) if aucs else None,
+        "fold_scores": fold_scores,
+    }
+
+
+def evaluate(pipeline, manifest, folds=FOLDS, workers=None):
+    """The evaluation report of a model as a JSON-serializable dict."""
+    start = time.perf_counter()
+    labels = [str(label) for label in pipeline.target_encoder.classes_]
+    y = np.asarray(pipeline.y_test)
+    report = {
+        "report_version": REPORT_VERSION,
+        "model_version": manifest["model_version"],
+        "holdout_rows": len(y),
+        "labels": labels,
+        "confusion_matrix": [[0, 0], [0, 0]],
+        "classification_report": "no held-out applicants",
+        "auc": None,
+        "roc": None,
+    }
+    if len(y):
+        # The deployed model, with its own scaler and coefficients
+        probabilities = positive_probabilities(pipeline.model, pipeline.X_test)
+        predicted = (probabilities > 0.5).astype(int)
+        report["confusion_matrix"] = confusion_matrix(y, predicted, labels=[0, 1]).tolist()
+        report["classification_report"] = classification_report(y, predicted, labels=[0, 1], target_names=labels,
+                                                                 zero_division=0)
+        if len(set(y)) == 2:
+            fpr, tpr, _ = roc_curve(y, probabilities)
+            keep = np.unique(np.linspace(0, len(fpr) - 1, ROC_POINTS).astype(int))
+            report["auc"] = roc_auc_score(y, probabilities)
+            report["roc"] = {"fpr": fpr[keep].tolist(), "tpr": tpr[keep].tolist()}
+    report["recipe_cv"] = recipe_cross_validation(pipeline, manifest, folds, workers)
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def describe_recipe_cv(cv):
+    """One line on the training recipe's cross-validation for the report."""
+    if cv is None:
+        return "Training recipe CV: skipped, the full training data isn't known or available"
+    line = f"Training recipe, {cv['folds']}-fold CV on {cv['rows']} applicants: accuracy {cv['accuracy']:.3f}"
+    if cv["auc"] is not None:
+        line += f", AUC {cv['auc']:.3f} (+/- {cv['fold_auc_std']:.3f} over folds)"
+    return line
+
+
+def cache_path(artifact_path, model_version):
+    return os.path.join(artifact_path, f"evaluation-{model_version}.json")
+
+
+def load_cached(artifact_path, model_version, folds=FOLDS):
+    """The cached report of `model_version`, or None if there isn't one for `folds` folds."""
+    try:
+        with open(cache_path(artifact_path, model_version), encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # The report may have fewer folds than asked for when that's all the data allows
+    if report.get("report_version") != REPORT_VERSION or report.get("requested_folds") != folds:
+        return None
+    return report
+
+
+def save_cached(artifact_path, report, folds=FOLDS):
+    path = cache_path(artifact_path, report["model_version"])
+    try:
+        with open(f"{path}.tmp-{os.getpid()}", "w", encoding="utf-8") as f:
+            json.dump(dict(report, requested_folds=folds), f)
+        os.replace(f"{path}.tmp-{os.getpid()}", path)
+    except OSError:
+        # A retrain replaced the directory in the meantime; the report is for the old model anyway
+        pass
+
+
+def render_report(report, size=REPORT_SIZE, dpi=100):
+    """
+    (RGBA bytes, (width, height)) of the held-out confusion matrix, ROC curve and
+    classification report, and the training recipe's cross-validation.
+    """
+    # The figure is drawn on its own Agg canvas: pyplot's global state isn't thread safe
+    import seaborn as sns
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(size[0] / dpi, size[1] / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(figure)
+    grid = figure.add_gridspec(2, 2, height_ratios=[1.5, 1])
+    matrix_axes, roc_axes, text_axes = figure.add_subplot(grid[0, 0]), figure.add_subplot(grid[0, 1]), figure.add_subplot(grid[1, :])
+    labels = report["labels"]
+
+    sns.heatmap(np.array(report["confusion_matrix"]), annot=True, fmt='d', cmap='Reds', cbar=False,
+                xticklabels=labels, yticklabels=labels, ax=matrix_axes)
+    matrix_axes.set_title("Confusion Matrix (held out)")
+    matrix_axes.set_xlabel("Predicted")
+    matrix_axes.set_ylabel("Actual")
+
+    if report["roc"] is not None:
+        roc_axes.plot(report["roc"]["fpr"], report["roc"]["tpr"], color="darkred", label=f"AUC {report['auc']:.3f}")
+        roc_axes.legend(loc="lower right")
+    roc_axes.plot([0, 1], [0, 1], linestyle="--", color="gray")
+    roc_axes.set_title("ROC Curve (held out)")
+    roc_axes.set_xlabel("False positive rate")
+    roc_axes.set_ylabel("True positive rate")
+
+    text_axes.axis("off")
+    summary = (f"Model {report['model_version']} on its held-out split of {report['holdout_rows']} applicants\n"
+               + describe_recipe_cv(report["recipe_cv"]))
+    text_axes.text(0, 1, summary + "\n\n" + report["classification_report"], family="monospace", fontsize=8,
+                   va="top", transform=text_axes.transAxes)
+
+    figure.tight_layout()
+    canvas.draw()
+    return bytes(canvas.buffer_rgba()), canvas.get_width_height()
+
+
+class ModelEvaluator:
+    """
+    Evaluates and renders the report of the current model of a ModelHandle on a
+    background thread, once per model version. on_ready(model_version) is called
+    from that thread when a report is done (or failed).
+    """
+
+    def __init__(self, models, folds=FOLDS, workers=None, on_ready=None):
+        self.models = models
+        self.folds = folds
+        self.workers = workers
+        self.on_ready = on_ready
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="credit-evaluation")
+        self._lock = threading.Lock()
+        # model version -> Future of (report, (RGBA bytes, size))
+        self._futures = {}
+
+    def request(self):
+        """
+        Starts on the current model's report unless it is done or underway, and
+        returns its Future; never blocks.
+        """
+        pipeline, _, manifest = self.models.current
+        version = manifest["model_version"]
+        with self._lock:
+            future = self._futures.get(version)
+            if future is None:
+                # Only the current model's report is worth keeping
+                self._futures = {v: f for v, f in self._futures.items() if not f.done()}
+                future = self._futures[version] = self._executor.submit(self._evaluate, pipeline, manifest)
+                if self.on_ready is not None:
+                    future.add_done_callback(lambda _: self.on_ready(version))
+        return future
+
+    def _evaluate(self, pipeline, manifest):
+        version = manifest["model_version"]
+        report = load_cached(self.models.path, version, self.folds)
+        if report is None:
+            report = evaluate(pipeline, manifest, self.folds, self.workers)
+            save_cached(self.models.path, report, self.folds)
+        return report, render_report(report)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluation report of the credit scoring model")
+    parser.add_argument("--artifacts", default=os.environ.get("FM_ARTIFACT_DIR", "fm_artifacts"),
+                        help="trained model saved by `python FM.py --train`")
+    parser.add_argument("--folds", type=int, default=FOLDS, help="cross-validation folds")
+    parser.add_argument("--workers", type=int, help="processes fitting folds (default: one per CPU)")
+    parser.add_argument("--png", help="also save the rendered report to this file")
+    args = parser.parse_args()
+
+    models = ModelHandle(args.artifacts, lambda: train_pipeline(pd.DataFrame(SAMPLE_DATA)),
+                         metadata={"training_data": "sample", "training_sources": ["sample"]})
+    evaluator = ModelEvaluator(models, args.folds, args.workers)
+    for attempt in ("first request", "second request"):
+        start = time.perf_counter()
+        report, (pixels, size) = evaluator.request().result()
+        print(f"{attempt}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"credit model {report['model_version']} (report computed in {report['seconds']:.2f}s)")
+    print(f"held-out split of {report['holdout_rows']} applicants"
+          + (f": AUC {report['auc']:.4f}" if report["auc"] is not None else ""))
+    print(report["classification_report"])
+    print(describe_recipe_cv(report["recipe_cv"]))
+    evaluator.shutdown()
+
+    if args.png:
+        import matplotlib.image
+
+        matplotlib.image.imsave(args.png, np.frombuffer(pixels, np.uint8).reshape(size[1], size[0], 4))
+        print(f"wrote {args.png}")
+
+
+if __name__ == "__main__":
+    main()
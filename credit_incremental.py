@@ -0,0 +1,297 @@
+"""
+Out-of-core training for the credit scoring model (FM.py).
+
+The applicant history is read in chunks, so its size isn't limited by memory. A
+first pass accumulates the scaler's running mean and variance
+(StandardScaler.partial_fit); every epoch then streams the chunks again through a
+logistic-loss SGDClassifier (partial_fit, with a step size decaying as
+1/sqrt(updates)), which lands on practically the coefficients LogisticRegression
+finds. Small inputs get as many epochs as it takes to make MIN_UPDATES updates. A
+small holdout sampled from every chunk is kept out of training for FM.py's
+confusion matrix.
+
+`update` warm-starts from the saved model with new data (say, last month's
+applications): the running scaler statistics and the classifier continue from
+where they were instead of retraining on the whole history. Updating the scaler
+statistics moves the standardized features under the carried-over coefficients,
+so these are re-expressed in the new scaling first (the model's predictions on raw
+features are unchanged by that). Like the scaler statistics, the step size keeps
+decaying, so every month weighs about as much as its share of all the data seen.
+A LogisticRegression artifact (what FM.py --train and the apps' fallback write) is
+continued by an SGD classifier that starts from its coefficients. The result is
+saved as the artifact FM.py loads (see credit_artifacts.py), so a running app
+picks it up.
+
+    python credit_incremental.py train applicant_history.csv
+    python credit_incremental.py update applications_2024_06.csv
+    python credit_incremental.py compare --rows 200000   # against full-batch LogisticRegression
+
+CSV or Parquet input (Parquet needs pyarrow) with the feature and Default columns.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from credit_artifacts import load_artifacts, save_artifacts
+from credit_batch_score import file_format
+from credit_model import (CATEGORICAL_FEATURES, CATEGORIES, FEATURES, TARGET, TARGET_LABELS, CreditPipeline,
+                          synthetic_applicants, train_pipeline)
+from credit_scorer import CreditScorer
+
+CHUNK_ROWS = 100000
+# Epochs default to enough passes for MIN_UPDATES sample updates (at least one)
+MIN_UPDATES = 200000
+# L2 regularization and step size of the SGD classifier
+ALPHA = 1e-5
+ETA0 = 0.1
+# Share of each chunk held out of training, up to MAX_HOLDOUT rows in total
+HOLDOUT_FRACTION = 0.01
+MAX_HOLDOUT = 10000
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """DataFrames of up to `chunk_rows` rows with the FEATURES and TARGET columns of `path`."""
+    columns = FEATURES + [TARGET]
+    if file_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=columns)
+
+
+def fixed_encoders():
+    """
+    Label encoders for the schema's categories. A stream can't be scanned for its
+    categories up front, and the codes must not change between monthly updates.
+    """
+    encoders = {}
+    for column in CATEGORICAL_FEATURES:
+        encoders[column] = LabelEncoder()
+        encoders[column].classes_ = np.array(sorted(CATEGORIES[column]), dtype=object)
+    target_encoder = LabelEncoder()
+    target_encoder.classes_ = np.array(sorted(TARGET_LABELS), dtype=object)
+    return encoders, target_encoder
+
+
+def new_classifier(alpha=ALPHA, seed=0):
+    """The untrained logistic-loss SGDClassifier the trainer fits."""
+    # No averaging: with average=True, partial_fit loses the intercept's progress
+    # between calls, which stalls it when training in many chunks
+    return SGDClassifier(loss="log_loss", alpha=alpha, learning_rate="invscaling", eta0=ETA0,
+                         power_t=0.5, random_state=seed)
+
+
+def classifier_from_logistic(model, updates, alpha=ALPHA, seed=0):
+    """
+    new_classifier() continuing from the fitted binary LogisticRegression `model`:
+    same coefficients, and the step size decayed as if it had made `updates`
+    sample updates, so new data weighs about its share like in an update.
+    """
+    if len(model.classes_) != 2:
+        raise ValueError(f"Can't continue a {len(model.classes_)}-class model")
+    classifier = new_classifier(alpha, seed)
+    classifier.classes_ = model.classes_
+    classifier.n_features_in_ = model.n_features_in_
+    classifier.coef_ = np.array(model.coef_, dtype=np.float64, order="C")
+    classifier.intercept_ = np.array(model.intercept_, dtype=np.float64)
+    classifier.t_ = 1.0 + updates
+    return classifier
+
+
+class IncrementalTrainer:
+    """
+    Trains a CreditPipeline from chunks. Starts from scratch, or from `pipeline`
+    (warm start): one trained incrementally, or one with a LogisticRegression.
+    """
+
+    def __init__(self, pipeline=None, alpha=ALPHA, seed=0):
+        if pipeline is None:
+            self.encoders, self.target_encoder = fixed_encoders()
+            self.scaler = StandardScaler()
+            self.model = new_classifier(alpha, seed)
+            self.X_test, self.y_test = np.empty((0, len(FEATURES))), np.empty(0, dtype=int)
+        else:
+            self.encoders, self.target_encoder = pipeline.encoders, pipeline.target_encoder
+            self.scaler, self.model = pipeline.scaler, pipeline.model
+            if isinstance(self.model, LogisticRegression):
+                self.model = classifier_from_logistic(self.model, int(self.scaler.n_samples_seen_), alpha, seed)
+            elif not hasattr(self.model, "partial_fit"):
+                raise ValueError(f"Can't update a {type(self.model).__name__} incrementally; "
+                                 "train an incremental model first")
+            self.X_test, self.y_test = pipeline.X_test, pipeline.y_test
+        self.warm = pipeline is not None
+        self.seed = seed
+        self.rows = 0
+        self.epochs = 0
+
+    def _encode(self, chunk):
+        X = chunk[FEATURES].copy()
+        for column, encoder in self.encoders.items():
+            X[column] = encoder.transform(X[column])
+        return X, self.target_encoder.transform(chunk[TARGET])
+
+    def _holdout(self, index, n):
+        # The same rows of chunk `index` are held out on every pass
+        return np.random.default_rng([self.seed, index]).random(n) < HOLDOUT_FRACTION
+
+    def _rescale(self, old_mean, old_scale):
+        """
+        Re-expresses the coefficients fitted on (x - old_mean) / old_scale in the
+        scaler's current statistics, so the warm start continues from the same model:
+            w . (x - m0) / s0 + b  ==  (w * s1 / s0) . (x - m1) / s1 + b + w . (m1 - m0) / s0
+        """
+        weights = self.model.coef_ / old_scale
+        self.model.intercept_ = self.model.intercept_ + weights @ (self.scaler.mean_ - old_mean)
+        self.model.coef_ = np.ascontiguousarray(weights * self.scaler.scale_)
+
+    def fit(self, chunks, epochs=None):
+        """
+        Trains on the data yielded by chunks(), a function returning a fresh
+        iterator of DataFrames on every call, and returns the updated pipeline.
+        """
+        classes = np.arange(len(self.target_encoder.classes_))
+        if self.warm:
+            old_mean, old_scale = self.scaler.mean_.copy(), self.scaler.scale_.copy()
+        holdout_X, holdout_y, held = [], [], 0
+        rows = 0
+        for index, chunk in enumerate(chunks()):
+            X, y = self._encode(chunk)
+            holdout = self._holdout(index, len(X))
+            self.scaler.partial_fit(X[~holdout])
+            rows += int((~holdout).sum())
+            if held < MAX_HOLDOUT and holdout.any():
+                holdout_X.append(X[holdout][:MAX_HOLDOUT - held])
+                holdout_y.append(y[holdout][:MAX_HOLDOUT - held])
+                held += len(holdout_y[-1])
+
+        self.rows += rows
+        if self.warm:
+            self._rescale(old_mean, old_scale)
+            if len(self.y_test):
+                # The carried-over holdout too, in case the new data yields none
+                self.X_test = self.scaler.transform(
+                    pd.DataFrame(self.X_test * old_scale + old_mean, columns=self.scaler.feature_names_in_))
+        if epochs is None:
+            # A warm start makes one pass, so the new data isn't weighed several times
+            epochs = 1 if self.warm else max(1, -(-MIN_UPDATES // max(rows, 1)))
+        self.epochs = epochs
+        rng = np.random.default_rng(self.seed)
+        for _ in range(epochs):
+            for index, chunk in enumerate(chunks()):
+                X, y = self._encode(chunk)
+                keep = ~self._holdout(index, len(X))
+                X_scaled, y = self.scaler.transform(X[keep]), y[keep]
+                order = rng.permutation(len(y))
+                self.model.partial_fit(X_scaled[order], y[order], classes=classes)
+
+        if holdout_X:
+            # The newest data is the most relevant holdout
+            self.X_test = self.scaler.transform(pd.concat(holdout_X))
+            self.y_test = np.concatenate(holdout_y)
+        return CreditPipeline(self.encoders, self.target_encoder, self.scaler, self.model, self.X_test, self.y_test)
+
+
+def train_file(path, pipeline=None, epochs=None, chunk_rows=CHUNK_ROWS, alpha=ALPHA):
+    """Returns (pipeline, trainer) trained on `path`, warm-started from `pipeline` if given."""
+    trainer = IncrementalTrainer(pipeline, alpha=alpha)
+    return trainer.fit(lambda: iter_chunks(path, chunk_rows), epochs), trainer
+
+
+def evaluate(pipeline, frame):
+    """Accuracy, log loss and ROC AUC of `pipeline` on the labelled applicants in `frame`."""
+    probabilities, labels = CreditScorer.from_pipeline(pipeline).score_frame(frame)
+    truth = (frame[TARGET] == pipeline.target_encoder.classes_[1]).to_numpy()
+    return {
+        "accuracy": accuracy_score(frame[TARGET], labels),
+        "log_loss": log_loss(truth, probabilities, labels=[False, True]),
+        "roc_auc": roc_auc_score(truth, probabilities),
+    }, labels
+
+
+def compare(rows, test_rows, epochs, chunk_rows, alpha, seed=0):
+    """Trains both ways on `rows` synthetic applicants and prints their quality on a separate test set."""
+    train = synthetic_applicants(rows, seed)
+    test = synthetic_applicants(test_rows, seed + 1)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "history.csv")
+        train.to_csv(path, index=False)
+
+        start = time.perf_counter()
+        batch = train_pipeline(train, test_size=HOLDOUT_FRACTION)
+        batch_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        incremental, trainer = train_file(path, epochs=epochs, chunk_rows=chunk_rows, alpha=alpha)
+        incremental_seconds = time.perf_counter() - start
+
+    batch_scores, batch_labels = evaluate(batch, test)
+    incremental_scores, incremental_labels = evaluate(incremental, test)
+    print(f"{rows} training rows, {test_rows} test rows, {trainer.epochs} epochs over {chunk_rows}-row chunks")
+    print(f"{'':24s}{'accuracy':>10s}{'log loss':>10s}{'ROC AUC':>10s}{'seconds':>10s}")
+    for name, scores, seconds in (("LogisticRegression", batch_scores, batch_seconds),
+                                  ("incremental SGD", incremental_scores, incremental_seconds)):
+        print(f"{name:24s}{scores['accuracy']:10.4f}{scores['log_loss']:10.4f}{scores['roc_auc']:10.4f}{seconds:10.1f}")
+    print(f"same label for {np.mean(batch_labels == incremental_labels):.2%} of the test applicants")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-core training for the credit scoring model")
+    parser.add_argument("command", choices=["train", "update", "compare"],
+                        help="train from scratch, update the saved model with new data, or compare with LogisticRegression")
+    parser.add_argument("data", nargs="?", help="applications (.csv or .parquet) with the feature and Default columns")
+    parser.add_argument("--artifacts", default=os.environ.get("FM_ARTIFACT_DIR", "fm_artifacts"),
+                        help="where FM.py loads the model from")
+    parser.add_argument("--epochs", type=int,
+                        help="passes over the data (default: enough for MIN_UPDATES updates; one for update)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read at a time")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="L2 regularization strength")
+    parser.add_argument("--rows", type=int, default=200000, help="compare: synthetic training rows")
+    parser.add_argument("--test-rows", type=int, default=50000, help="compare: synthetic test rows")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.rows, args.test_rows, args.epochs, args.chunk_rows, args.alpha)
+        return
+    if not args.data:
+        parser.error(f"{args.command} needs a data file")
+
+    previous = None
+    if args.command == "update":
+        try:
+            previous, _, previous_manifest = load_artifacts(args.artifacts)
+        except (OSError, ValueError) as e:
+            parser.error(f"can't update: {e}")
+    start = time.perf_counter()
+    try:
+        pipeline, trainer = train_file(args.data, previous, args.epochs, args.chunk_rows, args.alpha)
+    except ValueError as e:
+        # A model that can't be continued, or data that doesn't fit the schema
+        parser.error(f"can't {args.command}: {e}")
+    metadata = {
+        "training_data": args.data,
+        "trainer": "incremental",
+        "rows_seen": int(pipeline.scaler.n_samples_seen_),
+        "holdout_accuracy": float(pipeline.model.score(pipeline.X_test, pipeline.y_test)) if len(pipeline.y_test) else None,
+    }
+    if previous is not None:
+        metadata["updated_from"] = previous_manifest["model_version"]
+    # Everything the model has been trained on, as far as it's known
+    if previous is None:
+        metadata["training_sources"] = [os.path.abspath(args.data)]
+    elif previous_manifest.get("training_sources"):
+        metadata["training_sources"] = previous_manifest["training_sources"] + [os.path.abspath(args.data)]
+    manifest = save_artifacts(args.artifacts, pipeline, **metadata)
+    print(f"{args.command}: {trainer.rows} rows x {trainer.epochs} epoch(s) in {time.perf_counter() - start:.1f}s, "
+          f"{metadata['rows_seen']} rows seen in total; wrote credit model {manifest['model_version']} to {args.artifacts}")
+
+
+if __name__ == "__main__":
+    main()
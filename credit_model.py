@@ -0,0 +1,101 @@
+"""
+Training for the credit scoring model (FM.py).
+
+The categorical columns are label-encoded, all features are standardized and a
+logistic regression predicts whether the applicant defaults. The fitted pieces are
+kept together in a CreditPipeline, which also holds the held-out test split for
+the confusion matrix.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+NUMERIC_FEATURES = ['Age', 'Income', 'LoanAmount']
+CATEGORICAL_FEATURES = ['CreditHistory', 'EmploymentStatus']
+FEATURES = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+TARGET = 'Default'
+TARGET_LABELS = ['No', 'Yes']
+
+CATEGORIES = {
+    'CreditHistory': ['Good', 'Bad'],
+    'EmploymentStatus': ['Employed', 'Self-employed', 'Unemployed', 'Retired'],
+}
+
+# The sample applicants the app is trained on
+SAMPLE_DATA = {
+    'Age': [25, 35, 45, 50, 23, 31, 60, 40, 29, 52],
+    'Income': [30000, 60000, 80000, 72000, 25000, 40000, 90000, 55000, 38000, 85000],
+    'LoanAmount': [10000, 15000, 20000, 18000, 5000, 12000, 25000, 70000, 11000, 23000],
+    'CreditHistory': ['Good', 'Good', 'Bad', 'Good', 'Bad', 'Good', 'Good', 'Bad', 'Good', 'Bad'],
+    'EmploymentStatus': ['Employed', 'Self-employed', 'Unemployed', 'Employed', 'Unemployed',
+                         'Employed', 'Retired', 'Self-employed', 'Employed', 'Unemployed'],
+    'Default': ['No', 'No', 'Yes', 'No', 'Yes', 'No', 'No', 'Yes', 'No', 'Yes']
+}
+
+
+class CreditPipeline:
+    """The fitted label encoders, scaler and model, and the held-out test split."""
+
+    def __init__(self, encoders, target_encoder, scaler, model, X_test, y_test):
+        self.encoders = encoders
+        self.target_encoder = target_encoder
+        self.scaler = scaler
+        self.model = model
+        self.X_test = X_test
+        self.y_test = y_test
+
+    def transform(self, frame):
+        """Encodes and scales the FEATURES columns of `frame` like the training data."""
+        X = frame[FEATURES].copy()
+        for column, encoder in self.encoders.items():
+            X[column] = encoder.transform(X[column])
+        return self.scaler.transform(X)
+
+    def predict(self, frame):
+        """Predicted labels ('Yes'/'No') for the applicants in `frame`, the sklearn way."""
+        return self.target_encoder.inverse_transform(self.model.predict(self.transform(frame)))
+
+
+def train_pipeline(df, test_size=0.3, random_state=42):
+    """Fits the encoders, scaler and model on `df` (FEATURES plus TARGET columns)."""
+    df = df.copy()
+    encoders = {column: LabelEncoder() for column in CATEGORICAL_FEATURES}
+    for column, encoder in encoders.items():
+        df[column] = encoder.fit_transform(df[column])
+    target_encoder = LabelEncoder()
+    y = target_encoder.fit_transform(df[TARGET])
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(df[FEATURES])
+
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=test_size, random_state=random_state)
+
+    model = LogisticRegression()
+    model.fit(X_train, y_train)
+    return CreditPipeline(encoders, target_encoder, scaler, model, X_test, y_test)
+
+
+def synthetic_applicants(n, seed=0):
+    """
+    `n` random applicants with a plausible default label, for benchmarks and
+    checks that need more data than SAMPLE_DATA.
+    """
+    rng = np.random.default_rng(seed)
+    age = rng.integers(18, 75, n)
+    income = np.round(rng.lognormal(10.8, 0.5, n), -2)
+    loan = np.round(rng.lognormal(9.6, 0.7, n), -2)
+    credit = rng.choice(CATEGORIES['CreditHistory'], n, p=[0.7, 0.3])
+    employment = rng.choice(CATEGORIES['EmploymentStatus'], n, p=[0.6, 0.15, 0.15, 0.1])
+    risk = (-1.0 + 2.0 * (credit == 'Bad') + 1.5 * (employment == 'Unemployed')
+            + 1.2 * np.log(loan / income) - 0.01 * (age - 40))
+    default = rng.random(n) < 1 / (1 + np.exp(-risk))
+    return pd.DataFrame({
+        'Age': age,
+        'Income': income,
+        'LoanAmount': loan,
+        'CreditHistory': credit,
+        'EmploymentStatus': employment,
+        'Default': np.where(default, 'Yes', 'No'),
+    })
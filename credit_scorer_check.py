@@ -0,0 +1,110 @@
+"""
+Parity check and timing of the compiled credit scorer (credit_scorer.py) against
+the sklearn pipeline it was compiled from (credit_model.py):
+
+    python credit_scorer_check.py
+    python credit_scorer_check.py --rows 100000 --timing-runs 20000
+
+Checks FM.py's model on its sample data and every category combination, and a
+model trained on synthetic applicants, on probabilities and labels. Exits with an
+error on any mismatch.
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from credit_model import CATEGORIES, FEATURES, SAMPLE_DATA, synthetic_applicants, train_pipeline
+from credit_scorer import CreditScorer
+
+# Probabilities may differ by floating point rounding only
+TOLERANCE = 1e-9
+
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAILED: {message}")
+    print(f"ok   {message}")
+
+
+def check_parity(name, pipeline, frame):
+    scorer = CreditScorer.from_pipeline(pipeline)
+    positive = list(pipeline.target_encoder.inverse_transform(pipeline.model.classes_)).index(scorer.labels[1])
+    expected_proba = pipeline.model.predict_proba(pipeline.transform(frame))[:, positive]
+    expected_labels = pipeline.predict(frame)
+
+    probabilities, labels = scorer.score_frame(frame)
+    check(np.abs(probabilities - expected_proba).max() <= TOLERANCE, f"{name}: batch probabilities match")
+    check((labels == expected_labels).all(), f"{name}: batch labels match")
+
+    records = frame[FEATURES].to_dict("records")
+    probabilities, labels = scorer.score_many(records)
+    check(np.abs(probabilities - expected_proba).max() <= TOLERANCE, f"{name}: list-of-applicants probabilities match")
+    check((labels == expected_labels).all(), f"{name}: list-of-applicants labels match")
+
+    single = [scorer.score(row) for row in records]
+    check(max(abs(p - e) for (p, _), e in zip(single, expected_proba)) <= TOLERANCE,
+          f"{name}: single-applicant probabilities match")
+    check([label for _, label in single] == list(expected_labels), f"{name}: single-applicant labels match")
+
+
+def all_combinations(frame):
+    """Every category combination at a few points of the numeric ranges."""
+    rows = []
+    quantiles = frame[['Age', 'Income', 'LoanAmount']].quantile([0, 0.25, 0.5, 0.75, 1]).to_numpy()
+    for (age, income, loan), credit, employment in itertools.product(
+            quantiles, CATEGORIES['CreditHistory'], CATEGORIES['EmploymentStatus']):
+        rows.append({'Age': age, 'Income': income, 'LoanAmount': loan,
+                     'CreditHistory': credit, 'EmploymentStatus': employment})
+    return pd.DataFrame(rows)
+
+
+def time_per_call(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the compiled credit scorer against the sklearn pipeline")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic applicants to train and check on")
+    parser.add_argument("--timing-runs", type=int, default=2000, help="single-applicant predictions to time")
+    args = parser.parse_args()
+
+    sample = pd.DataFrame(SAMPLE_DATA)
+    pipeline = train_pipeline(sample)
+    check_parity("sample data", pipeline, sample)
+    check_parity("category combinations", pipeline, all_combinations(sample))
+
+    synthetic = synthetic_applicants(args.rows)
+    check_parity("synthetic data", train_pipeline(synthetic), synthetic)
+
+    scorer = CreditScorer.from_pipeline(pipeline)
+    try:
+        scorer.score({'Age': 30, 'Income': 1, 'LoanAmount': 1, 'CreditHistory': 'Fair', 'EmploymentStatus': 'Employed'})
+        check(False, "unknown categories are rejected")
+    except ValueError:
+        check(True, "unknown categories are rejected")
+
+    # FM.py's "Predict Default" click, before and after
+    applicant = {'Age': 41.0, 'Income': 52000.0, 'LoanAmount': 30000.0,
+                 'CreditHistory': 'Good', 'EmploymentStatus': 'Self-employed'}
+
+    def sklearn_path():
+        input_data = dict(applicant)
+        for column, encoder in pipeline.encoders.items():
+            input_data[column] = encoder.transform([applicant[column]])[0]
+        input_scaled = pipeline.scaler.transform(pd.DataFrame([input_data]))
+        return pipeline.model.predict(input_scaled)[0], pipeline.model.predict_proba(input_scaled)[0]
+
+    sklearn_seconds = time_per_call(sklearn_path, max(1, args.timing_runs // 20))
+    scorer_seconds = time_per_call(lambda: scorer.score(applicant), args.timing_runs)
+    print(f"single applicant: sklearn pipeline {sklearn_seconds * 1e3:.2f} ms, "
+          f"compiled scorer {scorer_seconds * 1e6:.2f} us ({sklearn_seconds / scorer_seconds:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
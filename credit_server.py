@@ -0,0 +1,358 @@
+"""
+Local HTTP scoring service for the credit scoring model (FM.py), for online
+credit decisions without clicking "Predict Default".
+
+Concurrent requests are collected for up to --max-wait-ms (or until --max-batch
+applicants are waiting) and scored as one vectorized batch with the compiled
+scorer (credit_scorer.py) of the model FM.py trains. The model is reloaded when a
+retrain replaces the artifact (see credit_artifacts.py).
+
+    python credit_server.py --port 8081 --max-batch 256 --max-wait-ms 2
+
+    POST /score     {"Age": 41, "Income": 52000, "LoanAmount": 30000,
+                     "CreditHistory": "Good", "EmploymentStatus": "Employed"}
+                    or a list of such objects
+    GET  /metrics   latency, queue wait and batch size histograms (Prometheus text format)
+    GET  /stats     the same summarized as JSON, with p50/p95/p99
+    GET  /healthz   the model version being served
+
+Built on asyncio streams (HTTP/1.1 with keep-alive), so it needs no web framework.
+One process, one event loop: scoring a batch takes microseconds per applicant, so
+it runs on the loop itself and there is no thread handoff in the latency.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from credit_artifacts import ModelHandle
+from credit_model import CATEGORICAL_FEATURES, NUMERIC_FEATURES, SAMPLE_DATA, train_pipeline
+
+MAX_BATCH = 256
+MAX_WAIT_MS = 2.0
+MAX_BODY_BYTES = 1 << 20
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class Histogram:
+    """Counts of observations per bucket upper bound, plus their sum, Prometheus style."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    @classmethod
+    def latency(cls):
+        # 50 us to 5 s, ten buckets per factor of ten
+        return cls(float(f"{b:.3g}") for b in np.logspace(-4.3, 0.7, 51))
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolated within its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def prometheus(self, name, help_text):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.total:.9g}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class MicroBatcher:
+    """
+    Scores the applicants of concurrent requests together. A batch opens with the
+    first waiting request and closes after `max_wait` seconds or as soon as
+    `max_batch` applicants are waiting; a request with more applicants than that
+    is scored on its own.
+    """
+
+    def __init__(self, models, max_batch=MAX_BATCH, max_wait=MAX_WAIT_MS / 1000):
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.queue_wait = Histogram.latency()
+        self.score_time = Histogram.latency()
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096])
+        self.batches = 0
+        self.scored = 0
+
+    async def score(self, applicants):
+        """(probabilities, labels, model version) for a list of validated applicants."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((applicants, future, time.perf_counter()))
+        return await future
+
+    def _drain(self, batch, size):
+        while size < self.max_batch and not self.queue.empty():
+            item = self.queue.get_nowait()
+            batch.append(item)
+            size += len(item[0])
+        return size
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = self._drain(batch, len(batch[0][0]))
+            deadline = loop.time() + self.max_wait
+            # Hold the batch open for the others arriving in the window
+            while size < self.max_batch and loop.time() < deadline:
+                await asyncio.sleep(min(deadline - loop.time(), self.max_wait / 4))
+                size = self._drain(batch, size)
+            self._score_batch(batch, size)
+
+    def _score_batch(self, batch, size):
+        start = time.perf_counter()
+        for _, _, queued in batch:
+            self.queue_wait.observe(start - queued)
+        self.models.refresh()
+        _, scorer, manifest = self.models.current
+        applicants = [applicant for item in batch for applicant in item[0]]
+        try:
+            probabilities, labels = scorer.score_many(applicants)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.score_time.observe(time.perf_counter() - start)
+        self.batch_size.observe(size)
+        self.batches += 1
+        self.scored += size
+        offset = 0
+        for items, future, _ in batch:
+            end = offset + len(items)
+            # The client may have gone away in the meantime
+            if not future.done():
+                future.set_result((probabilities[offset:end], labels[offset:end], manifest["model_version"]))
+            offset = end
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ScoringServer:
+    def __init__(self, models, max_batch=MAX_BATCH, max_wait=MAX_WAIT_MS / 1000):
+        self.models = models
+        self.batcher = MicroBatcher(models, max_batch, max_wait)
+        self.request_latency = Histogram.latency()
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+
+    def validate(self, applicant):
+        """The applicant with float numeric features, or RequestError if it can't be scored."""
+        if not isinstance(applicant, dict):
+            raise RequestError(400, "Each applicant must be a JSON object")
+        tables = dict(self.models.current[1].categorical)
+        clean = {}
+        for name in NUMERIC_FEATURES:
+            value = applicant.get(name)
+            # json.loads accepts NaN and Infinity, which would score as a decision
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise RequestError(400, f"{name} must be a finite number")
+            clean[name] = float(value)
+        for name in CATEGORICAL_FEATURES:
+            value = applicant.get(name)
+            # Lists and objects aren't hashable, so check the type before the lookup
+            if not isinstance(value, str) or value not in tables[name]:
+                raise RequestError(400, f"Unknown {name} {value!r}; expected one of {sorted(tables[name])}")
+            clean[name] = value
+        return clean
+
+    async def handle_score(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise RequestError(400, "Body must be JSON") from None
+        single = not isinstance(payload, list)
+        applicants = [self.validate(applicant) for applicant in ([payload] if single else payload)]
+        if not applicants:
+            return {"results": [], "model_version": self.models.model_version}
+        probabilities, labels, version = await self.batcher.score(applicants)
+        results = [{"default_probability": round(float(p), 6), "default": label}
+                   for p, label in zip(probabilities, labels)]
+        if single:
+            return dict(results[0], model_version=version)
+        return {"results": results, "model_version": version}
+
+    def stats(self):
+        batcher = self.batcher
+        return {
+            "model_version": self.models.model_version,
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "applicants_scored": batcher.scored,
+            "batches": batcher.batches,
+            "max_batch": batcher.max_batch,
+            "max_wait_ms": batcher.max_wait * 1000,
+            "request_seconds": self.request_latency.summary(),
+            "queue_wait_seconds": batcher.queue_wait.summary(),
+            "batch_score_seconds": batcher.score_time.summary(),
+            "batch_size": batcher.batch_size.summary(),
+        }
+
+    def metrics(self):
+        batcher = self.batcher
+        lines = (self.request_latency.prometheus("credit_request_seconds", "Time to answer a POST /score")
+                 + batcher.queue_wait.prometheus("credit_queue_wait_seconds", "Time a request waited for its batch")
+                 + batcher.score_time.prometheus("credit_batch_score_seconds", "Time to score a batch")
+                 + batcher.batch_size.prometheus("credit_batch_size", "Applicants per batch"))
+        lines += ["# TYPE credit_requests_total counter", f"credit_requests_total {self.requests}",
+                  "# TYPE credit_request_errors_total counter", f"credit_request_errors_total {self.errors}"]
+        return "\n".join(lines) + "\n"
+
+    async def dispatch(self, method, path, body):
+        """(status, content type, body bytes) for one request."""
+        path = path.split("?", 1)[0]
+        if path == "/score":
+            if method != "POST":
+                raise RequestError(405, "Use POST")
+            start = time.perf_counter()
+            self.requests += 1
+            result = await self.handle_score(body)
+            self.request_latency.observe(time.perf_counter() - start)
+            return 200, "application/json", json.dumps(result).encode()
+        if method != "GET":
+            raise RequestError(405, "Use GET")
+        if path == "/metrics":
+            return 200, "text/plain; version=0.0.4", self.metrics().encode()
+        if path == "/stats":
+            return 200, "application/json", json.dumps(self.stats()).encode()
+        if path == "/healthz":
+            return 200, "application/json", json.dumps({"model_version": self.models.model_version}).encode()
+        raise RequestError(404, f"No route for {path}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = request_line.split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              if version == "HTTP/1.1" else headers.get("connection", "").lower() == "keep-alive")
+
+                try:
+                    length = headers.get("content-length", "0")
+                    if not (length.isascii() and length.isdigit()):
+                        # Where the body ends is unknown: answer and drop the connection
+                        keep_alive = False
+                        raise RequestError(400, f"Invalid Content-Length {length!r}")
+                    length = int(length)
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise RequestError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+                    body = await reader.readexactly(length) if length else b""
+                    status, content_type, payload = await self.dispatch(method, path, body)
+                except RequestError as e:
+                    status, content_type = e.status, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode()
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode()
+                if status >= 400:
+                    self.errors += 1
+
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                             f"Content-Type: {content_type}\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"scoring with credit model {self.models.model_version} on http://{host}:{port} "
+              f"(max batch {self.batcher.max_batch}, max wait {self.batcher.max_wait * 1000:g} ms)", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP scoring service for the credit scoring model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="applicants scored together at most")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="how long a batch waits for more requests")
+    parser.add_argument("--artifacts", default=os.environ.get("FM_ARTIFACT_DIR", "fm_artifacts"),
+                        help="trained model saved by `python FM.py --train`")
+    args = parser.parse_args()
+
+    # The same model as FM.py
+    models = ModelHandle(args.artifacts, lambda: train_pipeline(pd.DataFrame(SAMPLE_DATA)),
+                         metadata={"training_data": "sample", "training_sources": ["sample"]})
+    server = ScoringServer(models, args.max_batch, args.max_wait_ms / 1000)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
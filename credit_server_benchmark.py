@@ -0,0 +1,154 @@
+"""
+Load test for the credit scoring service (credit_server.py).
+
+Opens --connections keep-alive connections, each sending one POST /score after
+the other (a closed loop, like that many concurrent clients), and reports the
+decisions per second and the client-side latency percentiles next to the
+server's own histograms from /stats:
+
+    python credit_server_benchmark.py --spawn                        # starts a server on a free port
+    python credit_server_benchmark.py --spawn --max-wait-ms 1 --connections 128
+    python credit_server_benchmark.py --url http://127.0.0.1:8081    # an already running server
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from credit_model import FEATURES, synthetic_applicants
+
+
+async def request(reader, writer, method, path, body=b""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    return status, await reader.readexactly(length)
+
+
+async def client(host, port, bodies, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", "/score", bodies[i % len(bodies)])
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            i += 1
+    finally:
+        writer.close()
+
+
+async def run(host, port, connections, seconds, warmup, applicants_per_request):
+    applicants = synthetic_applicants(4096)[FEATURES].to_dict("records")
+    bodies = []
+    for i in range(0, len(applicants), applicants_per_request):
+        group = applicants[i:i + applicants_per_request]
+        bodies.append(json.dumps(group[0] if applicants_per_request == 1 else group).encode())
+
+    if warmup:
+        await asyncio.gather(*(client(host, port, bodies, time.perf_counter() + warmup, [], [])
+                               for _ in range(connections)))
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, bodies, start + seconds, latencies, errors)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, stats = await request(reader, writer, "GET", "/stats")
+    writer.close()
+    return latencies, errors, elapsed, json.loads(stats)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_listening(host, port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("credit_server.py exited during startup")
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit("credit_server.py didn't start listening")
+
+
+def ms(seconds):
+    return f"{seconds * 1000:7.2f} ms" if seconds is not None else "      -"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the credit scoring service")
+    parser.add_argument("--url", default="http://127.0.0.1:8081", help="server to test")
+    parser.add_argument("--spawn", action="store_true", help="start credit_server.py on a free port for the test")
+    parser.add_argument("--max-batch", type=int, help="--spawn: server's max batch size")
+    parser.add_argument("--max-wait-ms", type=float, help="--spawn: server's max batch wait")
+    parser.add_argument("--connections", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measured duration")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before")
+    parser.add_argument("--applicants", type=int, default=1, help="applicants per request")
+    args = parser.parse_args()
+
+    process = None
+    if args.spawn:
+        host, port = "127.0.0.1", free_port()
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "credit_server.py"),
+                   "--host", host, "--port", str(port)]
+        if args.max_batch:
+            command += ["--max-batch", str(args.max_batch)]
+        if args.max_wait_ms is not None:
+            command += ["--max-wait-ms", str(args.max_wait_ms)]
+        process = subprocess.Popen(command)
+        wait_until_listening(host, port, process)
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+
+    try:
+        latencies, errors, elapsed, stats = asyncio.run(
+            run(host, port, args.connections, args.seconds, args.warmup, args.applicants))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    requests = len(latencies)
+    print(f"{args.connections} connections x {args.applicants} applicant(s) per request for {elapsed:.1f}s "
+          f"(server: max batch {stats['max_batch']}, max wait {stats['max_wait_ms']:g} ms)")
+    print(f"{requests / elapsed:.0f} requests/s, {requests * args.applicants / elapsed:.0f} decisions/s, "
+          f"{len(errors)} errors")
+    print(f"client latency   p50 {ms(percentile(latencies, 0.5))}  p95 {ms(percentile(latencies, 0.95))}  "
+          f"p99 {ms(percentile(latencies, 0.99))}  max {ms(max(latencies))}")
+    for name, key in (("server latency", "request_seconds"), ("queue wait", "queue_wait_seconds"),
+                      ("batch scoring", "batch_score_seconds")):
+        summary = stats[key]
+        print(f"{name:17s}p50 {ms(summary['p50'])}  p95 {ms(summary['p95'])}  p99 {ms(summary['p99'])}")
+    print(f"batch size       mean {stats['batch_size']['mean']:.1f}, p99 {stats['batch_size']['p99']:.0f} "
+          f"over {stats['batches']} batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Small bounded LRU cache with hit/miss/eviction counters.
+"""
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Keeps the `max_entries` most recently used items; get/put are O(1). With
+    `max_bytes` and a `sizeof(value)` function the total size is bounded as well.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._items = OrderedDict()
+        self._sizes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        value = self._items.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self._sizeof is not None:
+            self.total_bytes -= self._sizes.get(key, 0)
+            self._sizes[key] = self._sizeof(value)
+            self.total_bytes += self._sizes[key]
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries or (
+            self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self._items) > 1
+        ):
+            evicted, _ = self._items.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(evicted, 0)
+            self.evictions += 1
+
+    def clear(self):
+        """Drops every entry; the counters keep running."""
+        self._items.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self._items),
+            "max_entries": self.max_entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
@@ -0,0 +1,307 @@
+"""
+Top-k cosine neighbour index for the movie recommender (RS.py).
+
+Instead of materialising the dense n x n cosine similarity matrix, the sparse
+TF-IDF matrix is multiplied against itself one block of rows at a time and only
+the best `top_k` neighbours of every title are kept. The result is two compact
+(n, top_k) arrays, so memory grows linearly with the catalog size. A block's
+product is (rows x n) and nearly dense when titles share common terms, so the
+rows per block shrink as the catalog grows to keep it under MAX_BLOCK_BYTES.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+# Rows multiplied per block at most
+DEFAULT_BLOCK_SIZE = 512
+# Cap on a block's similarity product, assumed dense: scipy's sparse product holds
+# a float32 value and an int32 column per entry, plus the per-row accumulator
+MAX_BLOCK_BYTES = 256 * 2**20
+BYTES_PER_PRODUCT_ENTRY = 12
+
+
+def block_rows(n, block_size=DEFAULT_BLOCK_SIZE, max_block_bytes=MAX_BLOCK_BYTES):
+    """Rows per block so that a (rows x n) product stays under `max_block_bytes`."""
+    return max(1, min(block_size, max_block_bytes // max(1, n * BYTES_PER_PRODUCT_ENTRY)))
+
+
+class NeighborIndex:
+    """Fixed-width neighbour lists: row i holds the ids and scores of title i's nearest titles."""
+
+    def __init__(self, indices, scores):
+        # indices: (n, top_k) int32, -1 marks an empty slot (fewer than top_k neighbours)
+        # scores:  (n, top_k) float32, sorted from most to least similar
+        self.indices = indices
+        self.scores = scores
+        # Writable arrays with spare rows, allocated the first time the index is updated
+        self._buffers = None
+
+    def __len__(self):
+        return self.indices.shape[0]
+
+    @property
+    def top_k(self):
+        return self.indices.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.scores.nbytes
+
+    def neighbors(self, row, top_n=None):
+        """Returns up to `top_n` (index, score) pairs for the given row, best first."""
+        top_n = self.top_k if top_n is None else min(top_n, self.top_k)
+        row_indices = self.indices[row, :top_n]
+        row_scores = self.scores[row, :top_n]
+        return [(int(i), float(s)) for i, s in zip(row_indices, row_scores) if i >= 0]
+
+    def reserve(self, n_rows):
+        """
+        Makes the arrays writable and `n_rows` long. Memory-mapped arrays are copied
+        once; after that capacity doubles, so appending rows is amortised O(1).
+        """
+        capacity = 0 if self._buffers is None else len(self._buffers[0])
+        if n_rows > capacity:
+            capacity = max(n_rows, 2 * capacity, 16)
+            indices = np.full((capacity, self.top_k), -1, dtype=np.int32)
+            scores = np.zeros((capacity, self.top_k), dtype=np.float32)
+            n = len(self)
+            indices[:n] = self.indices
+            scores[:n] = self.scores
+            self._buffers = (indices, scores)
+        self.indices = self._buffers[0][:n_rows]
+        self.scores = self._buffers[1][:n_rows]
+
+    def set_row(self, row, cols, vals):
+        self.indices[row] = -1
+        self.scores[row] = 0
+        self.indices[row, :len(cols)] = cols
+        self.scores[row, :len(vals)] = vals
+
+
+class GrowableCSR:
+    """
+    CSR matrix with spare capacity, so rows can be appended or cleared without
+    copying the whole matrix on every catalog update. `matrix()` is a zero-copy view.
+    """
+
+    def __init__(self, matrix):
+        matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        self.n_rows, self.n_cols = matrix.shape
+        self.nnz = matrix.nnz
+        self._data = np.array(matrix.data)
+        self._indices = np.array(matrix.indices)
+        self._indptr = np.array(matrix.indptr)
+
+    @staticmethod
+    def _grow(array, needed):
+        if needed <= len(array):
+            return array
+        grown = np.zeros(max(needed, 2 * len(array)), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def matrix(self):
+        return sparse.csr_matrix(
+            (self._data[:self.nnz], self._indices[:self.nnz], self._indptr[:self.n_rows + 1]),
+            shape=(self.n_rows, self.n_cols), copy=False,
+        )
+
+    def append(self, rows):
+        """Appends the rows of a CSR matrix with the same number of columns."""
+        rows = sparse.csr_matrix(rows, dtype=np.float32)
+        n_new = rows.shape[0]
+        self._data = self._grow(self._data, self.nnz + rows.nnz)
+        self._indices = self._grow(self._indices, self.nnz + rows.nnz)
+        self._indptr = self._grow(self._indptr, self.n_rows + n_new + 1)
+        self._data[self.nnz:self.nnz + rows.nnz] = rows.data
+        self._indices[self.nnz:self.nnz + rows.nnz] = rows.indices
+        self._indptr[self.n_rows + 1:self.n_rows + n_new + 1] = rows.indptr[1:] + self.nnz
+        self.nnz += rows.nnz
+        self.n_rows += n_new
+
+    def clear_rows(self, rows):
+        """Zeroes the given rows in place; zero similarities are never kept as neighbours."""
+        for row in rows:
+            self._data[self._indptr[row]:self._indptr[row + 1]] = 0
+
+
+def select_top_k(cols, vals, top_k, exclude):
+    """Best `top_k` (cols, vals) pairs, highest score first, dropping `exclude` and zero scores."""
+    # A title is never its own recommendation, and cleared (removed) rows score zero
+    keep = (cols != exclude) & (vals > 0)
+    cols, vals = cols[keep], vals[keep]
+
+    if len(vals) > top_k:
+        # Everything above the k-th best score, then the lowest indices among ties with it
+        kth = np.partition(vals, len(vals) - top_k)[len(vals) - top_k]
+        above = np.flatnonzero(vals > kth)
+        tied = np.flatnonzero(vals == kth)
+        tied = tied[np.argsort(cols[tied], kind="stable")[:top_k - len(above)]]
+        part = np.concatenate([above, tied])
+        cols, vals = cols[part], vals[part]
+
+    # Highest score first, lower title index first on ties (same order as a stable sort)
+    order = np.lexsort((cols, -vals))
+    return cols[order], vals[order]
+
+
+def _top_k_rows(block, row_ids, top_k):
+    """Selects the top_k entries of every row of a CSR similarity block, skipping the diagonal."""
+    n_rows = block.shape[0]
+    indices = np.full((n_rows, top_k), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, top_k), dtype=np.float32)
+
+    for r in range(n_rows):
+        lo, hi = block.indptr[r], block.indptr[r + 1]
+        cols, vals = select_top_k(block.indices[lo:hi], block.data[lo:hi], top_k, row_ids[r])
+        indices[r, :len(cols)] = cols
+        scores[r, :len(vals)] = vals
+
+    return indices, scores
+
+
+def _build_block(matrix, matrix_t, start, stop, top_k):
+    # TF-IDF rows are L2-normalised, so the dot product is the cosine similarity
+    block = sparse.csr_matrix(matrix[start:stop] @ matrix_t)
+    return _top_k_rows(block, np.arange(start, stop), top_k)
+
+
+# Set once per worker process by _init_worker so the matrix is only shipped once.
+_worker_matrix = None
+_worker_matrix_t = None
+
+
+def _init_worker(matrix):
+    global _worker_matrix, _worker_matrix_t
+    # A callable loads the matrix inside the worker (e.g. memory-mapped from disk)
+    if callable(matrix):
+        matrix = sparse.csr_matrix(matrix(), dtype=np.float32, copy=False)
+    _worker_matrix = matrix
+    _worker_matrix_t = matrix.T.tocsr()
+
+
+def _build_block_in_worker(args):
+    start, stop, top_k = args
+    return start, _build_block(_worker_matrix, _worker_matrix_t, start, stop, top_k)
+
+
+def build_neighbor_index(tfidf_matrix, top_k=20, block_size=DEFAULT_BLOCK_SIZE, n_jobs=1, worker_matrix=None,
+                         max_block_bytes=MAX_BLOCK_BYTES):
+    """
+    Builds a NeighborIndex from a (sparse) TF-IDF matrix with L2-normalised rows.
+    Blocks of up to `block_size` rows (fewer on large catalogs, see block_rows()) are
+    processed independently; with n_jobs > 1 they are spread over a process pool,
+    each worker holding one block's product at a time. Call this from code guarded by
+    `if __name__ == "__main__":` when using more than one job.
+
+    `worker_matrix` is an optional picklable callable returning the same matrix
+    inside each worker, so workers can memory-map it instead of being sent a copy.
+    """
+    matrix = sparse.csr_matrix(tfidf_matrix, dtype=np.float32)
+    n = matrix.shape[0]
+    top_k = max(0, min(top_k, n - 1))
+
+    indices = np.full((n, top_k), -1, dtype=np.int32)
+    scores = np.zeros((n, top_k), dtype=np.float32)
+    if n == 0 or top_k == 0:
+        return NeighborIndex(indices, scores)
+
+    block_size = block_rows(n, block_size, max_block_bytes)
+    blocks = [(start, min(start + block_size, n), top_k) for start in range(0, n, block_size)]
+
+    if n_jobs > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(matrix if worker_matrix is None else worker_matrix,)) as pool:
+            for start, (block_indices, block_scores) in pool.map(_build_block_in_worker, blocks):
+                indices[start:start + len(block_indices)] = block_indices
+                scores[start:start + len(block_scores)] = block_scores
+    else:
+        matrix_t = matrix.T.tocsr()
+        for start, stop, _ in blocks:
+            indices[start:stop], scores[start:stop] = _build_block(matrix, matrix_t, start, stop, top_k)
+
+    return NeighborIndex(indices, scores)
+
+
+def add_rows(index, matrix, new_rows):
+    """
+    Updates `index` after `new_rows` were appended to `matrix`: the new titles get
+    full neighbour lists and existing titles only merge in the new titles that beat
+    their current worst neighbour. Work is proportional to the batch and the titles
+    it is similar to.
+    """
+    new_rows = np.asarray(new_rows)
+    top_k = index.top_k
+    index.reserve(matrix.shape[0])
+    if len(new_rows) == 0 or top_k == 0:
+        return
+
+    # Column c holds the similarity of every title to new_rows[c]
+    sims = sparse.csc_matrix(matrix @ matrix[new_rows].T)
+    for c, row in enumerate(new_rows):
+        lo, hi = sims.indptr[c], sims.indptr[c + 1]
+        index.set_row(row, *select_top_k(sims.indices[lo:hi], sims.data[lo:hi], top_k, row))
+
+    pairs = sims.tocoo()
+    is_new = np.zeros(matrix.shape[0], dtype=bool)
+    is_new[new_rows] = True
+    keep = ~is_new[pairs.row] & (pairs.data > 0)
+    rows, cols, vals = pairs.row[keep], new_rows[pairs.col[keep]], pairs.data[keep]
+
+    order = np.argsort(rows, kind="stable")
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else []
+    bounds = list(starts) + [len(rows)]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        row = rows[lo]
+        # Skip rows whose list is full and already better than every candidate
+        if index.indices[row, -1] >= 0 and vals[lo:hi].max() <= index.scores[row, -1]:
+            continue
+        held = index.indices[row] >= 0
+        merged_cols = np.concatenate([index.indices[row][held], cols[lo:hi]])
+        merged_vals = np.concatenate([index.scores[row][held], vals[lo:hi]])
+        index.set_row(row, *select_top_k(merged_cols, merged_vals, top_k, row))
+
+
+def remove_rows(index, matrix, removed_rows, removed_vectors):
+    """
+    Updates `index` after `removed_rows` were cleared in `matrix`. `removed_vectors`
+    are the rows as they were before clearing; only titles similar to them can list
+    a removed title, and only those lists are recomputed.
+    """
+    removed_rows = np.asarray(removed_rows)
+    index.reserve(len(index))
+    for row in removed_rows:
+        index.set_row(row, [], [])
+    if len(removed_rows) == 0 or index.top_k == 0:
+        return
+
+    candidates = np.unique(sparse.csr_matrix(matrix @ removed_vectors.T).nonzero()[0])
+    if len(candidates) == 0:
+        return
+    affected = candidates[np.isin(index.indices[candidates], removed_rows).any(axis=1)]
+    if len(affected) == 0:
+        return
+
+    indices, scores = query_top_k(matrix, affected, index.top_k)
+    index.indices[affected] = indices
+    index.scores[affected] = scores
+
+
+def query_top_k(matrix, rows, top_k, batch_size=DEFAULT_BLOCK_SIZE, max_block_bytes=MAX_BLOCK_BYTES):
+    """
+    Exact top_k neighbours of arbitrary catalog rows, computed with one sparse product
+    per batch of up to `batch_size` rows (see block_rows()). Returns (indices, scores)
+    arrays shaped like a NeighborIndex, in the order of `rows`.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    batch_size = block_rows(matrix.shape[0], batch_size, max_block_bytes)
+    indices = np.full((len(rows), top_k), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), top_k), dtype=np.float32)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        # (catalog x batch) product, so the catalog matrix is never transposed
+        block = sparse.csr_matrix((matrix @ matrix[batch].T).T)
+        stop = start + len(batch)
+        indices[start:stop], scores[start:stop] = _top_k_rows(block, batch, top_k)
+    return indices, scores
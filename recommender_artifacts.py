@@ -0,0 +1,123 @@
+"""
+On-disk artifacts for the movie recommender (RS.py).
+
+A build writes the fitted TF-IDF vocabulary and idf weights, the CSR arrays of the
+TF-IDF matrix and the top-k neighbour arrays as plain .npy files, plus a
+manifest.json header holding the format version and a hash of the catalog they
+were built from. Loading memory-maps the arrays, so startup does not depend on the
+catalog size and every process that opens the same files shares one copy of the
+pages through the OS cache.
+"""
+import hashlib
+import os
+from functools import partial
+
+import numpy as np
+import sklearn
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from artifact_dirs import new_directory, read_manifest, replace_directory, write_manifest
+from neighbor_index import NeighborIndex, build_neighbor_index
+
+# Bump when the file layout or the way the arrays are computed changes.
+ARTIFACT_VERSION = 1
+
+
+def catalog_hash(titles, descriptions, top_k):
+    """Hash of everything the artifacts depend on; a mismatch means they are stale."""
+    digest = hashlib.sha256()
+    digest.update(f"v{ARTIFACT_VERSION}|sklearn {sklearn.__version__}|top_k {top_k}\n".encode())
+    for title, desc in zip(titles, descriptions):
+        digest.update(title.encode())
+        digest.update(b"\x1f")
+        digest.update(desc.encode())
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def is_fresh(path, expected_hash, neighbors=True):
+    manifest = read_manifest(path)
+    return (
+        manifest is not None
+        and manifest.get("version") == ARTIFACT_VERSION
+        and manifest.get("catalog_hash") == expected_hash
+        and (manifest.get("neighbors", True) or not neighbors)
+    )
+
+
+def load_tfidf_matrix(path, mmap_mode="r"):
+    """Rebuilds the CSR TF-IDF matrix on top of the memory-mapped arrays (no copy)."""
+    manifest = read_manifest(path)
+    data = np.load(os.path.join(path, "tfidf_data.npy"), mmap_mode=mmap_mode)
+    indices = np.load(os.path.join(path, "tfidf_indices.npy"), mmap_mode=mmap_mode)
+    indptr = np.load(os.path.join(path, "tfidf_indptr.npy"), mmap_mode=mmap_mode)
+    return sparse.csr_matrix((data, indices, indptr), shape=tuple(manifest["tfidf_shape"]), copy=False)
+
+
+def load_vectorizer(path):
+    """Recreates the fitted TfidfVectorizer from the saved vocabulary and idf weights."""
+    terms = np.load(os.path.join(path, "vocabulary.npy"))
+    vectorizer = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(terms.tolist())})
+    vectorizer.idf_ = np.load(os.path.join(path, "idf.npy"))
+    return vectorizer
+
+
+def load_neighbor_index(path, mmap_mode="r"):
+    if not read_manifest(path).get("neighbors", True):
+        return None
+    indices = np.load(os.path.join(path, "neighbor_indices.npy"), mmap_mode=mmap_mode)
+    scores = np.load(os.path.join(path, "neighbor_scores.npy"), mmap_mode=mmap_mode)
+    return NeighborIndex(indices, scores)
+
+
+def load_artifacts(path):
+    """Returns (vectorizer, tfidf_matrix, neighbor_index) memory-mapped from `path`; the index is None if it wasn't built."""
+    return load_vectorizer(path), load_tfidf_matrix(path), load_neighbor_index(path)
+
+
+def build_artifacts(path, titles, descriptions, top_k, n_jobs=1, neighbors=True):
+    """
+    Fits the vectorizer, computes the neighbour index and writes everything to `path`.
+    Files are written to a temporary sibling directory that replaces `path` at the
+    end (see artifact_dirs.py), so readers never see a half-written build. With
+    neighbors=False the exact (quadratic) neighbour index is skipped, for catalogs
+    served in approximate mode.
+    """
+    tmp_path = new_directory(path)
+
+    vectorizer = TfidfVectorizer()
+    tfidf_matrix = sparse.csr_matrix(vectorizer.fit_transform(descriptions), dtype=np.float32)
+    np.save(os.path.join(tmp_path, "vocabulary.npy"), vectorizer.get_feature_names_out().astype(str))
+    np.save(os.path.join(tmp_path, "idf.npy"), vectorizer.idf_)
+    np.save(os.path.join(tmp_path, "tfidf_data.npy"), tfidf_matrix.data)
+    np.save(os.path.join(tmp_path, "tfidf_indices.npy"), tfidf_matrix.indices)
+    np.save(os.path.join(tmp_path, "tfidf_indptr.npy"), tfidf_matrix.indptr)
+
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "catalog_hash": catalog_hash(titles, descriptions, top_k),
+        "tfidf_shape": list(tfidf_matrix.shape),
+        "top_k": top_k,
+        "neighbors": neighbors,
+    }
+    write_manifest(tmp_path, manifest)
+
+    if neighbors:
+        # Worker processes memory-map the matrix that was just written instead of
+        # receiving a pickled copy each.
+        index = build_neighbor_index(
+            tfidf_matrix, top_k=top_k, n_jobs=n_jobs,
+            worker_matrix=partial(load_tfidf_matrix, tmp_path),
+        )
+        np.save(os.path.join(tmp_path, "neighbor_indices.npy"), index.indices)
+        np.save(os.path.join(tmp_path, "neighbor_scores.npy"), index.scores)
+
+    replace_directory(tmp_path, path)
+
+
+def load_or_build(path, titles, descriptions, top_k, n_jobs=1, neighbors=True):
+    """Loads the artifacts at `path`, rebuilding them first if they are missing or stale."""
+    if not is_fresh(path, catalog_hash(titles, descriptions, top_k), neighbors):
+        build_artifacts(path, titles, descriptions, top_k, n_jobs=n_jobs, neighbors=neighbors)
+    return load_artifacts(path)
@@ -0,0 +1,88 @@
+"""
+Event-driven redraws for the pygame apps (RS.py, FM.py, TPM.py).
+
+Instead of redrawing the whole window as fast as the CPU allows, a loop asks the
+scheduler for events, which blocks in pygame.event.wait() while nothing needs
+drawing. Handlers mark the regions they changed with invalidate(); the next frame
+is drawn clipped to those regions, pushed with pygame.display.update(rects) and
+capped at `fps`. Surfaces that never change (backgrounds, plot images) are painted
+once with static_layer().
+
+    scheduler = RenderScheduler(screen)
+    while running:
+        if scheduler.begin_frame():
+            draw_everything(screen)    # clipped to the dirty area
+        scheduler.end_frame()
+        for event in scheduler.events():
+            ...
+            scheduler.invalidate(changed_rect)
+"""
+import pygame
+
+DEFAULT_FPS = 60
+
+# Events after which the window contents have to be repainted from scratch
+_EXPOSE_EVENTS = {pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED}
+
+_static_layers = {}
+
+
+def static_layer(key, size, paint):
+    """Returns a surface of `size` painted once by paint(surface) and cached under `key`."""
+    layer = _static_layers.get(key)
+    if layer is None:
+        layer = pygame.Surface(size).convert()
+        paint(layer)
+        _static_layers[key] = layer
+    return layer
+
+
+class RenderScheduler:
+    """Tracks dirty regions of `screen` and only draws when there are some."""
+
+    def __init__(self, screen, fps=DEFAULT_FPS):
+        self.screen = screen
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        # The first frame draws the whole window
+        self._dirty = [screen.get_rect()]
+
+    @property
+    def dirty(self):
+        return bool(self._dirty)
+
+    def invalidate(self, *rects):
+        """Marks regions for redrawing; with no arguments, the whole window."""
+        if not rects:
+            rects = (self.screen.get_rect(),)
+        self._dirty.extend(pygame.Rect(rect) for rect in rects)
+
+    def events(self, timeout=None):
+        """
+        Returns the pending events. When nothing is dirty this blocks until an event
+        arrives (or `timeout` milliseconds pass), so an idle window uses no CPU.
+        """
+        if self._dirty:
+            events = pygame.event.get()
+        else:
+            first = pygame.event.wait() if timeout is None else pygame.event.wait(timeout)
+            events = [] if first.type == pygame.NOEVENT else [first] + pygame.event.get()
+        if any(event.type in _EXPOSE_EVENTS for event in events):
+            self.invalidate()
+        return events
+
+    def begin_frame(self):
+        """Clips drawing to the dirty area. Returns False when there is nothing to draw."""
+        if not self._dirty:
+            return False
+        self.screen.set_clip(self._dirty[0].unionall(self._dirty[1:]))
+        return True
+
+    def end_frame(self):
+        """Pushes the dirty regions to the display and caps the frame rate."""
+        if not self._dirty:
+            return
+        self.screen.set_clip(None)
+        pygame.display.update(self._dirty)
+        self._dirty = []
+        self.clock.tick(self.fps)
@@ -0,0 +1,114 @@
+"""
+Cache of model replies for the chatbot (IC.py), stored in the chat database.
+
+A reply is keyed by a hash of the normalized conversation that would be sent to
+the model (whitespace collapsed, case folded), so a repeated question with the
+same context is answered from SQLite without calling the backend. With
+scope="thread" the key also includes the thread ID; with scope="global" identical
+contexts share a reply across threads. Entries expire after `ttl` seconds and the
+table is trimmed to `max_entries`, dropping the entries that expire first.
+"""
+import hashlib
+import json
+import threading
+import time
+
+SCOPES = ("global", "thread")
+DEFAULT_TTL = 24 * 3600
+MAX_ENTRIES = 10000
+# Expired and surplus entries are purged once every this many stores
+TRIM_EVERY = 64
+
+
+def normalize_text(text):
+    return " ".join(text.split()).casefold()
+
+
+def context_key(conversation, thread_id=None):
+    """Hash of the normalized conversation (and thread ID, for per-thread scope)."""
+    normalized = [
+        [msg["role"], [normalize_text(part.get("text", "")) for part in msg["parts"]]]
+        for msg in conversation
+    ]
+    payload = json.dumps([thread_id, normalized], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Reply cache in the `response_cache` table of a ChatStore."""
+
+    def __init__(self, store, scope="global", ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown response cache scope {scope!r}; choose from {SCOPES}")
+        self.store = store
+        self.scope = scope
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, conversation, thread_id=None):
+        return context_key(conversation, thread_id if self.scope == "thread" else None)
+
+    def get(self, conversation, thread_id=None):
+        """Returns the cached reply for this context, or None."""
+        row = self.store.connection().execute(
+            "SELECT response FROM response_cache WHERE key = ? AND expires_at > ?",
+            (self.key(conversation, thread_id), time.time())).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, conversation, response, thread_id=None):
+        now = time.time()
+        self.store.write(lambda c: c.execute(
+            "INSERT OR REPLACE INTO response_cache (key, response, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (self.key(conversation, thread_id), response, now, now + self.ttl)))
+        with self._lock:
+            self._puts += 1
+            trim = self._puts % TRIM_EVERY == 0
+        if trim:
+            self.trim()
+
+    def trim(self):
+        """Deletes expired entries, then the soonest-expiring ones beyond max_entries."""
+        def purge(c):
+            removed = c.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            surplus = c.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+            if surplus > 0:
+                removed += c.execute("""
+                    DELETE FROM response_cache WHERE key IN (
+                        SELECT key FROM response_cache ORDER BY expires_at LIMIT ?
+                    )
+                """, (surplus,)).rowcount
+            return removed
+        removed = self.store.write(purge)
+        with self._lock:
+            self.evictions += removed
+
+    def clear(self):
+        self.store.write(lambda c: c.execute("DELETE FROM response_cache"))
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        entries = self.store.connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        return {
+            "scope": self.scope,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
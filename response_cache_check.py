@@ -0,0 +1,111 @@
+"""
+Checks and times the chatbot's response cache (response_cache.py) against a local
+stub model and a temporary chat database. No network or API key needed:
+
+    python response_cache_check.py
+    python response_cache_check.py --entries 50000 --lookups 5000
+
+Exits with an error if a cache hit reaches the model, or if normalization,
+scoping, TTL expiry or size-based eviction misbehave.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from chat_context import to_message
+from chat_models import ChatModel
+from chat_store import ChatStore
+from response_cache import ResponseCache
+
+
+class StubModel(ChatModel):
+    """Counts calls and answers instantly."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def stream(self, conversation):
+        self.calls += 1
+        yield f"answer #{self.calls}"
+
+
+def answer(model, cache, conversation, thread_id):
+    """The chatbot's cache-then-model flow, without the UI."""
+    cached = cache.get(conversation, thread_id)
+    if cached is not None:
+        return cached
+    reply = model.generate(conversation)
+    cache.put(conversation, reply, thread_id)
+    return reply
+
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAILED: {message}")
+    print(f"ok   {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time the chatbot response cache")
+    parser.add_argument("--entries", type=int, default=10000, help="cache entries for the timing run")
+    parser.add_argument("--lookups", type=int, default=2000, help="cache hits to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = ChatStore(os.path.join(tmp_dir, "chat_history_db"))
+        model = StubModel()
+        question = [to_message("user", "What is  the capital of France?")]
+
+        cache = ResponseCache(store, scope="global")
+        first = answer(model, cache, question, thread_id=1)
+        second = answer(model, cache, [to_message("user", "what is the capital of france? ")], thread_id=2)
+        check(model.calls == 1 and first == second, "repeat of a normalized context skips the model")
+        check(cache.hits == 1 and cache.misses == 1, "hit/miss counters")
+
+        per_thread = ResponseCache(store, scope="thread")
+        per_thread.clear()
+        answer(model, per_thread, question, thread_id=1)
+        answer(model, per_thread, question, thread_id=2)
+        answer(model, per_thread, question, thread_id=1)
+        check(model.calls == 3 and per_thread.hits == 1, "thread scope keeps threads apart")
+
+        short = ResponseCache(store, ttl=0.05)
+        short.clear()
+        answer(model, short, question, thread_id=1)
+        time.sleep(0.1)
+        calls = model.calls
+        answer(model, short, question, thread_id=1)
+        check(model.calls == calls + 1, "expired entries are not served")
+
+        small = ResponseCache(store, max_entries=100)
+        small.clear()
+        for i in range(500):
+            small.put([to_message("user", f"question {i}")], f"answer {i}")
+        small.trim()
+        stats = small.stats()
+        check(stats["entries"] <= 100 and small.evictions >= 400, "size-based eviction")
+        check(small.get([to_message("user", "question 499")]) == "answer 499", "newest entries survive eviction")
+
+        # Timing: hits against a cache of --entries replies
+        big = ResponseCache(store, max_entries=args.entries)
+        big.clear()
+        contexts = [[to_message("user", f"frequently asked question number {i}")] for i in range(args.entries)]
+        store.write(lambda c: c.executemany(
+            "INSERT INTO response_cache (key, response, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            [(big.key(ctx), "cached answer " * 30, time.time(), time.time() + big.ttl) for ctx in contexts]))
+        calls = model.calls
+        latencies = []
+        for i in range(args.lookups):
+            start = time.perf_counter()
+            answer(model, big, contexts[(i * 7919) % args.entries], thread_id=1)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        check(model.calls == calls, f"{args.lookups} hits never reach the model")
+        print(f"hit latency with {args.entries} entries: p50 {p(0.5):.3f} ms, p99 {p(0.99):.3f} ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Rendered-text cache shared by the pygame apps (RS.py, FM.py, TPM.py).
+
+font.render() rasterises the glyphs every call, and the apps draw the same titles,
+labels and captions on every frame. render_text() takes the same arguments and
+returns a cached surface, so only strings that actually change (typed input, a new
+prediction) are rendered again. The cache is an LRU bounded by entry count and by
+the pixel memory of the surfaces it holds.
+
+Returned surfaces are shared between callers: blit them, don't draw on them.
+"""
+from lru_cache import LRUCache
+
+MAX_ENTRIES = 2048
+MAX_BYTES = 16 * 2**20
+
+
+def _surface_bytes(surface):
+    return surface.get_pitch() * surface.get_height()
+
+
+_cache = LRUCache(MAX_ENTRIES, max_bytes=MAX_BYTES, sizeof=_surface_bytes)
+
+
+def render_text(font, text, antialias, color, background=None):
+    """Drop-in for font.render(text, antialias, color, background) that reuses surfaces."""
+    key = (font, text, antialias, tuple(color), None if background is None else tuple(background))
+    surface = _cache.get(key)
+    if surface is None:
+        surface = font.render(text, antialias, color, background)
+        _cache.put(key, surface)
+    return surface
+
+
+def text_cache_stats():
+    """Entry count, memory use, hits, misses, evictions and hit rate of the shared cache."""
+    return _cache.stats()
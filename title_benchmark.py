@@ -0,0 +1,102 @@
+"""
+Latency benchmark for the recommender's title lookups (title_index.py).
+
+Builds synthetic catalogs of titles (words drawn from a Zipf distribution, like
+real titles that share "the", "of", "love", ...) at several sizes, then replays
+typing sampled titles one keystroke at a time, with a typo in half of them, and
+times what RS.py runs per keystroke (suggest) and per recommend() call (lookup,
+fuzzy fallback), plus catalog edits (add, remove):
+
+    python title_benchmark.py --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from title_index import TitleIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ven", "dor", "the", "sun", "el", "an", "tor", "is", "mar", "bel", "os",
+             "ri", "na", "gal", "ex", "qu", "ho", "zen", "li", "per"]
+
+
+def synthetic_titles(n_titles, n_words=20000, seed=0):
+    """`n_titles` titles of 1-6 words; the vocabulary's word frequencies follow a Zipf law."""
+    rng = np.random.default_rng(seed)
+    words = []
+    seen = set()
+    while len(words) < n_words:
+        word = "".join(rng.choice(SYLLABLES, size=rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word.capitalize())
+    weights = 1.0 / np.arange(1, n_words + 1)
+    weights /= weights.sum()
+    lengths = rng.integers(1, 7, size=n_titles)
+    picks = rng.choice(n_words, size=int(lengths.sum()), p=weights)
+    titles, start = [], 0
+    for i, length in enumerate(lengths):
+        titles.append(" ".join(words[j] for j in picks[start:start + length]) + f" ({1950 + i % 75})")
+        start += length
+    return titles
+
+
+def with_typo(title, rng):
+    """`title` with one character swapped for a neighbouring one."""
+    pos = int(rng.integers(1, max(2, len(title) - 1)))
+    return title[:pos] + title[pos + 1:pos + 2] + title[pos:pos + 1] + title[pos + 2:]
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def timed(function, args):
+    times = []
+    for arg in args:
+        start = time.perf_counter()
+        function(arg)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run(sizes, n_queries, n_edits, seed):
+    print(f"{'titles':>9} {'build s':>8} {'operation':>10} {'calls':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'max ms':>7}")
+    for n_titles in sizes:
+        titles = synthetic_titles(n_titles, seed=seed)
+        start = time.perf_counter()
+        index = TitleIndex(titles)
+        build_time = time.perf_counter() - start
+
+        rng = np.random.default_rng(seed + 1)
+        sampled = [titles[i] for i in rng.choice(n_titles, size=min(n_queries, n_titles), replace=False)]
+        typed = [with_typo(t, rng) if i % 2 else t for i, t in enumerate(sampled)]
+        keystrokes = [text[:end] for text in typed for end in range(1, len(text) + 1)]
+
+        results = {
+            "lookup": timed(index.lookup, typed),
+            "fuzzy": timed(lambda text: index.fuzzy(text, limit=1), typed),
+            "suggest": timed(index.suggest, keystrokes),
+        }
+        # Edits: append new titles, then remove them again
+        new_titles = synthetic_titles(n_edits, seed=seed + 2)
+        first = len(titles)
+        titles.extend(new_titles)
+        results["add"] = timed(index.add, range(first, len(titles)))
+        results["remove"] = timed(index.remove, range(first, len(titles)))
+
+        for i, (name, times) in enumerate(results.items()):
+            print(f"{n_titles if i == 0 else '':>9} {f'{build_time:.2f}' if i == 0 else '':>8} {name:>10} "
+                  f"{len(times):>7} {percentile_ms(times, 50):>7.3f} {percentile_ms(times, 95):>7.3f} "
+                  f"{percentile_ms(times, 99):>7.3f} {max(times) * 1000:>7.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark title lookup, autocomplete and edits")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=300, help="titles typed per catalog size")
+    parser.add_argument("--edits", type=int, default=1000, help="titles added and removed per catalog size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.edits, args.seed)
@@ -0,0 +1,150 @@
+"""
+Title lookup for the movie recommender (RS.py).
+
+Titles are normalised once into a hash map for exact lookups, a sorted key list for
+prefix completion (binary search) and a trigram index for typo-tolerant matching,
+so queries never scan the whole catalog. Trigram postings are sets, so catalog
+edits update them in constant time; fuzzy matching counts shared trigrams over
+numpy copies of the postings it reads. title_benchmark.py measures the latency
+per keystroke at catalog sizes up to millions of titles.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+import numpy as np
+
+# Trigrams that occur in more titles than this are too common to narrow the search
+# and are skipped, unless the query has nothing rarer.
+MAX_POSTINGS = 5000
+
+
+def normalize_title(title):
+    """Case-folds a title and collapses runs of whitespace."""
+    return " ".join(title.casefold().split())
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """Exact, prefix and fuzzy lookups over a fixed list of titles."""
+
+    def __init__(self, titles):
+        self.titles = titles
+        self._exact = {}
+        self._trigram_postings = defaultdict(set)
+        # int32 copies of the postings fuzzy() has read, dropped when a posting changes
+        self._posting_arrays = {}
+        # Trigrams per title, with room to grow for add()
+        self._trigram_counts = np.zeros(max(16, len(titles)), dtype=np.int32)
+        for idx, title in enumerate(titles):
+            key = normalize_title(title)
+            # The first title wins on duplicates, like the original linear scan
+            self._exact.setdefault(key, idx)
+            grams = _trigrams(key)
+            self._trigram_counts[idx] = len(grams)
+            for gram in grams:
+                self._trigram_postings[gram].add(idx)
+        self._sorted_keys = sorted((normalize_title(t), idx) for idx, t in enumerate(titles))
+        self._keys_only = [key for key, _ in self._sorted_keys]
+
+    def add(self, idx):
+        """Indexes `self.titles[idx]`, e.g. after a title was appended to the list."""
+        key = normalize_title(self.titles[idx])
+        self._exact.setdefault(key, idx)
+        grams = _trigrams(key)
+        if idx >= len(self._trigram_counts):
+            self._trigram_counts = np.resize(self._trigram_counts, max(idx + 1, 2 * len(self._trigram_counts)))
+        self._trigram_counts[idx] = len(grams)
+        for gram in grams:
+            self._trigram_postings[gram].add(idx)
+            self._posting_arrays.pop(gram, None)
+        insort(self._sorted_keys, (key, idx))
+        insort(self._keys_only, key)
+
+    def remove(self, idx):
+        """Forgets `self.titles[idx]`; the list itself is left untouched so indices stay stable."""
+        key = normalize_title(self.titles[idx])
+        for gram in _trigrams(key):
+            posting = self._trigram_postings.get(gram)
+            if posting and idx in posting:
+                posting.remove(idx)
+                self._posting_arrays.pop(gram, None)
+        pos = bisect_left(self._sorted_keys, (key, idx))
+        if pos < len(self._sorted_keys) and self._sorted_keys[pos] == (key, idx):
+            del self._sorted_keys[pos]
+            del self._keys_only[pos]
+        if self._exact.get(key) == idx:
+            # Fall back to a remaining duplicate of the same title, if any
+            del self._exact[key]
+            pos = bisect_left(self._keys_only, key)
+            if pos < len(self._keys_only) and self._keys_only[pos] == key:
+                self._exact[key] = self._sorted_keys[pos][1]
+
+    def lookup(self, title):
+        """Returns the index of the title matching `title` exactly (ignoring case), or -1."""
+        return self._exact.get(normalize_title(title), -1)
+
+    def prefix(self, text, limit=5):
+        """Returns up to `limit` title indices whose normalised title starts with `text`."""
+        key = normalize_title(text)
+        if not key:
+            return []
+        matches = []
+        pos = bisect_left(self._keys_only, key)
+        while pos < len(self._sorted_keys) and len(matches) < limit:
+            candidate, idx = self._sorted_keys[pos]
+            if not candidate.startswith(key):
+                break
+            matches.append(idx)
+            pos += 1
+        return matches
+
+    def _posting_array(self, gram):
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            posting = self._trigram_postings[gram]
+            array = self._posting_arrays[gram] = np.fromiter(posting, dtype=np.int32, count=len(posting))
+        return array
+
+    def fuzzy(self, text, limit=5, min_similarity=0.3):
+        """Returns up to `limit` (index, similarity) pairs ranked by trigram overlap with `text`."""
+        key = normalize_title(text)
+        if not key:
+            return []
+        query_grams = _trigrams(key)
+        postings = sorted(
+            (g for g in query_grams if self._trigram_postings.get(g)),
+            key=lambda g: len(self._trigram_postings[g]),
+        )
+        if not postings:
+            return []
+        selective = [g for g in postings if len(self._trigram_postings[g]) <= MAX_POSTINGS] or postings[:1]
+
+        # Shared trigrams per title: a title appears once in each posting it shares
+        candidates, shared = np.unique(
+            np.concatenate([self._posting_array(g) for g in selective]), return_counts=True)
+        # Dice coefficient over trigram sets
+        similarity = 2 * shared / (len(query_grams) + self._trigram_counts[candidates])
+        keep = similarity >= min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > limit:
+            # Everything tied with the limit-th best, then ranked
+            threshold = np.partition(similarity, len(similarity) - limit)[len(similarity) - limit]
+            keep = similarity >= threshold
+            candidates, similarity = candidates[keep], similarity[keep]
+        order = np.lexsort((candidates, -similarity))[:limit]
+        return [(int(candidates[i]), float(similarity[i])) for i in order]
+
+    def suggest(self, text, limit=5):
+        """Autocomplete for an input box: prefix matches first, topped up with fuzzy matches."""
+        matches = self.prefix(text, limit)
+        if len(matches) < limit:
+            for idx, _ in self.fuzzy(text, limit):
+                if idx not in matches:
+                    matches.append(idx)
+                if len(matches) == limit:
+                    break
+        return matches